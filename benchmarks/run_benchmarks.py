@@ -0,0 +1,253 @@
+# Performance benchmarks for plant stepping, controller updates and closed loops
+#
+# Usage (from the repository root):
+#     python -m benchmarks.run_benchmarks --output results.json
+#     python -m benchmarks.run_benchmarks --baseline benchmarks/baseline.json --threshold 0.25
+#
+# Every case reports the best time per call over several repeats, in
+# microseconds, and the corresponding steps per second. With --baseline the
+# run fails (exit code 1) when a case is slower than the baseline by more
+# than the threshold.
+
+import argparse
+import itertools
+import json
+import platform
+import subprocess
+import sys
+import timeit
+
+import numpy as np
+
+from controllers.mpc import MPCController
+from controllers.pid import PIDBank, PIDController
+from plants.dc_motor import DCMotor
+from plants.inverted_pendulum import InvertedPendulum
+from plants.mass_spring_damper import MassSpringDamper
+from plants.stateSpaceSim import StateSpaceSim, propagate
+from simulations.closed_loop import simulate_closed_loop
+from simulations.ensemble import EnsembleSimulator
+from simulations.fused import FusedClosedLoop
+from utils.frequency import loop_analysis, pid_mass_spring_loop
+
+
+def time_call(fn, repeat=5, min_time=0.05):
+    """Best wall time of one fn() call, in seconds.
+
+    The number of calls per repeat is chosen so a repeat lasts at least
+    min_time, as timeit's autorange does.
+    """
+    timer = timeit.Timer(fn)
+    number = 1
+    while True:
+        if timer.timeit(number) >= min_time:
+            break
+        number *= 2
+    return min(timer.repeat(repeat, number)) / number
+
+
+def _state_space_model(n, steps):
+    rng = np.random.default_rng(0)
+    A = rng.normal(size=(n, n))
+    A -= (np.abs(np.linalg.eigvals(A)).max() + 1.0) * np.eye(n)  # stable
+    return A, rng.normal(size=(n, 1)), rng.normal(size=(steps, 1))
+
+
+def _state_space(n, steps):
+    A, B, u = _state_space_model(n, steps)
+    sim = StateSpaceSim(A, B, np.eye(n), np.zeros((n, 1)), np.zeros((n, 1)), u, 0.001)
+    return lambda: sim.simulate(), steps
+
+
+def _propagate(n, steps):
+    A, B, u = _state_space_model(n, steps)
+    Ad, Bd = np.eye(n) + 0.001 * A, 0.001 * B
+    return lambda: propagate(Ad, Bd, np.zeros(n), u), steps
+
+
+def _state_space_loop(n, steps):
+    # The per-step Euler loop StateSpaceSim.simulate used before propagate,
+    # kept as the reference for its speedup
+    A, B, u = _state_space_model(n, steps)
+    C, D, dt = np.eye(n), np.zeros((n, 1)), 0.001
+
+    def run():
+        x, y = np.zeros((steps, n)), np.zeros((steps, n))
+        for k in range(1, steps):
+            x_k = x[k - 1].reshape(-1, 1)
+            x_next = x_k + dt * (A @ x_k + B @ u[k].reshape(-1, 1))
+            x[k] = x_next.flatten()
+            y[k] = (C @ x_next + D @ u[k].reshape(-1, 1)).flatten()
+    return run, steps
+
+
+def _mpc(horizon):
+    mpc = MPCController(horizon=horizon)
+    # Cycle through varying states so every call solves a different QP
+    states = itertools.cycle(np.random.default_rng(0).uniform(-1, 1, (1000, 2)))
+    reference = np.array([1.0, 0.0])
+    return lambda: mpc.compute_control(next(states), reference), 1
+
+
+def _pid():
+    pid = PIDController(Kp=1.0, Ki=0.1, Kd=0.01, DT=0.01)
+    return lambda: pid.update(1.0, 0.5), 1
+
+
+def _pid_bank(channels):
+    bank = PIDBank(np.ones(channels), 0.1, 0.01, DT=0.01)
+    measurement = np.full(channels, 0.5)
+    return lambda: bank.update(1.0, measurement), channels
+
+
+def _mass_spring_damper(solver):
+    plant = MassSpringDamper(solver=solver)
+    return lambda: plant.update_state(0.5, 0.01), 1
+
+
+def _dc_motor(integrator):
+    plant = DCMotor(1.0, 0.5, 0.01, 0.01, 0.01, 0.1, integrator=integrator)
+    return lambda: plant.update(1.0, 0.001), 1
+
+
+def _inverted_pendulum(integrator):
+    plant = InvertedPendulum(1.0, 1.0, 0.1, integrator=integrator)
+    return lambda: plant.update(0.1, 0.01), 1
+
+
+def _ensemble(n_runs, steps=100):
+    params = {'mass': np.linspace(1.0, 2.0, n_runs), 'spring_constant': 1.0, 'damping_coefficient': 0.5}
+    sim = EnsembleSimulator(MassSpringDamper, params, np.zeros((n_runs, 2)), 0.01)
+    inputs = np.ones((n_runs, steps))
+    return lambda: sim.run(inputs, return_trajectory=False), n_runs * steps
+
+
+def _closed_loop_mpc(steps=100):
+    def run():
+        simulate_closed_loop(MassSpringDamper(), MPCController(dt=0.1), 0.01, steps,
+                             reference=[1.0, 0.0], control_dt=0.1, record_timing=False)
+    return run, steps
+
+
+def _fused_pendulum_pid(steps, backend='auto'):
+    plant = InvertedPendulum(1.0, 1.0, 0.1)
+    loop = FusedClosedLoop(plant, PIDController(40.0, 20.0, 8.0, DT=0.001), 0.001, backend=backend)
+    loop.run(10, reference=0.5)  # compile outside the timed calls
+
+    def run():
+        plant.set_state(np.zeros(2))
+        loop.run(steps, reference=0.5)
+    return run, steps
+
+
+def _robustness_map(designs, frequencies=1000):
+    Kp = np.linspace(1.0, 50.0, designs)
+    loops = pid_mass_spring_loop(Kp, 1.0, 0.1 * Kp, mass=1.0)
+    w = np.logspace(-2, 3, frequencies)
+    return lambda: loop_analysis(*loops, w), designs
+
+
+def _import_core():
+    # Interpreter start-up plus the imports of a simulation worker
+    code = 'from controllers import PIDController, MPCController; from plants import MassSpringDamper'
+    return lambda: subprocess.run([sys.executable, '-c', code], check=True), 1
+
+
+# name -> (factory, kwargs); the factory returns (fn, steps advanced per call)
+BENCHMARKS = {
+    'state_space_simulate[n=2]': (_state_space, {'n': 2, 'steps': 10000}),
+    'state_space_simulate[n=20]': (_state_space, {'n': 20, 'steps': 10000}),
+    'state_space_loop[n=20]': (_state_space_loop, {'n': 20, 'steps': 10000}),
+    'propagate[n=2,steps=1000000]': (_propagate, {'n': 2, 'steps': 1000000}),
+    'propagate[n=20,steps=1000000]': (_propagate, {'n': 20, 'steps': 1000000}),
+    'mpc_compute_control[N=10]': (_mpc, {'horizon': 10}),
+    'mpc_compute_control[N=30]': (_mpc, {'horizon': 30}),
+    'pid_update': (_pid, {}),
+    'pid_bank_update[channels=100]': (_pid_bank, {'channels': 100}),
+    'pid_bank_update[channels=10000]': (_pid_bank, {'channels': 10000}),
+    'msd_update_state[zoh]': (_mass_spring_damper, {'solver': 'zoh'}),
+    'msd_update_state[continuous]': (_mass_spring_damper, {'solver': 'continuous'}),
+    'dc_motor_update[euler]': (_dc_motor, {'integrator': 'euler'}),
+    'pendulum_update[symplectic_euler]': (_inverted_pendulum, {'integrator': 'symplectic_euler'}),
+    'pendulum_update[rk4]': (_inverted_pendulum, {'integrator': 'rk4'}),
+    'ensemble_msd[n_runs=100]': (_ensemble, {'n_runs': 100}),
+    'ensemble_msd[n_runs=10000]': (_ensemble, {'n_runs': 10000}),
+    'closed_loop_msd_mpc[steps=100]': (_closed_loop_mpc, {}),
+    'fused_pendulum_pid[steps=1000000]': (_fused_pendulum_pid, {'steps': 1000000}),
+    'loop_analysis[designs=1000]': (_robustness_map, {'designs': 1000}),
+    'import_core': (_import_core, {}),
+}
+
+
+def run_benchmarks(names=None, repeat=5, min_time=0.05):
+    """Run the selected benchmarks (all by default).
+
+    Returns:
+        dict: name -> {'us_per_call', 'steps_per_sec'}.
+    """
+    results = {}
+    for name in BENCHMARKS if names is None else names:
+        factory, kwargs = BENCHMARKS[name]
+        fn, steps = factory(**kwargs)
+        seconds = time_call(fn, repeat, min_time)
+        results[name] = {'us_per_call': seconds * 1e6, 'steps_per_sec': steps / seconds}
+    return results
+
+
+def compare(results, baseline, threshold=0.2):
+    """Cases slower than the baseline by more than `threshold` (a fraction).
+
+    Cases missing from either side are skipped.
+
+    Returns:
+        list: (name, baseline us/call, current us/call, ratio) per regression.
+    """
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        ratio = result['us_per_call'] / baseline[name]['us_per_call']
+        if ratio > 1.0 + threshold:
+            regressions.append((name, baseline[name]['us_per_call'], result['us_per_call'], ratio))
+    return regressions
+
+
+def save_results(path, results):
+    meta = {'python': platform.python_version(), 'numpy': np.__version__, 'machine': platform.platform()}
+    with open(path, 'w') as f:
+        json.dump({'meta': meta, 'results': results}, f, indent=2, sort_keys=True)
+
+
+def load_results(path):
+    with open(path) as f:
+        return json.load(f)['results']
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Run the performance benchmarks.')
+    parser.add_argument('--output', help='write the results to this JSON file')
+    parser.add_argument('--baseline', help='JSON results to compare against')
+    parser.add_argument('--threshold', type=float, default=0.2, help='allowed slowdown as a fraction (default 0.2)')
+    parser.add_argument('--filter', default='', help='only run cases whose name contains this string')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--min-time', type=float, default=0.05, help='minimum seconds per repeat')
+    args = parser.parse_args(argv)
+
+    names = [name for name in BENCHMARKS if args.filter in name]
+    results = run_benchmarks(names, args.repeat, args.min_time)
+    for name, result in results.items():
+        print(f"{name:40s} {result['us_per_call']:12.2f} us/call {result['steps_per_sec']:14.0f} steps/s")
+    if args.output:
+        save_results(args.output, results)
+
+    if args.baseline:
+        regressions = compare(results, load_results(args.baseline), args.threshold)
+        for name, before, after, ratio in regressions:
+            print(f"REGRESSION {name}: {before:.2f} -> {after:.2f} us/call ({ratio:.2f}x)")
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
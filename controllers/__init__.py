@@ -1,3 +1,23 @@
 # __init__.py
 
-# This file makes the 'controllers' directory a Python package.
\ No newline at end of file
+# This file makes the 'controllers' directory a Python package. The names
+# below are importable from the package; each submodule is loaded on first
+# use, so the optimization solvers are only imported by the controllers that
+# need them.
+
+from utils.lazy import lazy_exports
+
+_EXPORTS = {
+    'BaseController': 'base_controller',
+    'PIDController': 'pid',
+    'PIDBank': 'pid',
+    'LQRController': 'lqr',
+    'GainScheduledLQR': 'lqr',
+    'solve_riccati': 'lqr',
+    'MPCController': 'mpc',
+    'LinearMPC': 'linear_mpc',
+    'FleetMPC': 'fleet_mpc',
+    'ExplicitMPCController': 'explicit_mpc',
+}
+__all__ = list(_EXPORTS)
+__getattr__, __dir__ = lazy_exports(__name__, _EXPORTS)
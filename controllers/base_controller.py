@@ -8,3 +8,11 @@ class BaseController(ABC):
     @abstractmethod
     def reset(self):
         pass
+
+    def compute_control(self, measurement, reference=None):
+        """Common entry point used by the closed-loop runner.
+
+        Controllers whose `update` takes (measurement, reference) inherit this
+        as is; the others override it to reorder their arguments.
+        """
+        return self.update(measurement, reference)
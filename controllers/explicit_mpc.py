@@ -0,0 +1,455 @@
+import numpy as np
+import osqp
+from collections import deque
+from operator import mul
+from scipy import sparse
+from scipy.optimize import linprog
+from scipy.spatial import HalfspaceIntersection
+from .base_controller import BaseController
+
+
+class ExplicitMPCController(BaseController):
+    """Explicit MPC: a piecewise-affine control law evaluated by table lookup.
+
+    The law is computed offline from an `MPCController` by solving its QP as a
+    multi-parametric QP in the parameter theta (the current state, optionally
+    stacked with the reference). Every critical region {theta : Hr theta <= kr}
+    has an affine law u = F theta + g. Online evaluation walks a binary search
+    tree over the region facets and applies one affine law, so no solver is
+    needed at run time.
+    """
+
+    def __init__(self, table):
+        self.table = {name: np.asarray(value) for name, value in table.items()}
+        t = self.table
+        self.n_theta = int(t['n_theta'])
+        self.nx = int(t['nx'])
+        self.nu = t['gains'].shape[1]
+        self.reference = t['reference'] if t['reference'].size else None
+        self.u_min = t['u_min']
+        self.u_max = t['u_max']
+        self.n_regions = t['gains'].shape[0]
+
+        # Plain Python copies of the tree, regions and laws keep the online
+        # evaluation free of NumPy call overhead for these small dimensions
+        self._planes = [tuple(row) for row in t['planes'].tolist()]
+        self._plane_b = t['plane_b'].tolist()
+        self._node_plane = t['node_plane'].tolist()
+        self._node_left = t['node_left'].tolist()
+        self._node_right = t['node_right'].tolist()
+        self._leaf_regions = t['leaf_regions'].tolist()
+        ptr = t['region_ptr']
+        self._regions = [(t['region_A'][ptr[r]:ptr[r + 1]].tolist(), t['region_b'][ptr[r]:ptr[r + 1]].tolist())
+                         for r in range(self.n_regions)]
+        self._laws = list(zip(t['gains'].tolist(), t['offsets'].tolist()))
+        self._u_bounds = list(zip(self.u_min.tolist(), self.u_max.tolist()))
+
+    @classmethod
+    def from_mpc(cls, mpc, reference=None, parametric_reference=False,
+                 reference_min=None, reference_max=None, max_regions=5000):
+        """Solve the MPC problem of `mpc` offline into an explicit law.
+
+        Args:
+            mpc (MPCController): Controller providing A, B, Q, R, N and bounds.
+            reference (np.ndarray, optional): Fixed reference state, zero by
+                default. Ignored when parametric_reference is True.
+            parametric_reference (bool): Make the reference part of the
+                parameter, so it can change online (larger table).
+            reference_min, reference_max (np.ndarray, optional): Reference
+                range covered when parametric_reference is True, defaults to
+                the state bounds. Every component needs a non-empty range.
+            max_regions (int): Stop exploring after this many regions.
+        """
+        nx = mpc.nx
+        if parametric_reference:
+            reference = None
+            r_min = mpc.x_min if reference_min is None else np.asarray(reference_min, dtype=float)
+            r_max = mpc.x_max if reference_max is None else np.asarray(reference_max, dtype=float)
+            lower = np.concatenate([mpc.x_min, r_min])
+            upper = np.concatenate([mpc.x_max, r_max])
+        else:
+            reference = np.zeros(nx) if reference is None else np.asarray(reference, dtype=float)
+            lower, upper = mpc.x_min, mpc.x_max
+
+        H, F, f, G, w, S = condense_mpc(mpc, reference)
+        n_theta = F.shape[1]
+        D = np.vstack([np.eye(n_theta), -np.eye(n_theta)])
+        d = np.concatenate([upper, -lower])
+
+        regions = solve_mpqp(H, F, f, G, w, S, D, d, max_regions=max_regions)
+        if not regions:
+            raise ValueError("The MPC problem is infeasible over the whole parameter domain")
+        table = _build_table(regions, mpc.nu, n_theta)
+        table.update(
+            n_theta=np.array(n_theta),
+            nx=np.array(nx),
+            reference=np.zeros(0) if reference is None else reference,
+            u_min=np.asarray(mpc.u_min, dtype=float),
+            u_max=np.asarray(mpc.u_max, dtype=float),
+        )
+        return cls(table)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls(dict(data))
+
+    def save(self, path):
+        np.savez(path, **self.table)
+
+    def locate(self, theta, check=True):
+        """Return the index of the critical region containing theta, or -1.
+
+        With check=False the membership test is skipped when the tree leaf
+        holds a single region, which then also serves points outside the
+        explored set.
+        """
+        return self._locate(np.asarray(theta, dtype=float).tolist(), check)
+
+    def _locate(self, theta, check):
+        node = 0
+        planes, plane_b = self._planes, self._plane_b
+        node_plane, node_left, node_right = self._node_plane, self._node_left, self._node_right
+        while node_plane[node] >= 0:
+            p = node_plane[node]
+            if sum(map(mul, planes[p], theta)) > plane_b[p]:
+                node = node_right[node]
+            else:
+                node = node_left[node]
+
+        # Leaf: node_left/node_right hold the slice of candidate regions
+        candidates = self._leaf_regions[node_left[node]:node_right[node]]
+        if not check and len(candidates) == 1:
+            return candidates[0]
+        for region in candidates:
+            A, b = self._regions[region]
+            if all(sum(map(mul, row, theta)) <= bi + 1e-9 for row, bi in zip(A, b)):
+                return region
+        return -1
+
+    def compute_control(self, state, reference=None):
+        """Evaluate the explicit law at the current state."""
+        theta = np.asarray(state, dtype=float).tolist()
+        if self.reference is None:
+            theta += [0.0] * self.nx if reference is None else np.asarray(reference, dtype=float).tolist()
+        elif reference is not None and not np.allclose(reference, self.reference):
+            raise ValueError("This table was built for a fixed reference; build it with parametric_reference=True")
+
+        region = self._locate(theta, False)
+        if region < 0:
+            # Outside the explored (feasible) set: use the least-violated region
+            point = np.array(theta)
+            violation = [np.max(np.array(A) @ point - b) for A, b in self._regions]
+            region = int(np.argmin(violation))
+        gains, offsets = self._laws[region]
+        u = [min(max(sum(map(mul, row, theta)) + offset, lo), hi)
+             for row, offset, (lo, hi) in zip(gains, offsets, self._u_bounds)]
+        return np.array(u)
+
+    def update(self, state, reference=None):
+        return self.compute_control(state, reference)
+
+    def reset(self):
+        pass
+
+
+def condense_mpc(mpc, reference=None):
+    """Condensed form of the MPC problem of an `MPCController`.
+
+    Eliminates the states so that, with U = [u_0, ..., u_{N-1}], the problem
+    is min 1/2 U'HU + (F theta + f)'U s.t. GU <= w + S theta, where theta is
+    the current state, stacked with the reference when `reference` is None.
+    Constraints on x_0 depend on theta only and are left to the domain.
+
+    Returns:
+        tuple: (H, F, f, G, w, S)
+    """
+    A, B, Q, R, N = mpc.A, mpc.B, mpc.Q, mpc.R, mpc.N
+    nx, nu = mpc.nx, mpc.nu
+
+    # X = Sx x_0 + Su U for X = [x_0, ..., x_N]
+    Sx = np.zeros(((N + 1) * nx, nx))
+    Su = np.zeros(((N + 1) * nx, N * nu))
+    power = np.eye(nx)
+    for k in range(N + 1):
+        Sx[k * nx:(k + 1) * nx] = power
+        power = A @ power
+    for k in range(1, N + 1):
+        for i in range(k):
+            Su[k * nx:(k + 1) * nx, i * nu:(i + 1) * nu] = np.linalg.matrix_power(A, k - 1 - i) @ B
+
+    # Stage costs on x_0..x_{N-1}, no terminal weight (as in MPCController)
+    Qbar = np.kron(np.diag(np.r_[np.ones(N), 0.0]), Q)
+    Rbar = np.kron(np.eye(N), R)
+    H = 2 * (Su.T @ Qbar @ Su + Rbar)
+    Fx = 2 * Su.T @ Qbar @ Sx
+    Fr = -2 * Su.T @ Qbar @ np.tile(np.eye(nx), (N + 1, 1))
+
+    Su1, Sx1 = Su[nx:], Sx[nx:]
+    x_max = np.tile(mpc.x_max, N)
+    x_min = np.tile(mpc.x_min, N)
+    G = np.vstack([Su1, -Su1, np.eye(N * nu), -np.eye(N * nu)])
+    w = np.concatenate([x_max, -x_min, np.tile(mpc.u_max, N), -np.tile(mpc.u_min, N)])
+    Sx_rows = np.vstack([-Sx1, Sx1, np.zeros((2 * N * nu, nx))])
+
+    if reference is None:
+        F = np.hstack([Fx, Fr])
+        f = np.zeros(N * nu)
+        S = np.hstack([Sx_rows, np.zeros_like(Sx_rows)])
+    else:
+        F = Fx
+        f = Fr @ reference
+        S = Sx_rows
+    return H, F, f, G, w, S
+
+
+def solve_mpqp(H, F, f, G, w, S, D, d, max_regions=5000, tol=1e-8):
+    """Explore the critical regions of a multi-parametric QP.
+
+    Solves min 1/2 z'Hz + (F theta + f)'z s.t. Gz <= w + S theta for all
+    theta in {D theta <= d}. Starting from seed points, each new critical
+    region is computed from its optimal active set and the parameter space
+    just across each of its facets is explored next.
+
+    Returns:
+        list: One dict per region with 'A', 'b' (non-redundant halfspaces),
+        'K', 'k' (z = K theta + k), 'vertices' and 'active'.
+    """
+    n_theta = F.shape[1]
+    Hinv = np.linalg.inv(H)
+    solver = _ParametricQP(H, F, f, G, w, S)
+    scale = np.max(np.abs(d)) if d.size else 1.0
+    step = 1e-5 * max(scale, 1.0)
+
+    center, radius = _chebyshev_center(D, d)
+    if center is None:
+        return []
+    seeds = [center]
+    # A coarse sample of the domain guards against numerically missed facets
+    lower, upper = _bounding_box(D, d)
+    per_axis = max(2, int(round(64 ** (1.0 / n_theta))))
+    axes = [np.linspace(lo, hi, per_axis + 2)[1:-1] for lo, hi in zip(lower, upper)]
+    seeds += [np.array(p) for p in np.stack(np.meshgrid(*axes), -1).reshape(-1, n_theta)]
+
+    regions = []
+    known = set()
+    queue = deque(seeds)
+    while queue and len(regions) < max_regions:
+        theta = queue.popleft()
+        if np.any(D @ theta > d + tol):
+            continue
+        if any(np.all(r['A'] @ theta <= r['b'] + tol) for r in regions):
+            continue
+        active = solver.active_set(theta, Hinv)
+        if active is None or active in known:
+            continue
+        known.add(active)
+        region = _critical_region(Hinv, F, f, G, w, S, D, d, list(active))
+        if region is None:
+            continue
+        regions.append(region)
+        for i, normal in enumerate(region['A']):
+            if region['domain'][i]:
+                continue
+            on_facet = np.abs(region['vertices'] @ normal - region['b'][i]) <= 1e-7 * max(1.0, abs(region['b'][i]))
+            if not np.any(on_facet):
+                continue
+            facet_center = region['vertices'][on_facet].mean(axis=0)
+            queue.append(facet_center + step * normal / np.linalg.norm(normal))
+    return regions
+
+
+class _ParametricQP:
+    """OSQP workspace for the point solves used to find optimal active sets."""
+
+    def __init__(self, H, F, f, G, w, S):
+        self.F, self.f, self.G, self.w, self.S = F, f, G, w, S
+        self.solver = osqp.OSQP()
+        self.solver.setup(sparse.csc_matrix(np.triu(H)), f, sparse.csc_matrix(G),
+                          -np.inf * np.ones(len(w)), w, verbose=False,
+                          eps_abs=1e-10, eps_rel=1e-10, max_iter=20000)
+
+    def active_set(self, theta, Hinv, tol=1e-7):
+        G, w, S, F, f = self.G, self.w, self.S, self.F, self.f
+        rhs = w + S @ theta
+        self.solver.update(q=F @ theta + f, u=rhs)
+        result = self.solver.solve(raise_error=False)
+        if result.info.status_val not in (osqp.SolverStatus.OSQP_SOLVED,
+                                          osqp.SolverStatus.OSQP_SOLVED_INACCURATE):
+            return None
+        active = [int(i) for i in np.flatnonzero(rhs - G @ result.x < tol)]
+
+        # Refine the solver's guess with exact primal-dual active-set steps
+        lin = F @ theta + f
+        for _ in range(2 * len(w)):
+            active = _independent_rows(G, active)
+            z, lam = _kkt_solution(Hinv, G, rhs, lin, active)
+            if lam.size and lam.min() < -tol:
+                active.pop(int(np.argmin(lam)))
+                continue
+            violation = G @ z - rhs
+            violation[active] = -np.inf
+            if violation.max() > tol:
+                active.append(int(np.argmax(violation)))
+                continue
+            return frozenset(active)
+        return None
+
+
+def _kkt_solution(Hinv, G, rhs, lin, active):
+    if not active:
+        return -Hinv @ lin, np.zeros(0)
+    GA = G[active]
+    lam = -np.linalg.solve(GA @ Hinv @ GA.T, rhs[active] + GA @ Hinv @ lin)
+    return -Hinv @ (lin + GA.T @ lam), lam
+
+
+def _independent_rows(G, active, tol=1e-9):
+    if len(active) <= 1:
+        return list(active)
+    kept = []
+    for i in active:
+        candidate = G[kept + [i]]
+        if np.linalg.matrix_rank(candidate, tol) == len(kept) + 1:
+            kept.append(i)
+    return kept
+
+
+def _critical_region(Hinv, F, f, G, w, S, D, d, active):
+    """Affine solution and polyhedral region of one optimal active set."""
+    n_theta = F.shape[1]
+    inactive = np.setdiff1d(np.arange(G.shape[0]), active)
+    if active:
+        GA = G[active]
+        M = GA @ Hinv @ GA.T
+        L = -np.linalg.solve(M, S[active] + GA @ Hinv @ F)
+        l0 = -np.linalg.solve(M, w[active] + GA @ Hinv @ f)
+        K = -Hinv @ (F + GA.T @ L)
+        k = -Hinv @ (f + GA.T @ l0)
+    else:
+        L = np.zeros((0, n_theta))
+        l0 = np.zeros(0)
+        K = -Hinv @ F
+        k = -Hinv @ f
+
+    GI = G[inactive]
+    A = np.vstack([-L, GI @ K - S[inactive], D])
+    b = np.concatenate([l0, w[inactive] - GI @ k, d])
+    domain = np.r_[np.zeros(len(l0) + len(inactive), dtype=bool), np.ones(len(d), dtype=bool)]
+
+    # Drop rows that do not depend on theta (they hold or fail everywhere)
+    norms = np.linalg.norm(A, axis=1)
+    constant = norms < 1e-12
+    if np.any(b[constant] < -1e-9):
+        return None
+    A, b, domain, norms = A[~constant], b[~constant], domain[~constant], norms[~constant]
+    A, b = A / norms[:, None], b / norms
+
+    center, radius = _chebyshev_center(A, b)
+    if center is None or radius < 1e-8:
+        return None
+    keep, vertices = _irredundant(A, b, center)
+    return {'A': A[keep], 'b': b[keep], 'domain': domain[keep], 'K': K, 'k': k,
+            'vertices': vertices, 'active': tuple(sorted(active))}
+
+
+def _irredundant(A, b, interior):
+    """Non-redundant halfspaces and vertices of a bounded polytope."""
+    if A.shape[1] == 1:
+        a = A[:, 0]
+        upper = np.min(b[a > 0] / a[a > 0])
+        lower = np.max(b[a < 0] / a[a < 0])
+        keep = np.flatnonzero(np.isclose(b / a, np.where(a > 0, upper, lower)))
+        return keep, np.array([[lower], [upper]])
+    hs = HalfspaceIntersection(np.hstack([A, -b[:, None]]), interior)
+    keep = np.unique(np.concatenate([np.asarray(facet) for facet in hs.dual_facets]))
+    return keep, hs.intersections
+
+
+def _chebyshev_center(A, b):
+    n = A.shape[1]
+    norms = np.linalg.norm(A, axis=1)
+    res = linprog(np.r_[np.zeros(n), -1.0], A_ub=np.hstack([A, norms[:, None]]), b_ub=b,
+                  bounds=[(None, None)] * n + [(0, None)], method='highs')
+    if res.status != 0:
+        return None, 0.0
+    return res.x[:n], res.x[n]
+
+
+def _bounding_box(D, d):
+    n = D.shape[1]
+    lower, upper = np.empty(n), np.empty(n)
+    for i in range(n):
+        c = np.zeros(n)
+        c[i] = 1.0
+        lower[i] = linprog(c, A_ub=D, b_ub=d, bounds=[(None, None)] * n, method='highs').x[i]
+        upper[i] = linprog(-c, A_ub=D, b_ub=d, bounds=[(None, None)] * n, method='highs').x[i]
+    return lower, upper
+
+
+def _build_table(regions, nu, n_theta):
+    """Flatten the regions and a point-location tree into plain arrays."""
+    gains = np.array([r['K'][:nu] for r in regions])
+    offsets = np.array([r['k'][:nu] for r in regions])
+    region_A = np.vstack([r['A'] for r in regions])
+    region_b = np.concatenate([r['b'] for r in regions])
+    region_ptr = np.cumsum([0] + [len(r['b']) for r in regions])
+
+    # Unique separating hyperplanes (domain facets never separate regions)
+    plane_index = {}
+    planes, plane_b = [], []
+    for r in regions:
+        for a, b, on_domain in zip(r['A'], r['b'], r['domain']):
+            if on_domain:
+                continue
+            sign = 1.0 if a[np.argmax(np.abs(a) > 1e-12)] > 0 else -1.0
+            key = tuple(np.round(np.r_[sign * a, sign * b], 9))
+            if key not in plane_index:
+                plane_index[key] = len(planes)
+                planes.append(sign * a)
+                plane_b.append(sign * b)
+    planes = np.array(planes).reshape(-1, n_theta)
+    plane_b = np.array(plane_b)
+
+    # side[r, p]: +1 region r lies above plane p, -1 below, 0 it is split
+    side = np.zeros((len(regions), len(planes)), dtype=int)
+    for i, r in enumerate(regions):
+        dist = r['vertices'] @ planes.T - plane_b
+        scale = 1e-7 * np.maximum(1.0, np.abs(plane_b))
+        side[i] = np.where(np.all(dist >= -scale, axis=0), 1, np.where(np.all(dist <= scale, axis=0), -1, 0))
+
+    node_plane, node_left, node_right, leaf_regions = [], [], [], []
+
+    def build(members):
+        node = len(node_plane)
+        node_plane.append(-1)
+        node_left.append(0)
+        node_right.append(0)
+        best, best_size = -1, len(members)
+        if len(members) > 1 and len(planes):
+            s = side[members]
+            above = np.sum(s >= 0, axis=0)
+            below = np.sum(s <= 0, axis=0)
+            size = np.maximum(above, below)
+            size[(above == len(members)) | (below == len(members))] = len(members)
+            if size.min() < len(members):
+                best = int(np.argmin(size))
+        if best < 0:
+            node_left[node] = len(leaf_regions)
+            leaf_regions.extend(members)
+            node_right[node] = len(leaf_regions)
+            return node
+        s = side[members, best]
+        node_plane[node] = best
+        node_left[node] = build([m for m, v in zip(members, s) if v <= 0])
+        node_right[node] = build([m for m, v in zip(members, s) if v >= 0])
+        return node
+
+    build(list(range(len(regions))))
+    return {
+        'gains': gains, 'offsets': offsets,
+        'region_A': region_A, 'region_b': region_b, 'region_ptr': region_ptr,
+        'planes': planes, 'plane_b': plane_b,
+        'node_plane': np.array(node_plane), 'node_left': np.array(node_left),
+        'node_right': np.array(node_right), 'leaf_regions': np.array(leaf_regions, dtype=int),
+    }
@@ -0,0 +1,238 @@
+import numpy as np
+import osqp
+from scipy import sparse
+from scipy.linalg import cho_factor, cho_solve
+from scipy.sparse.linalg import splu
+from .base_controller import BaseController
+from .linear_mpc import LinearMPC
+
+
+class FleetMPC(BaseController):
+    """The same linear MPC solved for many independent units in one call.
+
+    All units share the QP matrices of the sparse LinearMPC formulation; only
+    the initial-state bounds and the reference-dependent linear cost differ.
+    The QPs are solved together by the ADMM iteration OSQP uses. The units
+    share one step size rho, so the reduced KKT matrix
+    P + sigma I + A' diag(rho) A is factorized once per rho, and every
+    iteration solves for all units still running with a multi-right-hand-side
+    solve, so the per-tick cost grows much slower than one solver call per
+    unit. As in OSQP, rho is adapted from the ratio of the primal and dual
+    residuals (across the running units) and the matrix is refactorized when
+    it changes. Converged units stop iterating; units left unconverged after
+    max_iter are solved one by one with the OSQP workspace of the template
+    LinearMPC, and units OSQP cannot solve either (for example infeasible
+    ones) follow their previous plan, as LinearMPC does.
+    """
+
+    def __init__(self, A, B, Q, R, n_units, P=None, horizon=10,
+                 x_min=None, x_max=None, u_min=None, u_max=None, move_blocking=None,
+                 rho=0.1, sigma=1e-6, alpha=1.6, eps_abs=1e-4, eps_rel=1e-4,
+                 max_iter=4000, check_every=10, adaptive_rho_interval=50, min_batch=16, solver_settings=None):
+        """
+        Args:
+            A, B, Q, R, P, horizon, x_min, x_max, u_min, u_max, move_blocking:
+                As for LinearMPC, shared by every unit.
+            n_units (int): Number of units solved per call.
+            rho (float): Initial ADMM step size of the inequality rows;
+                equality rows use 1e3 * rho, as in OSQP.
+            sigma (float): Primal regularization.
+            alpha (float): Over-relaxation parameter in (0, 2).
+            eps_abs, eps_rel (float): Termination tolerances.
+            max_iter (int): ADMM iteration limit per call.
+            check_every (int): Iterations between convergence checks.
+            adaptive_rho_interval (int): Iterations between rho updates, a
+                multiple of check_every; 0 keeps rho fixed.
+            min_batch (int): Once fewer units than this are still running,
+                ADMM stops and they are solved one by one with OSQP, which is
+                faster for a few hard units than batched iterations.
+            solver_settings (dict, optional): OSQP settings of the per-unit
+                solves of unconverged units, as for LinearMPC.
+        """
+        self.template = LinearMPC(A, B, Q, R, P, horizon, x_min, x_max, u_min, u_max,
+                                  formulation='sparse', move_blocking=move_blocking,
+                                  solver_settings=solver_settings)
+        self.nx, self.nu, self.N = self.template.nx, self.template.nu, self.template.N
+        self.n_units = int(n_units)
+        self.alpha = alpha
+        self.eps_abs = eps_abs
+        self.eps_rel = eps_rel
+        self.max_iter = max_iter
+        self.check_every = check_every
+        if adaptive_rho_interval % check_every:
+            raise ValueError(f"adaptive_rho_interval ({adaptive_rho_interval}) must be a multiple of check_every ({check_every})")
+        self.adaptive_rho_interval = adaptive_rho_interval
+        self.min_batch = min_batch
+        self.sigma = sigma
+        self.status = None
+        self.solve_info = None
+
+        t = self.template
+        P_full = t._P_qp + sparse.triu(t._P_qp, k=1).T
+        self._l, self._u = t._l_qp.copy(), t._u_qp.copy()
+        self._equality = self._l == self._u
+        self._n_vars = P_full.shape[0]
+        self._P_sparse, self._A_sparse = P_full.tocsc(), t._A_qp.tocsc()
+        # Small problems (the usual fleet case) use dense matrices and a
+        # Cholesky factor; larger ones keep everything sparse
+        self._dense = self._n_vars <= 400
+        if self._dense:
+            self._P = P_full.toarray()
+            self._A = t._A_qp.toarray()
+        else:
+            self._P = P_full.tocsr()
+            self._A = t._A_qp.tocsr()
+        self._set_rho(rho)
+        self.reset()
+
+    def _set_rho(self, rho):
+        """Set the step size and factorize the reduced KKT matrix for it."""
+        self.rho = rho
+        self._rho = np.where(self._equality, 1e3 * rho, rho)
+        kkt = self._P_sparse + self.sigma * sparse.eye(self._n_vars) + self._A_sparse.T @ sparse.diags(self._rho) @ self._A_sparse
+        if self._dense:
+            factor = cho_factor(kkt.toarray())
+            self._solve = lambda rhs: cho_solve(factor, rhs)
+        else:
+            self._solve = splu(kkt.tocsc()).solve
+
+    @classmethod
+    def from_mpc(cls, mpc, n_units, **options):
+        """Fleet version of an MPCController design (no terminal weight, as MPCController)."""
+        options.setdefault('solver_settings', mpc.solver_settings)
+        return cls(mpc.A, mpc.B, mpc.Q, mpc.R, n_units, P=np.zeros((mpc.nx, mpc.nx)), horizon=mpc.N,
+                   x_min=mpc.x_min, x_max=mpc.x_max, u_min=mpc.u_min, u_max=mpc.u_max, **options)
+
+    def reset(self):
+        """Drop the warm start (the previous iterates of every unit)."""
+        m = self._A.shape[0]
+        self._x = np.zeros((self._n_vars, self.n_units))
+        self._z = np.zeros((m, self.n_units))
+        self._y = np.zeros((m, self.n_units))
+        self._planned = np.zeros(self.n_units, dtype=bool)  # units with a plan to fall back on
+        self.converged = np.zeros(self.n_units, dtype=bool)
+
+    def _problem_data(self, states, references):
+        """Per-unit linear cost q (n, units) and bounds l, u (m, units)."""
+        t, nx, N = self.template, self.nx, self.N
+        q = np.zeros((self._n_vars, self.n_units))
+        q[:nx * N] = np.tile(-(references @ t.Q.T).T, (N, 1))
+        q[nx * N:t._n_x_vars] = -(references @ t.P.T).T
+        l = np.repeat(self._l[:, None], self.n_units, axis=1)
+        u = np.repeat(self._u[:, None], self.n_units, axis=1)
+        l[:nx] = -states.T
+        u[:nx] = -states.T
+        return q, l, u
+
+    def compute_control(self, states, references=None):
+        """
+        First inputs of every unit's optimal plan.
+
+        Args:
+            states (np.ndarray): Current states (n_units, nx).
+            references (np.ndarray, optional): State references, (nx,) shared
+                by all units or (n_units, nx). Zero when omitted.
+
+        Returns:
+            np.ndarray: (n_units, nu) inputs.
+        """
+        states = np.asarray(states, dtype=float).reshape(self.n_units, self.nx)
+        if references is None:
+            references = np.zeros(self.nx)
+        references = np.broadcast_to(np.asarray(references, dtype=float), (self.n_units, self.nx))
+        q, l, u = self._problem_data(states, references)
+        previous = self._x.copy()
+
+        A, P, alpha = self._A, self._P, self.alpha
+        # Iterates of the running units; finished units are written back and dropped
+        active = np.arange(self.n_units)
+        x, z, y = self._x, np.clip(self._z, l, u), self._y
+        q_a, l_a, u_a = q, l, u
+        iteration = 0
+        rho_updates = 0
+        while active.size and iteration < self.max_iter:
+            iteration += 1
+            rho, sigma = self._rho[:, None], self.sigma
+            x_tilde = self._solve(sigma * x - q_a + A.T @ (rho * z - y))
+            z_tilde = A @ x_tilde
+            x = alpha * x_tilde + (1 - alpha) * x
+            z_relaxed = alpha * z_tilde + (1 - alpha) * z
+            z_next = np.clip(z_relaxed + y / rho, l_a, u_a)
+            y = y + rho * (z_relaxed - z_next)
+            z = z_next
+
+            if iteration % self.check_every and iteration < self.max_iter:
+                continue
+            Ax, Px, Aty = A @ x, P @ x, A.T @ y
+            primal = np.abs(Ax - z).max(axis=0)
+            dual = np.abs(Px + q_a + Aty).max(axis=0)
+            primal_scale = np.maximum(np.abs(Ax).max(axis=0), np.abs(z).max(axis=0))
+            dual_scale = np.maximum.reduce([np.abs(Px).max(axis=0), np.abs(Aty).max(axis=0), np.abs(q_a).max(axis=0)])
+            done = (primal <= self.eps_abs + self.eps_rel * primal_scale) & (dual <= self.eps_abs + self.eps_rel * dual_scale)
+            if done.any():
+                finished = active[done]
+                self._x[:, finished], self._z[:, finished], self._y[:, finished] = x[:, done], z[:, done], y[:, done]
+                keep = ~done
+                active = active[keep]
+                x, z, y = x[:, keep], z[:, keep], y[:, keep]
+                q_a, l_a, u_a = q_a[:, keep], l_a[:, keep], u_a[:, keep]
+                primal, dual, primal_scale, dual_scale = primal[keep], dual[keep], primal_scale[keep], dual_scale[keep]
+            if active.size < self.min_batch:
+                break
+
+            if active.size and self.adaptive_rho_interval and iteration % self.adaptive_rho_interval == 0:
+                # OSQP's rule, rho * sqrt(normalized primal / normalized dual residual),
+                # averaged (geometrically) over the running units
+                ratio = (primal / (primal_scale + 1e-10)) / (dual / (dual_scale + 1e-10) + 1e-30)
+                rho_new = float(np.clip(self.rho * np.exp(0.5 * np.mean(np.log(ratio + 1e-30))), 1e-6, 1e6))
+                if not self.rho / 5.0 <= rho_new <= 5.0 * self.rho:
+                    self._set_rho(rho_new)
+                    rho_updates += 1
+        self._x[:, active], self._z[:, active], self._y[:, active] = x, z, y
+
+        converged = np.ones(self.n_units, dtype=bool)
+        self.status = 'solved'
+        for unit in active:
+            status = self._solve_unit(unit, q, l, u, states[unit], previous[:, unit])
+            if status is not None:
+                converged[unit] = False
+                if self.status == 'solved':
+                    self.status = status
+        self._planned[converged] = True
+        self.converged = converged
+        self.solve_info = {'status': self.status, 'iterations': iteration, 'rho': self.rho, 'rho_updates': rho_updates,
+                           'admm_converged': self.n_units - active.size, 'resolved': active.size,
+                           'converged': int(converged.sum()), 'fallback': not converged.all()}
+        first = self._x[self.template._n_x_vars:self.template._n_x_vars + self.nu].T
+        return np.clip(first, self.template.u_min, self.template.u_max)
+
+    def _solve_unit(self, unit, q, l, u, state, previous):
+        """Solve one unit with the template's OSQP workspace, warm started from its ADMM iterate.
+
+        Returns None when solved, else the OSQP status; the unit then follows
+        its previous plan shifted by one step (zeros without one).
+        """
+        t = self.template
+        # Columns are strided views; OSQP needs contiguous vectors
+        t._solver.update(q=q[:, unit].copy(), l=l[:, unit].copy(), u=u[:, unit].copy())
+        t._solver.warm_start(x=self._x[:, unit].copy(), y=self._y[:, unit].copy())
+        result = t._solver.solve(raise_error=False)
+        if result.info.status_val in (osqp.SolverStatus.OSQP_SOLVED, osqp.SolverStatus.OSQP_SOLVED_INACCURATE):
+            self._x[:, unit], self._y[:, unit] = result.x, result.y
+            self._z[:, unit] = np.clip(self._A @ result.x, l[:, unit], u[:, unit])
+            return None
+        if self._planned[unit]:
+            t._solution = previous
+            self._x[:, unit] = t._shifted_solution(state)
+        else:
+            self._x[:, unit] = 0.0
+        self._z[:, unit] = np.clip(self._A @ self._x[:, unit], l[:, unit], u[:, unit])
+        self._y[:, unit] = 0.0
+        return result.info.status
+
+    def update(self, states, references=None):
+        return self.compute_control(states, references)
+
+    def get_predictions(self):
+        """Predicted states of every unit, (n_units, N + 1, nx)."""
+        return self._x[:self.template._n_x_vars].T.reshape(self.n_units, self.N + 1, self.nx)
@@ -0,0 +1,333 @@
+import numpy as np
+import osqp
+from scipy import sparse
+from .base_controller import BaseController
+
+
+class LinearMPC(BaseController):
+    def __init__(self, A, B, Q, R, P=None, horizon=10,
+                 x_min=None, x_max=None, u_min=None, u_max=None,
+                 formulation='sparse', move_blocking=None, solver_settings=None):
+        """
+        Linear MPC for x_{k+1} = A x_k + B u_k with a persistent OSQP workspace.
+
+        Minimizes sum_{k<N} (x_k - r_k)' Q (x_k - r_k) + u_k' R u_k
+        + (x_N - r_N)' P (x_N - r_N) subject to the dynamics and box bounds on
+        x_0..x_N and u_0..u_{N-1}. The bounds include the measured state x_0
+        in both formulations, so a state outside [x_min, x_max] makes the QP
+        infeasible and the controller falls back to its previous plan (see
+        solve_info).
+
+        Args:
+            A, B (np.ndarray): Discrete-time model (nx x nx), (nx x nu).
+            Q, R (np.ndarray): Stage weights on the state error and the input.
+            P (np.ndarray, optional): Terminal weight, defaults to Q.
+            horizon (int): Prediction horizon N.
+            x_min, x_max, u_min, u_max (array_like, optional): Bounds,
+                unbounded (+-inf) when omitted.
+            formulation (str): 'sparse' keeps the states as variables with
+                banded equality constraints, which scales linearly in N;
+                'condensed' eliminates them, giving a small dense QP in the
+                inputs only, which suits short horizons and few inputs.
+            move_blocking (int or sequence, optional): Hold each free input
+                for this many steps, or a sequence of block lengths summing
+                to N. Reduces the input variables from N*nu to n_blocks*nu.
+            solver_settings (dict, optional): Extra OSQP settings.
+        """
+        self.A = np.asarray(A, dtype=float)
+        self.B = np.asarray(B, dtype=float)
+        self.nx, self.nu = self.B.shape
+        self.N = int(horizon)
+        self.Q = np.asarray(Q, dtype=float)
+        self.R = np.asarray(R, dtype=float)
+        self.P = self.Q if P is None else np.asarray(P, dtype=float)
+
+        self.x_min = self._bound(x_min, self.nx, -np.inf)
+        self.x_max = self._bound(x_max, self.nx, np.inf)
+        self.u_min = self._bound(u_min, self.nu, -np.inf)
+        self.u_max = self._bound(u_max, self.nu, np.inf)
+
+        if formulation not in ('sparse', 'condensed'):
+            raise ValueError(f"Unknown formulation '{formulation}', expected 'sparse' or 'condensed'")
+        self.formulation = formulation
+        self.blocks = self._blocking(move_blocking, self.N)
+        self.n_blocks = len(self.blocks)
+        # Step k uses input block _block_of[k]
+        self._block_of = np.repeat(np.arange(self.n_blocks), self.blocks)
+        self._M = sparse.csc_matrix((np.ones(self.N), (np.arange(self.N), self._block_of)),
+                                    shape=(self.N, self.n_blocks))
+
+        self.solver_settings = {'eps_abs': 1e-5, 'eps_rel': 1e-5}
+        if solver_settings:
+            self.solver_settings.update(solver_settings)
+        self._solution = None   # last primal solution
+        self._dual = None
+        self._state = None      # state of the last solve
+        self.status = None
+        self.solve_info = None  # status, iterations, solve_time [s] and fallback flag of the last solve
+
+        if formulation == 'sparse':
+            self._setup_sparse()
+        else:
+            self._setup_condensed()
+
+    @staticmethod
+    def _bound(value, n, default):
+        if value is None:
+            return np.full(n, default)
+        return np.broadcast_to(np.asarray(value, dtype=float), (n,)).copy()
+
+    @staticmethod
+    def _blocking(move_blocking, N):
+        if move_blocking is None:
+            return np.ones(N, dtype=int)
+        if np.ndim(move_blocking) == 0:
+            size = int(move_blocking)
+            if size < 1:
+                raise ValueError(f"move_blocking must be at least 1, got {size}")
+            return np.array([size] * (N // size) + ([N % size] if N % size else []), dtype=int)
+        blocks = np.asarray(move_blocking, dtype=int)
+        if blocks.sum() != N or np.any(blocks < 1):
+            raise ValueError(f"move_blocking lengths must be positive and sum to the horizon ({N}), got {list(blocks)}")
+        return blocks
+
+    def _reference(self, reference):
+        """Reference as an (N + 1, nx) trajectory."""
+        if reference is None:
+            return np.zeros((self.N + 1, self.nx))
+        return np.broadcast_to(np.asarray(reference, dtype=float), (self.N + 1, self.nx))
+
+    @staticmethod
+    def _block_diagonal_upper(blocks):
+        """Upper-triangular block-diagonal CSC matrix with every in-block entry stored (explicit zeros kept)."""
+        rows, cols, data = [], [], []
+        offset = 0
+        for W in blocks:
+            iu, ju = np.triu_indices(W.shape[0])
+            rows.append(offset + iu)
+            cols.append(offset + ju)
+            data.append(W[iu, ju])
+            offset += W.shape[0]
+        P = sparse.coo_matrix((np.concatenate(data), (np.concatenate(rows), np.concatenate(cols))),
+                              shape=(offset, offset)).tocsc()
+        P.sort_indices()
+        return P
+
+    def _setup_solver(self, P, q, A, l, u):
+        self._P_qp, self._A_qp, self._l_qp, self._u_qp = P, A, l, u
+        self._solver = osqp.OSQP()
+        self._solver.setup(P, q, A, l, u, warm_starting=True, verbose=False, **self.solver_settings)
+
+    # Sparse formulation: z = [x_0, ..., x_N, v_0, ..., v_{n_blocks-1}]
+
+    def _setup_sparse(self):
+        nx, nu, N = self.nx, self.nu, self.N
+        self._n_x_vars = nx * (N + 1)
+        # x_0 = state and x_{k+1} = A x_k + B v_{block(k)}
+        Ax = sparse.kron(sparse.eye(N + 1), -sparse.eye(nx)) + sparse.kron(sparse.eye(N + 1, k=-1), self.A)
+        shift = sparse.vstack([sparse.csc_matrix((1, N)), sparse.eye(N)])
+        Bu = sparse.kron(shift @ self._M, self.B)
+        A_qp = sparse.vstack([sparse.hstack([Ax, Bu]), sparse.eye(self._n_x_vars + nu * self.n_blocks)], format='csc')
+        l, u = self._sparse_bounds(np.zeros(nx))
+        self._setup_solver(self._sparse_cost(), self._sparse_linear_cost(self._reference(None)), A_qp, l, u)
+
+    def _sparse_cost(self):
+        blocks = [self.Q] * self.N + [self.P] + [n * self.R for n in self.blocks]
+        return self._block_diagonal_upper(blocks)
+
+    def _sparse_linear_cost(self, reference):
+        q = np.zeros(self._n_x_vars + self.nu * self.n_blocks)
+        q[:self.nx * self.N] = -(reference[:-1] @ self.Q.T).ravel()
+        q[self.nx * self.N:self._n_x_vars] = -self.P @ reference[-1]
+        return q
+
+    def _sparse_bounds(self, state):
+        n_eq = self._n_x_vars
+        l_eq = np.zeros(n_eq)
+        l_eq[:self.nx] = -state
+        u_eq = l_eq.copy()
+        l_box = np.concatenate([np.tile(self.x_min, self.N + 1), np.tile(self.u_min, self.n_blocks)])
+        u_box = np.concatenate([np.tile(self.x_max, self.N + 1), np.tile(self.u_max, self.n_blocks)])
+        return np.concatenate([l_eq, l_box]), np.concatenate([u_eq, u_box])
+
+    # Condensed formulation: z = [v_0, ..., v_{n_blocks-1}], x_1..x_N = Phi x_0 + G z
+
+    def _setup_condensed(self):
+        nx, nu, N = self.nx, self.nu, self.N
+        self._n_x_vars = 0
+        # Phi stacks A^1..A^N; Gamma[i, j] = A^(i-j) B for j <= i
+        powers = [np.eye(nx)]
+        for _ in range(N):
+            powers.append(self.A @ powers[-1])
+        self._Phi = np.vstack(powers[1:])
+        AB = np.stack([Ak @ self.B for Ak in powers[:N]])  # A^k B for k = 0..N-1
+        Gamma = np.zeros((N, nx, N, nu))
+        for i in range(N):
+            Gamma[i, :, :i + 1] = np.moveaxis(AB[i::-1], 0, 1)
+        Gamma = Gamma.reshape(N * nx, N * nu)
+        # Merge the columns of each input block
+        self._G = (sparse.csr_matrix(Gamma) @ sparse.kron(self._M, sparse.eye(nu))).toarray()
+        self._condensed_cost()
+
+        # Only stages/components with a finite state bound become constraint
+        # rows. Stage 0 is the measured state: its rows have no variables and
+        # only check the bounds, as the x_0 bounds of the sparse formulation do.
+        self._Phi_bounds = np.vstack([np.eye(nx), self._Phi])
+        finite = np.isfinite(np.tile(self.x_min, N + 1)) | np.isfinite(np.tile(self.x_max, N + 1))
+        self._state_rows = np.flatnonzero(finite)
+        G_bounds = np.vstack([np.zeros((nx, self._G.shape[1])), self._G])
+        A_qp = sparse.vstack([sparse.csc_matrix(G_bounds[self._state_rows]),
+                              sparse.eye(nu * self.n_blocks)], format='csc')
+        l, u = self._condensed_bounds(np.zeros(nx))
+        self._setup_solver(self._H, self._condensed_linear_cost(np.zeros(nx), self._reference(None)), A_qp, l, u)
+
+    def _condensed_cost(self):
+        N, nx = self.N, self.nx
+        weights = np.stack([self.Q] * (N - 1) + [self.P])
+        QG = np.einsum('kij,kjc->kic', weights, self._G.reshape(N, nx, -1)).reshape(N * nx, -1)
+        QPhi = np.einsum('kij,kjc->kic', weights, self._Phi.reshape(N, nx, nx)).reshape(N * nx, nx)
+        Rbar = sparse.kron(sparse.diags(self.blocks.astype(float)), self.R)
+        H = self._G.T @ QG + Rbar.toarray()
+        H = 0.5 * (H + H.T)
+        iu, ju = np.triu_indices(H.shape[0])
+        self._H = sparse.csc_matrix((H[iu, ju], (iu, ju)), shape=H.shape)
+        self._H.sort_indices()
+        self._F = QG.T @ self._Phi        # G' Qbar Phi
+        self._GQ = QG.T                   # G' Qbar
+
+    def _condensed_linear_cost(self, state, reference):
+        return self._F @ state - self._GQ @ reference[1:].ravel()
+
+    def _condensed_bounds(self, state):
+        free = (self._Phi_bounds @ state)[self._state_rows]
+        l_x = np.tile(self.x_min, self.N + 1)[self._state_rows] - free
+        u_x = np.tile(self.x_max, self.N + 1)[self._state_rows] - free
+        return (np.concatenate([l_x, np.tile(self.u_min, self.n_blocks)]),
+                np.concatenate([u_x, np.tile(self.u_max, self.n_blocks)]))
+
+    # Online use
+
+    def set_weights(self, Q=None, R=None, P=None):
+        """Change the cost matrices; only the values of the factorized matrix are updated."""
+        if Q is not None:
+            self.Q = np.asarray(Q, dtype=float)
+        if R is not None:
+            self.R = np.asarray(R, dtype=float)
+        if P is not None:
+            self.P = np.asarray(P, dtype=float)
+        if self.formulation == 'sparse':
+            self._P_qp = self._sparse_cost()
+        else:
+            self._condensed_cost()
+            self._P_qp = self._H
+        self._solver.update(Px=self._P_qp.data)
+
+    def set_constraints(self, x_min=None, x_max=None, u_min=None, u_max=None):
+        """Change the bounds without rebuilding the problem."""
+        if x_min is not None:
+            self.x_min = self._bound(x_min, self.nx, -np.inf)
+        if x_max is not None:
+            self.x_max = self._bound(x_max, self.nx, np.inf)
+        if u_min is not None:
+            self.u_min = self._bound(u_min, self.nu, -np.inf)
+        if u_max is not None:
+            self.u_max = self._bound(u_max, self.nu, np.inf)
+        state = np.zeros(self.nx) if self._state is None else self._state
+        if self.formulation == 'sparse':
+            self._l_qp, self._u_qp = self._sparse_bounds(state)
+        else:
+            finite = np.isfinite(np.tile(self.x_min, self.N + 1)) | np.isfinite(np.tile(self.x_max, self.N + 1))
+            if not np.array_equal(np.flatnonzero(finite), self._state_rows):
+                # The set of constrained states changed, so the constraint matrix does too
+                self._setup_condensed()
+                self._solution = self._dual = None
+                return
+            self._l_qp, self._u_qp = self._condensed_bounds(state)
+        self._solver.update(l=self._l_qp, u=self._u_qp)
+
+    def _inputs(self, solution):
+        """(N, nu) input sequence of a solution."""
+        v = solution[self._n_x_vars:].reshape(self.n_blocks, self.nu)
+        return v[self._block_of]
+
+    def _shifted_solution(self, state):
+        """Previous solution moved one step ahead, used as warm start and fallback."""
+        inputs = self._inputs(self._solution)
+        inputs = np.vstack([inputs[1:], inputs[-1:]])
+        # First step of every block after the shift
+        v = inputs[np.cumsum(self.blocks) - self.blocks].ravel()
+        if self.formulation == 'condensed':
+            return v
+        xs = self._solution[:self._n_x_vars].reshape(self.N + 1, self.nx)
+        xs = np.vstack([xs[1:], xs[-1:]])
+        xs[0] = state
+        return np.concatenate([xs.ravel(), v])
+
+    def compute_control(self, state, reference=None):
+        """
+        First input of the optimal plan.
+
+        Args:
+            state (np.ndarray): Current state (nx,).
+            reference (np.ndarray, optional): State reference, constant (nx,)
+                or a trajectory (N + 1, nx). Zero when omitted.
+
+        Returns:
+            np.ndarray: u_0 (nu,).
+        """
+        state = np.asarray(state, dtype=float)
+        reference = self._reference(reference)
+        if self.formulation == 'sparse':
+            q = self._sparse_linear_cost(reference)
+            self._l_qp[:self.nx] = -state
+            self._u_qp[:self.nx] = -state
+        else:
+            q = self._condensed_linear_cost(state, reference)
+            self._l_qp, self._u_qp = self._condensed_bounds(state)
+        self._solver.update(q=q, l=self._l_qp, u=self._u_qp)
+
+        shifted = None
+        if self._solution is not None:
+            shifted = self._shifted_solution(state)
+            self._solver.warm_start(x=shifted, y=self._dual)
+
+        result = self._solver.solve(raise_error=False)
+        self.status = result.info.status
+        self.solve_info = {'status': self.status, 'iterations': result.info.iter,
+                           'solve_time': result.info.run_time, 'fallback': False}
+        self._state = state
+        if result.info.status_val in (osqp.SolverStatus.OSQP_SOLVED,
+                                      osqp.SolverStatus.OSQP_SOLVED_INACCURATE):
+            self._solution = result.x
+            self._dual = result.y
+            return self._inputs(self._solution)[0].copy()
+
+        self.solve_info['fallback'] = True
+        if shifted is not None:
+            # Keep following the last feasible plan instead of dropping it
+            self._solution = shifted
+            return self._inputs(shifted)[0].copy()
+        return np.zeros(self.nu)
+
+    def update(self, state, reference=None):
+        return self.compute_control(state, reference)
+
+    def reset(self):
+        """Forget the previous solution used for warm starting"""
+        self._solution = None
+        self._dual = None
+
+    def get_prediction(self):
+        """Predicted states (nx, N + 1) of the last plan, or None before the first solve."""
+        if self._solution is None:
+            return None
+        if self.formulation == 'sparse':
+            return self._solution[:self._n_x_vars].reshape(self.N + 1, self.nx).T
+        states = (self._Phi @ self._state + self._G @ self._solution).reshape(self.N, self.nx)
+        return np.vstack([self._state, states]).T
+
+    def get_inputs(self):
+        """Planned inputs (nu, N) of the last plan, or None before the first solve."""
+        if self._solution is None:
+            return None
+        return self._inputs(self._solution).T
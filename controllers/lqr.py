@@ -1,16 +1,157 @@
-from .base_controller.py import BaseController
+import hashlib
+import os
+from collections import OrderedDict
+
+import numpy as np
+from .base_controller import BaseController
+
+# In-memory LRU cache of Riccati solutions, keyed by riccati_key()
+_RICCATI_CACHE = OrderedDict()
+RICCATI_CACHE_SIZE = 256
+
+
+def riccati_key(A, B, Q, R, dt=None):
+    """Hash of the problem data identifying a Riccati solution."""
+    digest = hashlib.sha1()
+    for M in (A, B, Q, R):
+        M = np.ascontiguousarray(M, dtype=float)
+        digest.update(repr(M.shape).encode())
+        digest.update(M.tobytes())
+    digest.update(repr(None if dt is None else float(dt)).encode())
+    return digest.hexdigest()
+
+
+def solve_riccati(A, B, Q, R, dt=None, cache_dir=None):
+    """Solve the LQR Riccati equation, reusing earlier solutions.
+
+    Args:
+        A, B (np.ndarray): System matrices. Continuous-time when dt is None,
+            otherwise the discrete-time model sampled at dt.
+        Q, R (np.ndarray): State and input weights.
+        dt (float, optional): Sampling time for discrete-time LQR.
+        cache_dir (str, optional): Directory for an on-disk cache layer that
+            persists solutions across processes.
+
+    Returns:
+        tuple: (K, P) with the optimal feedback u = -K x and the Riccati
+        solution, read-only because the cache shares them.
+    """
+    key = riccati_key(A, B, Q, R, dt)
+    if key in _RICCATI_CACHE:
+        _RICCATI_CACHE.move_to_end(key)
+        return _RICCATI_CACHE[key]
+
+    path = os.path.join(cache_dir, key + '.npz') if cache_dir else None
+    if path and os.path.exists(path):
+        with np.load(path) as data:
+            K, P = data['K'], data['P']
+    else:
+        from scipy.linalg import solve_continuous_are, solve_discrete_are
+
+        A, B, Q, R = (np.asarray(M, dtype=float) for M in (A, B, Q, R))
+        if dt is None:
+            P = solve_continuous_are(A, B, Q, R)
+            K = np.linalg.solve(R, B.T @ P)
+        else:
+            P = solve_discrete_are(A, B, Q, R)
+            K = np.linalg.solve(R + B.T @ P @ B, B.T @ P @ A)
+        if path:
+            os.makedirs(cache_dir, exist_ok=True)
+            # Write then rename, so concurrent workers never read a partial file
+            temporary = f'{path}.{os.getpid()}.tmp'
+            with open(temporary, 'wb') as f:
+                np.savez(f, K=K, P=P)
+            os.replace(temporary, path)
+
+    # Shared between controllers, so callers must not modify them in place
+    K.flags.writeable = False
+    P.flags.writeable = False
+    _RICCATI_CACHE[key] = (K, P)
+    if len(_RICCATI_CACHE) > RICCATI_CACHE_SIZE:
+        _RICCATI_CACHE.popitem(last=False)
+    return K, P
+
+
+def clear_riccati_cache():
+    _RICCATI_CACHE.clear()
+
 
 class LQRController(BaseController):
-    def __init__(self, A, B, Q, R):
+    def __init__(self, A, B, Q, R, dt=None, cache_dir=None):
+        """
+        Linear-quadratic regulator u = -K (x - x_ref).
+
+        Args:
+            A, B (np.ndarray): System matrices, continuous-time when dt is None
+                and discrete-time otherwise.
+            Q, R (np.ndarray): State and input weights.
+            dt (float, optional): Sampling time of a discrete-time model.
+            cache_dir (str, optional): On-disk layer for the Riccati cache.
+        """
         self.A = A
         self.B = B
         self.Q = Q
         self.R = R
+        self.dt = dt
+        self.K, self.P = solve_riccati(A, B, Q, R, dt, cache_dir)
+
+    def update(self, state, reference=None):
+        error = np.asarray(state, dtype=float)
+        if reference is not None:
+            error = error - reference
+        return -self.K @ error
 
-    def update(self, state):
-        # Implement LQR update logic here
+    def compute_control(self, state, reference=None):
+        return self.update(state, reference)
+
+    def reset(self):
+        # The regulator is static, there is nothing to reset
         pass
 
+
+class GainScheduledLQR(BaseController):
+    def __init__(self, model, grid, Q, R, dt=None, cache_dir=None, scheduling=None):
+        """
+        LQR with gains precomputed over a grid of operating points.
+
+        Args:
+            model (callable): model(operating_point) -> (A, B) linearization
+                at an operating point given as a 1-D array.
+            grid (sequence): One increasing 1-D array per scheduling variable.
+            Q, R (np.ndarray): State and input weights.
+            dt (float, optional): Sampling time when model returns discrete-time matrices.
+            cache_dir (str, optional): On-disk layer for the Riccati cache.
+            scheduling (callable, optional): Maps the state to the operating
+                point, defaults to the first len(grid) state components.
+        """
+        self.grid = tuple(np.asarray(g, dtype=float) for g in grid)
+        self.Q = Q
+        self.R = R
+        self.dt = dt
+        self.scheduling = scheduling if scheduling is not None else (lambda x: x[:len(self.grid)])
+
+        shape = tuple(len(g) for g in self.grid)
+        points = np.stack(np.meshgrid(*self.grid, indexing='ij'), -1).reshape(-1, len(self.grid))
+        gains = [solve_riccati(*model(point), Q, R, dt, cache_dir)[0] for point in points]
+        self.gains = np.array(gains).reshape(shape + gains[0].shape)
+        from scipy.interpolate import RegularGridInterpolator
+
+        self._interpolator = RegularGridInterpolator(self.grid, self.gains.reshape(shape + (-1,)))
+
+    def gain(self, operating_point):
+        """Multilinear interpolation of K, held constant beyond the grid edges."""
+        point = np.clip(operating_point, [g[0] for g in self.grid], [g[-1] for g in self.grid])
+        return self._interpolator(point[None])[0].reshape(self.gains.shape[-2:])
+
+    def update(self, state, reference=None, operating_point=None):
+        state = np.asarray(state, dtype=float)
+        if operating_point is None:
+            operating_point = self.scheduling(state)
+        error = state if reference is None else state - reference
+        return -self.gain(np.asarray(operating_point, dtype=float)) @ error
+
+    def compute_control(self, state, reference=None):
+        return self.update(state, reference)
+
     def reset(self):
-        # Implement reset logic if needed
         pass
@@ -1,6 +1,7 @@
 import numpy as np
-import cvxpy as cp
-from .base_controller.py import BaseController
+from utils.discretization import discretize
+from .base_controller import BaseController
+from .linear_mpc import LinearMPC
 
 class MPCController(BaseController):
     def __init__(self, 
@@ -10,7 +11,11 @@ class MPCController(BaseController):
                  R=None,               # input cost matrix
                  mass=1.0,             # mass of the system
                  spring_k=1.0,         # spring constant
-                 damping_b=0.2):       # damping coefficient
+                 damping_b=0.2,        # damping coefficient
+                 backend='osqp',       # 'osqp' (cached workspace) or 'cvxpy'
+                 solver_settings=None, # extra OSQP settings
+                 formulation='sparse', # 'sparse' or 'condensed' QP (osqp backend)
+                 move_blocking=None):  # input blocking (osqp backend), see LinearMPC
         
         # System dimensions
         self.nx = 2  # number of states [position, velocity]
@@ -33,9 +38,25 @@ class MPCController(BaseController):
         self.u_min = np.array([-10.0])       # min force
         self.u_max = np.array([10.0])        # max force
         
+        self.backend = backend
+        self.solver_settings = {'eps_abs': 1e-5, 'eps_rel': 1e-5, 'polishing': True}
+        if solver_settings:
+            self.solver_settings.update(solver_settings)
+        self.status = None        # solver status of the last solve
+        self.solve_info = None    # status, iterations, solve_time [s] and fallback flag of the last solve
+        
         # Create discrete state-space model
         self._discretize_system()
-        self._setup_optimization_problem()
+        if backend == 'osqp':
+            # No terminal weight, the stage cost covers x_0..x_{N-1}
+            self._qp = LinearMPC(self.A, self.B, self.Q, self.R, P=np.zeros((self.nx, self.nx)),
+                                 horizon=self.N, x_min=self.x_min, x_max=self.x_max,
+                                 u_min=self.u_min, u_max=self.u_max, formulation=formulation,
+                                 move_blocking=move_blocking, solver_settings=self.solver_settings)
+        elif backend == 'cvxpy':
+            self._setup_optimization_problem()
+        else:
+            raise ValueError(f"Unknown backend '{backend}', expected 'osqp' or 'cvxpy'")
         
     def _discretize_system(self):
         """Convert continuous system to discrete state-space"""
@@ -45,12 +66,14 @@ class MPCController(BaseController):
         Bc = np.array([[0],
                       [1/self.mass]])
         
-        # Discretize using forward Euler (for simplicity)
-        self.A = np.eye(2) + self.dt * Ac
-        self.B = self.dt * Bc
+        # Discretize using forward Euler (for simplicity), shared through the
+        # discretization cache between controllers with the same model
+        self.A, self.B = discretize(Ac, Bc, self.dt, 'euler')
         
     def _setup_optimization_problem(self):
         """Setup the MPC optimization problem"""
+        import cvxpy as cp  # only the cvxpy backend needs it, and it is slow to import
+
         # Variables
         self.x = cp.Variable((self.nx, self.N + 1))
         self.u = cp.Variable((self.nu, self.N))
@@ -58,6 +81,9 @@ class MPCController(BaseController):
         # Parameters
         self.x0 = cp.Parameter(self.nx)
         self.xr = cp.Parameter(self.nx)  # reference state
+        # Q @ xr as its own parameter keeps the problem DPP, so cvxpy
+        # canonicalizes once and later solves only refresh parameter values
+        self.q_ref = cp.Parameter(self.nx)
         
         # Initialize objective and constraints
         objective = 0
@@ -66,7 +92,8 @@ class MPCController(BaseController):
         # Add stage costs and constraints
         for k in range(self.N):
             # Objective function
-            objective += cp.quad_form(self.x[:, k] - self.xr, self.Q) + \
+            # (x - xr)' Q (x - xr) without the constant xr' Q xr term
+            objective += cp.quad_form(self.x[:, k], self.Q) - 2 * self.q_ref @ self.x[:, k] + \
                         cp.quad_form(self.u[:, k], self.R)
             
             # System dynamics
@@ -82,32 +109,82 @@ class MPCController(BaseController):
         # Create and store the optimization problem
         self.problem = cp.Problem(cp.Minimize(objective), constraints)
         
+    def set_weights(self, Q=None, R=None):
+        """Change the cost matrices without rebuilding the problem."""
+        if Q is not None:
+            self.Q = np.asarray(Q, dtype=float)
+        if R is not None:
+            self.R = np.asarray(R, dtype=float)
+        if self.backend == 'osqp':
+            self._qp.set_weights(self.Q, self.R)
+        else:
+            self._setup_optimization_problem()
+            
+    def set_constraints(self, x_min=None, x_max=None, u_min=None, u_max=None):
+        """Change the state and input bounds without rebuilding the problem."""
+        if x_min is not None:
+            self.x_min = np.asarray(x_min, dtype=float)
+        if x_max is not None:
+            self.x_max = np.asarray(x_max, dtype=float)
+        if u_min is not None:
+            self.u_min = np.asarray(u_min, dtype=float)
+        if u_max is not None:
+            self.u_max = np.asarray(u_max, dtype=float)
+        if self.backend == 'osqp':
+            self._qp.set_constraints(self.x_min, self.x_max, self.u_min, self.u_max)
+        else:
+            self._setup_optimization_problem()
+        
     def compute_control(self, state, reference=None):
         """Compute the control input for the current state"""
         if reference is None:
             reference = np.zeros(self.nx)
+        if self.backend == 'osqp':
+            u = self._qp.compute_control(state, reference)
+            self.status = self._qp.status
+            self.solve_info = self._qp.solve_info
+            return u
             
+        import cvxpy as cp
+
         # Update parameters
         self.x0.value = state
         self.xr.value = reference
+        self.q_ref.value = self.Q @ reference
         
         try:
             # Solve the optimization problem
-            self.problem.solve(solver=cp.OSQP)
+            self.problem.solve(solver=cp.OSQP, warm_start=True)
+            self.status = self.problem.status
+            stats = self.problem.solver_stats
+            self.solve_info = {'status': self.status, 'iterations': stats.num_iters,
+                               'solve_time': stats.solve_time, 'fallback': False}
             
             if self.problem.status == cp.OPTIMAL:
                 # Return the first control input
                 return self.u.value[:, 0]
             else:
-                print(f"Warning: Problem status {self.problem.status}")
+                self.solve_info['fallback'] = True
                 return np.zeros(self.nu)
                 
         except cp.error.SolverError:
-            print("Error: Solver failed")
+            self.status = 'solver_error'
+            self.solve_info = {'status': self.status, 'iterations': None, 'solve_time': None, 'fallback': True}
             return np.zeros(self.nu)
             
+    def update(self, state, reference=None):
+        return self.compute_control(state, reference)
+        
+    def reset(self):
+        """Forget the previous solution used for warm starting"""
+        if self.backend == 'osqp':
+            self._qp.reset()
+        
     def get_prediction(self):
         """Return the predicted trajectory"""
+        if self.backend == 'osqp':
+            return self._qp.get_prediction()
         if self.x.value is None:
             return None
         return self.x.value
+
@@ -1,4 +1,5 @@
-from base_controller import BaseController
+import numpy as np
+from .base_controller import BaseController
 
 class PIDController(BaseController):
 
@@ -39,10 +40,107 @@ class PIDController(BaseController):
         controlVariable = (self.Kp * self.error) + (self.Ki * self.integral) + (self.Kd * derivative)
 
         return controlVariable
-    
+
+    def compute_control(self, measurement, reference=None):
+
+        return self.update(0 if reference is None else reference, measurement)
+
     def reset(self):
         
         self.error = 0
         self.integral = 0
 
-       
+
+class PIDBank(BaseController):
+    """Many independent PID loops updated together.
+
+    Gains, integrators and previous errors are arrays with one entry per
+    channel. With ANTI_WINDUP='clamp', no output limits and TF=0 a single
+    channel reproduces PIDController exactly.
+
+    ANTI_WINDUP modes:
+        'clamp': clamp the integral to INT_LIMITS (as PIDController).
+        'back_calculation': bleed the integral by KB * (saturated - unsaturated
+            output), requires OUT_LIMITS.
+        'none': leave the integral unbounded.
+
+    TF is the time constant of a first-order filter on the derivative term
+    (0 disables it).
+    """
+
+    def __init__(self, Kp = 0, Ki = 0, Kd = 0, DT = 1, INT_LIMITS = [-100, 100], N_CHANNELS = None,
+                 OUT_LIMITS = None, ANTI_WINDUP = 'clamp', KB = 1.0, TF = 0.0):
+
+        if ANTI_WINDUP not in ('clamp', 'back_calculation', 'none'):
+            raise ValueError(f"Unknown anti-windup mode '{ANTI_WINDUP}'")
+        if ANTI_WINDUP == 'back_calculation' and OUT_LIMITS is None:
+            raise ValueError("Back-calculation anti-windup needs OUT_LIMITS")
+
+        if N_CHANNELS is None:
+            N_CHANNELS = np.broadcast(np.asarray(Kp), np.asarray(Ki), np.asarray(Kd)).size
+        shape = (N_CHANNELS,)
+
+        self.Kp = np.broadcast_to(np.asarray(Kp, dtype=float), shape).copy()
+        self.Ki = np.broadcast_to(np.asarray(Ki, dtype=float), shape).copy()
+        self.Kd = np.broadcast_to(np.asarray(Kd, dtype=float), shape).copy()
+
+        if DT > 0:
+            self.DT = DT
+        else:
+            self.DT = 1
+
+        limits = np.asarray(INT_LIMITS, dtype=float)
+        self.integralLimits = (np.broadcast_to(limits[0], shape).copy(),
+                               np.broadcast_to(limits[1], shape).copy())
+        if OUT_LIMITS is not None:
+            limits = np.asarray(OUT_LIMITS, dtype=float)
+            OUT_LIMITS = (np.broadcast_to(limits[0], shape).copy(),
+                          np.broadcast_to(limits[1], shape).copy())
+        self.outputLimits = OUT_LIMITS
+        self.antiWindup = ANTI_WINDUP
+
+        # Back-calculation acts on the integral of the error, so scale KB by 1/Ki
+        KB = np.broadcast_to(np.asarray(KB, dtype=float), shape)
+        self.backGain = np.divide(KB, self.Ki, out=np.zeros(shape), where=self.Ki != 0)
+        self.filterAlpha = TF / (TF + self.DT) if TF > 0 else 0.0
+
+        self.error = np.zeros(shape)
+        self.integral = np.zeros(shape)
+        self.derivative = np.zeros(shape)
+
+
+    def update(self, setpoint, processVariable):
+
+        error = setpoint - processVariable
+
+        derivative = (error - self.error)/self.DT
+        if self.filterAlpha:
+            derivative = self.filterAlpha * self.derivative + (1 - self.filterAlpha) * derivative
+        self.derivative = derivative
+
+        self.error = error
+
+        self.integral = self.integral + (self.error * self.DT)
+
+        if self.antiWindup == 'clamp':
+            np.clip(self.integral, self.integralLimits[0], self.integralLimits[1], out=self.integral)
+
+        controlVariable = (self.Kp * self.error) + (self.Ki * self.integral) + (self.Kd * derivative)
+
+        if self.outputLimits is not None:
+            saturated = np.clip(controlVariable, self.outputLimits[0], self.outputLimits[1])
+            if self.antiWindup == 'back_calculation':
+                self.integral += self.backGain * (saturated - controlVariable) * self.DT
+            controlVariable = saturated
+
+        return controlVariable
+
+    def compute_control(self, measurement, reference=None):
+
+        return self.update(0 if reference is None else reference, measurement)
+
+    def reset(self):
+
+        self.error = np.zeros_like(self.error)
+        self.integral = np.zeros_like(self.integral)
+        self.derivative = np.zeros_like(self.derivative)
@@ -0,0 +1,17 @@
+# __init__.py
+
+# This file makes the 'estimators' directory a Python package. The names
+# below are importable from the package; each submodule is loaded on first use.
+
+from utils.lazy import lazy_exports
+
+_EXPORTS = {
+    'BaseEstimator': 'base_estimator',
+    'KalmanFilter': 'kalman',
+    'SteadyStateKalmanFilter': 'kalman',
+    'ExtendedKalmanFilter': 'kalman',
+    'kalman_filter': 'kalman',
+    'rts_smoother': 'kalman',
+}
+__all__ = list(_EXPORTS)
+__getattr__, __dir__ = lazy_exports(__name__, _EXPORTS)
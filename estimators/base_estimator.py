@@ -0,0 +1,10 @@
+from abc import ABC, abstractmethod
+
+class BaseEstimator(ABC):
+    @abstractmethod
+    def update(self, measurement, u=None):
+        pass
+
+    @abstractmethod
+    def reset(self):
+        pass
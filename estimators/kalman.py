@@ -0,0 +1,334 @@
+# Kalman filters for discrete-time models
+#
+# The models follow the StateSpaceSim convention
+#     x[k] = A x[k-1] + B u[k] + w,   y[k] = C x[k] + D u[k] + v
+# with process noise covariance Q and measurement noise covariance R. The
+# filter state after update(y[k], u[k]) is the estimate of x[k] given
+# y[0..k]; the first call only corrects the prior (x0, P0).
+
+import numpy as np
+
+from controllers.lqr import solve_riccati
+from plants.stateSpaceSim import propagate
+from utils.integrators import get_integrator
+from utils.linearization import jacobians
+from .base_estimator import BaseEstimator
+
+
+def _as_input(u, m):
+    return np.zeros(m) if u is None else np.atleast_1d(np.asarray(u, dtype=float))
+
+
+def _feedthrough(D, p, m):
+    return np.zeros((p, m)) if D is None else np.asarray(D, dtype=float)
+
+
+def steady_state_gain(A, C, Q, R, dt=1.0, cache_dir=None):
+    """Steady-state filter gain M and a-priori covariance P.
+
+    The filter Riccati equation is the LQR one of the dual system (A', C'),
+    so the solution is shared with controllers.lqr's Riccati cache.
+
+    Args:
+        dt (float): Sampling time of the model, only part of the cache key.
+
+    Returns:
+        tuple: (M, P) with x = x_pred + M (y - y_pred).
+    """
+    C, R = np.asarray(C, dtype=float), np.asarray(R, dtype=float)
+    _, P = solve_riccati(np.asarray(A, dtype=float).T, C.T, Q, R, dt, cache_dir)
+    M = np.linalg.solve(C @ P @ C.T + R, C @ P).T
+    return M, P
+
+
+class KalmanFilter(BaseEstimator):
+    def __init__(self, A, B, C, Q, R, D=None, x0=None, P0=None):
+        """
+        Time-varying Kalman filter.
+
+        Args:
+            A, B, C (np.ndarray): Discrete-time model.
+            Q, R (np.ndarray): Process and measurement noise covariances.
+            D (np.ndarray, optional): Feedthrough, zero by default.
+            x0 (np.ndarray, optional): Prior mean, zero by default.
+            P0 (np.ndarray, optional): Prior covariance, identity by default.
+        """
+        self.A, self.B, self.C = (np.asarray(M, dtype=float) for M in (A, B, C))
+        self.Q, self.R = np.asarray(Q, dtype=float), np.asarray(R, dtype=float)
+        n, m = self.B.shape
+        self.D = _feedthrough(D, self.C.shape[0], m)
+        self.x0 = np.zeros(n) if x0 is None else np.asarray(x0, dtype=float)
+        self.P0 = np.eye(n) if P0 is None else np.asarray(P0, dtype=float)
+        self.reset()
+
+    def reset(self):
+        self.x = self.x0.copy()
+        self.P = self.P0.copy()
+        self._started = False
+
+    def predict(self, u=None):
+        u = _as_input(u, self.B.shape[1])
+        self.x = self.A @ self.x + self.B @ u
+        self.P = self.A @ self.P @ self.A.T + self.Q
+        return self.x
+
+    def correct(self, measurement, u=None):
+        u = _as_input(u, self.B.shape[1])
+        innovation = np.atleast_1d(measurement) - self.C @ self.x - self.D @ u
+        PCt = self.P @ self.C.T
+        K = np.linalg.solve(self.C @ PCt + self.R, PCt.T).T
+        self.x = self.x + K @ innovation
+        self.P = self.P - K @ PCt.T
+        return self.x
+
+    def update(self, measurement, u=None):
+        """Predict to the current sample (except on the first call) and correct with its measurement."""
+        if self._started:
+            self.predict(u)
+        self._started = True
+        return self.correct(measurement, u)
+
+
+class SteadyStateKalmanFilter(BaseEstimator):
+    def __init__(self, A, B, C, Q, R, D=None, x0=None, dt=1.0, cache_dir=None):
+        """
+        Kalman filter with the constant steady-state gain.
+
+        Each update is x = (I - M C) A x + ((I - M C) B - M D) u + M y, with
+        the matrices formed once, so the per-sample cost is two small
+        matrix-vector products.
+
+        Args:
+            A, B, C, Q, R, D, x0: As for KalmanFilter.
+            dt (float): Sampling time, only used to key the Riccati cache.
+            cache_dir (str, optional): On-disk layer for the Riccati cache.
+        """
+        self.A, self.B, self.C = (np.asarray(M, dtype=float) for M in (A, B, C))
+        n, m = self.B.shape
+        self.D = _feedthrough(D, self.C.shape[0], m)
+        self.M, self.P = steady_state_gain(self.A, self.C, Q, R, dt, cache_dir)
+        IMC = np.eye(n) - self.M @ self.C
+        self.Ad = IMC @ self.A
+        self.Bu = IMC @ self.B - self.M @ self.D
+        self.x0 = np.zeros(n) if x0 is None else np.asarray(x0, dtype=float)
+        self.reset()
+
+    def reset(self):
+        self.x = self.x0.copy()
+        self._started = False
+
+    def update(self, measurement, u=None):
+        u = _as_input(u, self.B.shape[1])
+        y = np.atleast_1d(measurement)
+        if self._started:
+            self.x = self.Ad @ self.x + self.Bu @ u + self.M @ y
+        else:
+            # First sample: correct the prior only
+            self.x = self.x + self.M @ (y - self.C @ self.x - self.D @ u)
+            self._started = True
+        return self.x
+
+
+class ExtendedKalmanFilter(BaseEstimator):
+    def __init__(self, f, params, Q, R, dt, x0, P0=None, h=None, C=None, integrator='rk4', n_inputs=1):
+        """
+        Extended Kalman filter for continuous-time dynamics f(x, u, params).
+
+        The prediction integrates f over dt with one step of `integrator`,
+        and its Jacobian is taken by complex step through the integrator, so
+        it is consistent with the discrete model actually used.
+
+        Args:
+            f (callable): Dynamics f(x, u, params), e.g. a plant's `dynamics`.
+            params (dict): Model parameters passed to f and h.
+            Q, R (np.ndarray): Process (per step) and measurement noise covariances.
+            dt (float): Sampling time.
+            x0 (np.ndarray): Prior mean.
+            P0 (np.ndarray, optional): Prior covariance, identity by default.
+            h (callable, optional): Measurement h(x, u, params). Defaults to C x.
+            C (np.ndarray, optional): Linear measurement matrix when h is not given.
+            integrator (str or callable): See utils.integrators.get_integrator.
+            n_inputs (int): Input dimension, used for the zero input when u
+                is omitted.
+        """
+        if h is None:
+            if C is None:
+                raise ValueError("Either a measurement function h or a matrix C is required")
+            C = np.asarray(C, dtype=float)
+            h = lambda x, u, params: x @ C.T
+        self.f, self.h, self.params, self.dt = f, h, params, dt
+        self.n_inputs = n_inputs
+        self.Q, self.R = np.asarray(Q, dtype=float), np.asarray(R, dtype=float)
+        self.x0 = np.asarray(x0, dtype=float)
+        self.P0 = np.eye(len(self.x0)) if P0 is None else np.asarray(P0, dtype=float)
+        step = get_integrator(integrator)
+        self._transition = lambda x, u, params: step(f, x, u, params, dt)
+        self.reset()
+
+    @classmethod
+    def from_plant(cls, plant, Q, R, dt, **options):
+        """EKF on a plant's `dynamics` and parameters, starting from its current state."""
+        return cls(type(plant).dynamics, plant.get_params(), Q, R, dt,
+                   np.asarray(plant.get_state(), dtype=float), **options)
+
+    def reset(self):
+        self.x = self.x0.copy()
+        self.P = self.P0.copy()
+        self._started = False
+
+    def predict(self, u=None):
+        u = _as_input(u, self.n_inputs)
+        F, _ = jacobians(self._transition, self.x, u, self.params)
+        self.x = self._transition(self.x, u, self.params)
+        self.P = F @ self.P @ F.T + self.Q
+        return self.x
+
+    def correct(self, measurement, u=None):
+        u = _as_input(u, self.n_inputs)
+        H, _ = jacobians(self.h, self.x, u, self.params)
+        innovation = np.atleast_1d(measurement) - self.h(self.x, u, self.params)
+        PHt = self.P @ H.T
+        K = np.linalg.solve(H @ PHt + self.R, PHt.T).T
+        self.x = self.x + K @ innovation
+        self.P = self.P - K @ PHt.T
+        return self.x
+
+    def update(self, measurement, u=None):
+        if self._started:
+            self.predict(u)
+        self._started = True
+        return self.correct(measurement, u)
+
+
+def kalman_filter(A, B, C, Q, R, y, u=None, D=None, x0=None, P0=None, steady_state=False, tol=1e-10):
+    """Kalman filter over whole logged arrays, vectorized across channels.
+
+    The covariance recursion does not depend on the data, so it runs once
+    and its gains are applied to every channel at the same time. Once the
+    covariance has converged (relative change below `tol`) the rest of the
+    log is an LTI recursion with the steady-state gain and is propagated
+    with plants.stateSpaceSim.propagate, without a Python loop per sample.
+
+    Args:
+        A, B, C, Q, R, D, x0, P0: As for KalmanFilter.
+        y (np.ndarray): Measurements (T, p) or (T, channels, p).
+        u (np.ndarray, optional): Inputs (T, m) or (T, channels, m).
+        steady_state (bool): Use the steady-state gain from the first sample.
+        tol (float): Convergence threshold of the covariance.
+
+    Returns:
+        dict: 'x' filtered and 'x_pred' predicted means shaped like y with
+        n states, and 'P', 'P_pred' covariances (K, n, n). Covariances are
+        stored until convergence only: sample k uses index min(k, K - 1).
+    """
+    A, B, C = (np.asarray(M, dtype=float) for M in (A, B, C))
+    Q, R = np.asarray(Q, dtype=float), np.asarray(R, dtype=float)
+    n, m = B.shape
+    y = np.asarray(y, dtype=float)
+    single = y.ndim == 2
+    if single:
+        y = y[:, None]
+    T, channels, p = y.shape
+    D = _feedthrough(D, p, m)
+    u = np.zeros((T, channels, m)) if u is None else np.broadcast_to(
+        np.asarray(u, dtype=float).reshape(T, -1, m), (T, channels, m))
+
+    x_f = np.empty((T, channels, n))
+    x_p = np.empty((T, channels, n))
+    x_p[0] = np.zeros(n) if x0 is None else np.asarray(x0, dtype=float)
+    if steady_state:
+        M, P_pred = steady_state_gain(A, C, Q, R)
+        P_f = P_pred - M @ C @ P_pred
+        P_list, Ppred_list = [P_f], [P_pred]
+        k_ss = 0
+    else:
+        P_pred = np.eye(n) if P0 is None else np.asarray(P0, dtype=float)
+        P_list, Ppred_list = [], []
+        k_ss = None
+
+    k = 0
+    while k < T and k_ss is None:
+        if k:
+            x_p[k] = x_f[k - 1] @ A.T + u[k] @ B.T
+            P_pred = A @ P_list[-1] @ A.T + Q
+        PCt = P_pred @ C.T
+        K = np.linalg.solve(C @ PCt + R, PCt.T).T
+        x_f[k] = x_p[k] + (y[k] - x_p[k] @ C.T - u[k] @ D.T) @ K.T
+        P_f = P_pred - K @ PCt.T
+        if P_list and np.abs(P_f - P_list[-1]).max() <= tol * (1.0 + np.abs(P_f).max()):
+            k_ss, M = k, K
+        P_list.append(P_f)
+        Ppred_list.append(P_pred)
+        k += 1
+
+    if k_ss is not None and k < T:
+        # LTI remainder: x[k] = (I - M C) A x[k-1] + ((I - M C) B - M D) u[k] + M y[k]
+        IMC = np.eye(n) - M @ C
+        Ad = IMC @ A
+        Bd = np.hstack([IMC @ B - M @ D, M])
+        if k == 0:
+            x_f[0] = x_p[0] + (y[0] - x_p[0] @ C.T - u[0] @ D.T) @ M.T
+            k = 1
+        start = k - 1
+        for c in range(channels):
+            inputs = np.hstack([u[start:, c], y[start:, c]])
+            x_f[start:, c] = propagate(Ad, Bd, x_f[start, c], inputs)
+        x_p[k:] = x_f[k - 1:-1] @ A.T + u[k:] @ B.T
+
+    result = {'x': x_f, 'x_pred': x_p, 'P': np.array(P_list), 'P_pred': np.array(Ppred_list)}
+    if single:
+        result['x'], result['x_pred'] = x_f[:, 0], x_p[:, 0]
+    return result
+
+
+def rts_smoother(A, filtered, return_covariance=False):
+    """Rauch-Tung-Striebel smoother over the output of kalman_filter.
+
+    The smoother gain G[k] = P[k] A' P_pred[k+1]^-1 is shared by all
+    channels and is constant where the filter covariances have converged;
+    that stretch runs backwards in time as an LTI recursion with propagate.
+
+    Args:
+        A (np.ndarray): State matrix used by the filter.
+        filtered (dict): Result of kalman_filter.
+        return_covariance (bool): Also return the smoothed covariances
+            (T, n, n), which costs a Python loop over the samples.
+
+    Returns:
+        np.ndarray or tuple: x_smooth shaped like filtered['x'], or
+        (x_smooth, P_smooth).
+    """
+    A = np.asarray(A, dtype=float)
+    x_f, x_p = filtered['x'], filtered['x_pred']
+    single = x_f.ndim == 2
+    if single:
+        x_f, x_p = x_f[:, None], x_p[:, None]
+    P_f, P_p = filtered['P'], filtered['P_pred']
+    T, channels, n = x_f.shape
+    K = len(P_f)
+
+    def gain(k):
+        return np.linalg.solve(P_p[min(k + 1, K - 1)], A @ P_f[min(k, K - 1)]).T
+
+    # x_s[k] = G[k] x_s[k+1] + x_f[k] - G[k] x_pred[k+1]
+    x_s = np.empty_like(x_f)
+    x_s[-1] = x_f[-1]
+    first_steady = min(K - 1, T - 1)
+    if first_steady < T - 1:
+        G = gain(first_steady)
+        for c in range(channels):
+            w = (x_f[first_steady:-1, c] - x_p[first_steady + 1:, c] @ G.T)[::-1]
+            w = np.vstack([np.zeros((1, n)), w])
+            x_s[first_steady:, c] = propagate(G, np.eye(n), x_s[-1, c], w)[::-1]
+    for k in range(first_steady - 1, -1, -1):
+        x_s[k] = x_f[k] + (x_s[k + 1] - x_p[k + 1]) @ gain(k).T
+    x_s = x_s[:, 0] if single else x_s
+    if not return_covariance:
+        return x_s
+
+    P_s = np.empty((T, n, n))
+    P_s[-1] = P_f[min(T - 1, K - 1)]
+    for k in range(T - 2, -1, -1):
+        G = gain(k)
+        P_s[k] = P_f[min(k, K - 1)] + G @ (P_s[k + 1] - P_p[min(k + 1, K - 1)]) @ G.T
+    return x_s, P_s
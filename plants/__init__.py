@@ -1,2 +1,18 @@
 # __init__.py
-# This file makes 'plants' a Python package
\ No newline at end of file
+# This file makes 'plants' a Python package. The names below are importable
+# from the package; each submodule is loaded on first use.
+
+from utils.lazy import lazy_exports
+
+_EXPORTS = {
+    'BasePlant': 'base_plant',
+    'MassSpringDamper': 'mass_spring_damper',
+    'DCMotor': 'dc_motor',
+    'InvertedPendulum': 'inverted_pendulum',
+    'StateSpaceSim': 'stateSpaceSim',
+    'propagate': 'stateSpaceSim',
+    'simulate_ecm': 'batteryModel',
+    'fit_ecm': 'batteryModel',
+}
+__all__ = list(_EXPORTS)
+__getattr__, __dir__ = lazy_exports(__name__, _EXPORTS)
@@ -1,16 +1,177 @@
 import numpy as np
-import matplotlib.pyplot as plt
-from scipy.optimize import least_squares
+from concurrent.futures import ProcessPoolExecutor
+
+# Equivalent-circuit model (ECM): open-circuit voltage E0, series resistance R0
+# and n_rc parallel RC branches (R1, C1), ..., (Rn, Cn). With the current I
+# positive on discharge, each branch voltage follows
+#     Vc_i[k] = a_i * Vc_i[k-1] + b_i * I[k],   Vc_i[0] = 0
+# and the terminal voltage is V[k] = E0 - R0 * I[k] - sum_i Vc_i[k].
+# 'euler' uses a = 1 - dt/(R C), b = dt/C (as the original fitting script),
+# 'zoh' the exact a = exp(-dt/(R C)), b = R (1 - a).
+
+
+def ecm_param_names(n_rc=1):
+    names = ['E0', 'R0']
+    for i in range(1, n_rc + 1):
+        names += [f'R{i}', f'C{i}']
+    return names
+
+
+def _branch_coefficients(R, C, dt, method):
+    """a, b and their derivatives with respect to R and C for one RC branch."""
+    if method == 'euler':
+        a = 1.0 - dt / (R * C)
+        da_dR = dt / (R ** 2 * C)
+        da_dC = dt / (R * C ** 2)
+        b = dt / C
+        db_dR = 0.0
+        db_dC = -dt / C ** 2
+    elif method == 'zoh':
+        a = np.exp(-dt / (R * C))
+        da_dR = a * dt / (R ** 2 * C)
+        da_dC = a * dt / (R * C ** 2)
+        b = R * (1.0 - a)
+        db_dR = (1.0 - a) - R * da_dR
+        db_dC = -R * da_dC
+    else:
+        raise ValueError(f"Unknown method '{method}', expected 'euler' or 'zoh'")
+    return a, b, da_dR, da_dC, db_dR, db_dC
+
+
+def simulate_ecm(params, current, dt, method='euler', return_sensitivities=False):
+    """Terminal voltage of the ECM for a current profile.
+
+    The RC recursions are first-order IIR filters, evaluated with
+    scipy.signal.lfilter instead of a Python loop.
+
+    Args:
+        params (dict): 'E0', 'R0' and 'R<i>', 'C<i>' for each RC branch.
+        current (np.ndarray): Current samples (n,), positive on discharge.
+        dt (float): Sample time.
+        method (str): 'euler' or 'zoh' discretization of the RC branches.
+        return_sensitivities (bool): Also return dV/dparam for every parameter.
+
+    Returns:
+        np.ndarray or tuple: V (n,), or (V, {name: dV/dname}).
+    """
+    from scipy.signal import lfilter
+
+    current = np.asarray(current, dtype=float)
+    n_rc = sum(1 for name in params if name.startswith('C'))
+    drive = current.copy()
+    drive[0] = 0.0  # Vc[0] = 0: the first sample does not charge the branches
+
+    V = params['E0'] - params['R0'] * current
+    sens = {'E0': np.ones_like(current), 'R0': -current}
+    for i in range(1, n_rc + 1):
+        R, C = params[f'R{i}'], params[f'C{i}']
+        a, b, da_dR, da_dC, db_dR, db_dC = _branch_coefficients(R, C, dt, method)
+        Vc = lfilter([b], [1.0, -a], drive)
+        V = V - Vc
+        if return_sensitivities:
+            # d/dp of Vc[k] = a Vc[k-1] + b I[k] is the same filter driven by
+            # da/dp * Vc[k-1] + db/dp * I[k]
+            Vc_prev = np.concatenate([[0.0], Vc[:-1]])
+            sens[f'R{i}'] = -lfilter([1.0], [1.0, -a], da_dR * Vc_prev + db_dR * drive)
+            sens[f'C{i}'] = -lfilter([1.0], [1.0, -a], da_dC * Vc_prev + db_dC * drive)
+    if return_sensitivities:
+        return V, sens
+    return V
+
+
+def _default_initial(current, voltage, n_rc):
+    initial = {'R0': 0.01}
+    for i in range(1, n_rc + 1):
+        initial[f'R{i}'] = 0.01 * i
+        initial[f'C{i}'] = 1000.0 * 10 ** (i - 1)
+    initial['E0'] = voltage[0] + initial['R0'] * current[0]
+    return initial
+
+
+def fit_ecm(current, voltage, dt, n_rc=1, initial=None, fixed=None, method='euler', **kwargs):
+    """Identify ECM parameters from a current/voltage record.
+
+    Uses scipy.optimize.least_squares with the analytic Jacobian from
+    simulate_ecm. Resistances and capacitances are kept positive.
+
+    Args:
+        current, voltage (np.ndarray): Measured samples (n,).
+        dt (float): Sample time.
+        n_rc (int): Number of RC branches.
+        initial (dict, optional): Initial guesses, merged over the defaults.
+        fixed (dict, optional): Parameters held at the given values.
+        method (str): 'euler' or 'zoh' discretization.
+        **kwargs: Passed on to least_squares.
+
+    Returns:
+        dict: Fitted 'params' (all parameters, fixed included), 'cost',
+        'success', 'nfev' and 'rmse'.
+    """
+    from scipy.optimize import least_squares
+
+    current = np.asarray(current, dtype=float)
+    voltage = np.asarray(voltage, dtype=float)
+    fixed = dict(fixed or {})
+    start = _default_initial(current, voltage, n_rc)
+    start.update(initial or {})
+    names = [name for name in ecm_param_names(n_rc) if name not in fixed]
+    lower = np.array([-np.inf if name == 'E0' else 1e-12 for name in names])
+
+    def unpack(theta):
+        params = dict(fixed)
+        params.update(zip(names, theta))
+        return params
+
+    def residual(theta):
+        return simulate_ecm(unpack(theta), current, dt, method) - voltage
+
+    def jacobian(theta):
+        _, sens = simulate_ecm(unpack(theta), current, dt, method, return_sensitivities=True)
+        return np.column_stack([sens[name] for name in names])
+
+    x0 = np.clip([start[name] for name in names], lower, None)
+    options = {'x_scale': 'jac'}
+    options.update(kwargs)
+    result = least_squares(residual, x0, jac=jacobian, bounds=(lower, np.inf), **options)
+    return {
+        'params': unpack(result.x),
+        'cost': result.cost,
+        'success': result.success,
+        'nfev': result.nfev,
+        'rmse': np.sqrt(np.mean(result.fun ** 2)),
+    }
+
+
+def _fit_ecm_star(args):
+    current, voltage, dt, kwargs = args
+    return fit_ecm(current, voltage, dt, **kwargs)
+
+
+def fit_ecm_batch(currents, voltages, dt, n_workers=None, **kwargs):
+    """Fit many cells, one row of `currents`/`voltages` per cell.
+
+    Args:
+        currents, voltages (np.ndarray): (n_cells, n) records, or sequences
+            of 1-D records of different lengths.
+        dt (float): Sample time shared by all cells.
+        n_workers (int, optional): Fit in a process pool of this size.
+        **kwargs: Passed on to fit_ecm.
+
+    Returns:
+        list: fit_ecm results in cell order.
+    """
+    jobs = [(I, V, dt, kwargs) for I, V in zip(currents, voltages)]
+    if n_workers is None or n_workers <= 1:
+        return [_fit_ecm_star(job) for job in jobs]
+    with ProcessPoolExecutor(max_workers=n_workers) as pool:
+        return list(pool.map(_fit_ecm_star, jobs, chunksize=max(1, len(jobs) // (4 * n_workers))))
+
 
 # Model function with discharge
-def battery_model(params, I, V_measured, dt, t, Rp):
+def battery_model(params, I, V_measured, dt, t, Rp, E0=3.7):
+    """Residual of the single-RC model for (R, C) with fixed Rp and E0."""
     R, C = params
-    Vc = np.zeros_like(t)
-    V_pred = np.zeros_like(t)
-    Vc[0] = 0
-    for k in range(1, len(t)):
-        Vc[k] = Vc[k-1] + dt * (I[k] / C - Vc[k-1] / (Rp * C))
-        V_pred[k] = E0_true - I[k] * R - Vc[k]
+    V_pred = simulate_ecm({'E0': E0, 'R0': R, 'R1': Rp, 'C1': C}, I, dt)
     return V_pred - V_measured
 
 if __name__ == '__main__':
@@ -25,20 +186,15 @@ if __name__ == '__main__':
     # Simulate true voltage with initial condition Vc[0] = 0
     Rp = 10.0  # Parallel resistance (Ohm)
     # Simulate true voltage
-    Vc = np.zeros_like(t)
-    V_measured = np.zeros_like(t)
-    Vc[0] = 0
-    for k in range(1, len(t)):
-        Vc[k] = Vc[k-1] + dt * (I / C_true - Vc[k-1] / (Rp * C_true))
-        V_measured[k] = E0_true - I * R_true - Vc[k]
+    V_measured = simulate_ecm({'E0': E0_true, 'R0': R_true, 'R1': Rp, 'C1': C_true}, I * np.ones_like(t), dt)
 
     # Add noise
     V_measured += np.random.normal(0, 0.01, len(t))
 
     # Optimization
-    params0 = [0.05, 500]
-    result = least_squares(battery_model, params0, args=(I * np.ones_like(t), V_measured, dt, t, Rp))
-    R_est, C_est = result.x
+    fit = fit_ecm(I * np.ones_like(t), V_measured, dt, initial={'R0': 0.05, 'C1': 500},
+                  fixed={'E0': E0_true, 'R1': Rp})
+    R_est, C_est = fit['params']['R0'], fit['params']['C1']
 
     print(f"Estimated R: {R_est:.3f} Ohm (True: {R_true} Ohm)")
-    print(f"Estimated C: {C_est:.0f} F (True: {C_true} F)")
\ No newline at end of file
+    print(f"Estimated C: {C_est:.0f} F (True: {C_true} F)")
@@ -1,14 +1,29 @@
+import numpy as np
+from utils.integrators import SCALAR_INTEGRATORS, get_integrator
 from .base_plant import BasePlant
 
 class DCMotor(BasePlant):
-    def __init__(self, resistance, inductance, back_emf_constant, torque_constant, inertia, damping_coefficient):
+    def __init__(self, resistance, inductance, back_emf_constant, torque_constant, inertia, damping_coefficient, integrator='euler'):
         self.resistance = resistance
         self.inductance = inductance
         self.back_emf_constant = back_emf_constant
         self.torque_constant = torque_constant
         self.inertia = inertia
         self.damping_coefficient = damping_coefficient
-        self.state = [0, 0]  # [current, angular_velocity]
+        self.state = np.zeros(2)  # [current, angular_velocity]
+        self.integrator = integrator  # name in utils.integrators.INTEGRATORS or a step callable
+        self._params_key = None  # parameter values of the cached get_params() dict
+
+    @property
+    def integrator(self):
+        return self._integrator
+
+    @integrator.setter
+    def integrator(self, integrator):
+        # Resolved once here rather than on every update
+        self._step = get_integrator(integrator)
+        self._scalar_step = SCALAR_INTEGRATORS.get(integrator) if isinstance(integrator, str) else None
+        self._integrator = integrator
 
     def get_state(self):
         return self.state
@@ -17,11 +32,65 @@ class DCMotor(BasePlant):
         self.state = state
 
     def update(self, voltage, dt):
-        current, angular_velocity = self.state
+        if self._scalar_step is not None:
+            # Two scalar states: step on floats, same results as the array path
+            if not isinstance(voltage, (int, float)):
+                voltage = np.asarray(voltage, dtype=float).item()
+            current, angular_velocity = np.asarray(self.state, dtype=float).tolist()
+            self.state = np.array(self._scalar_step(self._derivative, current, angular_velocity, voltage, dt))
+            return self.state
+        key = (self.resistance, self.inductance, self.back_emf_constant, self.torque_constant, self.inertia, self.damping_coefficient)
+        if key != self._params_key:
+            self._params = self.get_params()
+            self._params_key = key
+        self.state = self._step(DCMotor.dynamics, np.asarray(self.state, dtype=float), np.array([voltage], dtype=float), self._params, dt)
+        return self.state
+
+    def _derivative(self, current, angular_velocity, voltage):
+        """Scalar form of dynamics for the update fast path."""
         back_emf = self.back_emf_constant * angular_velocity
         current_dot = (voltage - back_emf - self.resistance * current) / self.inductance
         torque = self.torque_constant * current
         angular_acceleration = (torque - self.damping_coefficient * angular_velocity) / self.inertia
-        current += current_dot * dt
-        angular_velocity += angular_acceleration * dt
-        self.state = [current, angular_velocity]
+        return current_dot, angular_acceleration
+
+    def get_params(self):
+        return {
+            'resistance': self.resistance,
+            'inductance': self.inductance,
+            'back_emf_constant': self.back_emf_constant,
+            'torque_constant': self.torque_constant,
+            'inertia': self.inertia,
+            'damping_coefficient': self.damping_coefficient,
+        }
+
+    @staticmethod
+    def dynamics(x, u, params):
+        """Continuous-time derivative of [current, angular_velocity].
+
+        Args:
+            x (np.ndarray): States (..., 2)
+            u (np.ndarray): Voltages (..., 1)
+            params (dict): Parameters as returned by get_params, scalars or
+                arrays broadcasting against the leading dimensions.
+
+        Returns:
+            np.ndarray: dx/dt (..., 2)
+        """
+        current, angular_velocity = x[..., 0], x[..., 1]
+        back_emf = params['back_emf_constant'] * angular_velocity
+        current_dot = (u[..., 0] - back_emf - params['resistance'] * current) / params['inductance']
+        torque = params['torque_constant'] * current
+        angular_acceleration = (torque - params['damping_coefficient'] * angular_velocity) / params['inertia']
+        return np.stack([current_dot, angular_acceleration], axis=-1)
+
+    @staticmethod
+    def make_batch_step(params, dt, integrator='euler'):
+        """Return step(state, voltage) advancing (n_runs, 2) states with the same integrator as `update`."""
+        params = {name: np.asarray(value) for name, value in params.items()}
+        step = get_integrator(integrator)
+
+        def batch_step(state, voltage):
+            return step(DCMotor.dynamics, state, np.reshape(voltage, (-1, 1)), params, dt)
+
+        return batch_step
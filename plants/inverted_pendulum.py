@@ -1,12 +1,28 @@
 from .base_plant import BasePlant
 import math
 
+import numpy as np
+from utils.integrators import SCALAR_INTEGRATORS, get_integrator
+
 class InvertedPendulum(BasePlant):
-    def __init__(self, length, mass, damping_coefficient):
+    def __init__(self, length, mass, damping_coefficient, integrator='symplectic_euler'):
         self.length = length
         self.mass = mass
         self.damping_coefficient = damping_coefficient
-        self.state = [0, 0]  # [angle, angular_velocity]
+        self.state = np.zeros(2)  # [angle, angular_velocity]
+        self.integrator = integrator  # name in utils.integrators.INTEGRATORS or a step callable
+        self._params_key = None  # parameter values of the cached get_params() dict
+
+    @property
+    def integrator(self):
+        return self._integrator
+
+    @integrator.setter
+    def integrator(self, integrator):
+        # Resolved once here rather than on every update
+        self._step = get_integrator(integrator)
+        self._scalar_step = SCALAR_INTEGRATORS.get(integrator) if isinstance(integrator, str) else None
+        self._integrator = integrator
 
     def get_state(self):
         return self.state
@@ -15,9 +31,59 @@ class InvertedPendulum(BasePlant):
         self.state = state
 
     def update(self, torque, dt):
-        angle, angular_velocity = self.state
+        if self._scalar_step is not None:
+            # Two scalar states: step on floats, same results as the array path
+            if not isinstance(torque, (int, float)):
+                torque = np.asarray(torque, dtype=float).item()
+            angle, angular_velocity = np.asarray(self.state, dtype=float).tolist()
+            self.state = np.array(self._scalar_step(self._derivative, angle, angular_velocity, torque, dt))
+            return self.state
+        key = (self.length, self.mass, self.damping_coefficient)
+        if key != self._params_key:
+            self._params = self.get_params()
+            self._params_key = key
+        self.state = self._step(InvertedPendulum.dynamics, np.asarray(self.state, dtype=float), np.array([torque], dtype=float), self._params, dt)
+        return self.state
+
+    def _derivative(self, angle, angular_velocity, torque):
+        """Scalar form of dynamics for the update fast path."""
+        length, mass = self.length, self.mass
+        angular_acceleration = (torque - self.damping_coefficient * angular_velocity - mass * 9.81 * length * math.sin(angle)) / (mass * length ** 2)
+        return angular_velocity, angular_acceleration
+
+    def get_params(self):
+        return {
+            'length': self.length,
+            'mass': self.mass,
+            'damping_coefficient': self.damping_coefficient,
+        }
+
+    @staticmethod
+    def dynamics(x, u, params):
+        """Continuous-time derivative of [angle, angular_velocity].
+
+        Args:
+            x (np.ndarray): States (..., 2)
+            u (np.ndarray): Torques (..., 1)
+            params (dict): Parameters as returned by get_params, scalars or
+                arrays broadcasting against the leading dimensions.
+
+        Returns:
+            np.ndarray: dx/dt (..., 2)
+        """
+        length, mass, damping_coefficient = params['length'], params['mass'], params['damping_coefficient']
         gravity = 9.81
-        angular_acceleration = (torque - self.damping_coefficient * angular_velocity - self.mass * gravity * self.length * math.sin(angle)) / (self.mass * self.length ** 2)
-        angular_velocity += angular_acceleration * dt
-        angle += angular_velocity * dt
-        self.state = [angle, angular_velocity]
+        angle, angular_velocity = x[..., 0], x[..., 1]
+        angular_acceleration = (u[..., 0] - damping_coefficient * angular_velocity - mass * gravity * length * np.sin(angle)) / (mass * length ** 2)
+        return np.stack([angular_velocity, angular_acceleration], axis=-1)
+
+    @staticmethod
+    def make_batch_step(params, dt, integrator='symplectic_euler'):
+        """Return step(state, torque) advancing (n_runs, 2) states with the same integrator as `update`."""
+        params = {name: np.asarray(value) for name, value in params.items()}
+        step = get_integrator(integrator)
+
+        def batch_step(state, torque):
+            return step(InvertedPendulum.dynamics, state, np.reshape(torque, (-1, 1)), params, dt)
+
+        return batch_step
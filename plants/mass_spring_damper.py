@@ -1,7 +1,6 @@
 import numpy as np
-from scipy.integrate import solve_ivp
-from scipy.signal import cont2discrete
 from plants.base_plant import BasePlant
+from utils.discretization import discretize, discretize_batch
 
 class MassSpringDamper(BasePlant):
     def __init__(self, mass=1.0, spring_constant=1.0, damping_coefficient=0.5, initial_position=0.0, initial_velocity=0.0, solver='continuous'):
@@ -10,6 +9,7 @@ class MassSpringDamper(BasePlant):
         self.damping_coefficient = damping_coefficient
         self.state = np.array([initial_position, initial_velocity])  # State: [position, velocity]
         self.solver = solver  # Solver type: 'continuous', 'euler', 'zoh', 'tustin', etc.
+        self._step_key = None  # (dt, solver, parameters) of the cached discrete matrices
 
     def _continuous_dynamics_matrices(self):
         """Return the continuous-time system matrices A_cont and B_cont."""
@@ -22,27 +22,91 @@ class MassSpringDamper(BasePlant):
     def _dynamics(self, t, state, input_force):
         """Continuous-time dynamics of the system (internal use)."""
         A_cont, B_cont = self._continuous_dynamics_matrices()
-        x_dot = A_cont @ state + B_cont @ np.array([[0], [input_force]])
+        x_dot = A_cont @ state + B_cont[:, 0] * input_force
         return x_dot
 
     def _discretize(self, dt, method='euler'):
-        """Discretize the continuous-time dynamics (internal use)."""
+        """Discretize the continuous-time dynamics (internal use).
+
+        'continuous' maps to the exact zero-order-hold solution, which is
+        what integrating the linear dynamics over a step with constant
+        force gives.
+        """
         A_cont, B_cont = self._continuous_dynamics_matrices()
-        A, B, _, _, _ = cont2discrete((A_cont, B_cont, np.eye(2), np.zeros((2,1))), dt, method=method)
-        return A, B
-    
+        return discretize(A_cont, B_cont, dt, 'zoh' if method == 'continuous' else method)
+
     def update_state(self, input_force, dt):
-        """Update the state using the specified solver."""
-        if self.solver == 'continuous':
-            sol = solve_ivp(self._dynamics, [0, dt], self.state, args=(input_force,), dense_output=True)
-            self.state = sol.y[:, -1]  # Get the state at the final time step
-        else:
+        """Update the state using the specified solver.
+
+        The discrete matrices are looked up only when dt, the solver or the
+        physical parameters change, so a fixed-step loop costs one small
+        matrix-vector product per call.
+        """
+        key = (dt, self.solver, self.mass, self.spring_constant, self.damping_coefficient)
+        if key != self._step_key:
             A, B = self._discretize(dt, self.solver)
-            self.state = A @ self.state + B @ np.array([[0], [input_force]])
+            self._A, self._B_col = A, B[:, 0]
+            self._step_key = key
+        self.state = self._A @ self.state + self._B_col * input_force
         return self.state
 
+    def update(self, input_force, dt):
+        return self.update_state(input_force, dt)
+
     def get_state(self):
         return self.state
 
     def set_state(self, state):
-        self.state = state
\ No newline at end of file
+        self.state = state
+
+    def get_params(self):
+        return {
+            'mass': self.mass,
+            'spring_constant': self.spring_constant,
+            'damping_coefficient': self.damping_coefficient,
+        }
+
+    @staticmethod
+    def dynamics(x, u, params):
+        """Continuous-time derivative of [position, velocity].
+
+        Args:
+            x (np.ndarray): States (..., 2)
+            u (np.ndarray): Forces (..., 1)
+            params (dict): Parameters as returned by get_params, scalars or
+                arrays broadcasting against the leading dimensions.
+
+        Returns:
+            np.ndarray: dx/dt (..., 2)
+        """
+        position, velocity = x[..., 0], x[..., 1]
+        acceleration = (u[..., 0] - params['spring_constant'] * position - params['damping_coefficient'] * velocity) / params['mass']
+        return np.stack([velocity, acceleration], axis=-1)
+
+    @staticmethod
+    def make_batch_step(params, dt, solver='zoh'):
+        """Return step(state, input_force) advancing (n_runs, 2) states.
+
+        The per-run discrete matrices are computed once here. 'continuous'
+        uses the exact zero-order-hold solution, which is what integrating the
+        linear dynamics over a step with constant force converges to.
+        """
+        mass = np.asarray(params['mass'], dtype=float)
+        spring_constant = np.asarray(params['spring_constant'], dtype=float)
+        damping_coefficient = np.asarray(params['damping_coefficient'], dtype=float)
+        lead = np.broadcast_shapes(mass.shape, spring_constant.shape, damping_coefficient.shape)
+        A_cont = np.zeros(lead + (2, 2))
+        A_cont[..., 0, 1] = 1.0
+        A_cont[..., 1, 0] = -spring_constant / mass
+        A_cont[..., 1, 1] = -damping_coefficient / mass
+        B_cont = np.zeros(lead + (2, 1))
+        B_cont[..., 1, 0] = 1.0 / mass
+        method = 'zoh' if solver == 'continuous' else solver
+        A, B = discretize_batch(A_cont, B_cont, dt, method)
+        A_col0, A_col1, B_col = A[..., :, 0], A[..., :, 1], B[..., :, 0]
+
+        def step(state, input_force):
+            force = np.asarray(input_force).reshape(-1, 1)
+            return state[:, :1] * A_col0 + state[:, 1:] * A_col1 + force * B_col
+
+        return step
@@ -1,5 +1,5 @@
 import numpy as np
-import matplotlib.pyplot as plt
+from utils.discretization import discretize, discretize_batch
 
 class StateSpaceSim:
     def __init__(self, A, B, C, D, x_0, u, dt):
@@ -43,34 +43,182 @@ class StateSpaceSim:
         self.u = u  # Input sequence
         self.dt = dt  # Time step
         self.y = np.zeros((self.time_steps, self.p))  # Pre-allocate output array
-        self.y[0] = (self.C @ x_0 + self.D @ u[0]).flatten()  # Initial output
+        self.y[0] = self.C @ self.x[0] + self.D @ u[0]  # Initial output
+        self._discrete = {}  # Cached (Ad, Bd) per discretization method
 
-    def simulate(self):
+    def discretize(self, method='euler'):
         """
-        Simulate the state-space model using Euler integration.
-        Updates state and output over time based on input sequence.
+        Return the discrete-time pair (Ad, Bd) used by `simulate`.
+
+        The pair comes from the shared cache in utils.discretization, so
+        simulators built on the same (A, B, dt) discretize only once.
+
+        Args:
+            method (str): 'euler' for forward Euler (Ad = I + dt*A, Bd = dt*B),
+                'zoh' for the exact zero-order-hold discretization, or
+                'backward_diff' / 'tustin'.
+
+        Returns:
+            tuple: (Ad, Bd) as (n x n) and (n x m) arrays.
         """
-        for k in range(1, len(self.u)):
-            # Euler method: x[k+1] = x[k] + dt * (A * x[k] + B * u[k])
-            x_k = self.x[k-1].reshape(-1, 1)  # Ensure column vector
-            term1 = self.A @ x_k
-            term2 = self.B @ self.u[k].reshape(-1, 1)  # Ensure u[k] is a column vector
-            if term1.shape != (self.n, 1):
-                raise ValueError(f"Expected term1 shape ({self.n}, 1), got {term1.shape}")
-            if term2.shape != (self.n, 1):
-                raise ValueError(f"Expected term2 shape ({self.n}, 1), got {term2.shape}")
-            x_next = x_k + self.dt * (term1 + term2)
-            if x_next.shape != (self.n, 1):
-                raise ValueError(f"Expected x_next shape ({self.n}, 1), got {x_next.shape}")
-            self.x[k] = x_next.flatten()  # Store as flat array
-            # Output: y[k] = C * x[k] + D * u[k]
-            y_next = self.C @ x_next + self.D @ self.u[k].reshape(-1, 1)
-            self.y[k] = y_next.flatten()  # Store as flat array
-        
+        if method not in self._discrete:
+            self._discrete[method] = discretize(self.A, self.B, self.dt, method)
+        return self._discrete[method]
+
+    def simulate(self, method='euler', block_size=32, recorder=None, chunk_size=4096, backend=None):
+        """
+        Simulate the state-space model over the whole input sequence.
+
+        The continuous model is discretized once and the recurrence
+        x[k] = Ad * x[k-1] + Bd * u[k] is propagated with `propagate`.
+        Outputs are then computed for all steps in a single matrix product.
+
+        Args:
+            method (str): 'euler' (forward Euler, default) or 'zoh' (exact
+                zero-order hold).
+            block_size (int): Block length used by `propagate`.
+            recorder (TrajectoryRecorder, optional): Stream 'x' and 'y' to
+                this recorder, chunk_size steps at a time, instead of
+                keeping the trajectories in memory.
+            chunk_size (int): Steps propagated per chunk when recording.
+            backend (str, optional): 'auto', 'numba' or 'python' to propagate
+                step by step with simulations.fused.propagate_loop, which
+                is faster for small models when numba is installed. The
+                default uses the blocked NumPy `propagate`.
+
+        Returns:
+            tuple: (x, y) state and output trajectories, or the recorder.
+        """
+        Ad, Bd = self.discretize(method)
+        if backend is not None:
+            from simulations.fused import propagate_loop
+
+            def run(x_0, u):
+                return propagate_loop(Ad, Bd, x_0, u, backend)
+        else:
+            def run(x_0, u):
+                return propagate(Ad, Bd, x_0, u, block_size)
+        if recorder is not None:
+            x_last = self.x[0]
+            for start in range(0, self.time_steps, chunk_size):
+                stop = min(start + chunk_size, self.time_steps)
+                if start == 0:
+                    x = run(x_last, self.u[:stop])
+                else:
+                    # Restart from the last state; its row is dropped again
+                    x = run(x_last, self.u[start - 1:stop])[1:]
+                recorder.extend(x=x, y=x @ self.C.T + self.u[start:stop] @ self.D.T)
+                x_last = x[-1]
+            recorder.flush()
+            return recorder
+        self.x = run(self.x[0], self.u)
+        # Output: y[k] = C * x[k] + D * u[k]
+        self.y = self.x @ self.C.T + self.u @ self.D.T
         return self.x, self.y
 
+    @staticmethod
+    def make_batch_step(params, dt, method='euler'):
+        """
+        Return step(state, u) advancing a batch of independent models.
+
+        Args:
+            params (dict): 'A' (n_runs x n x n) and 'B' (n_runs x n x m).
+                Use np.broadcast_to to share one model across runs.
+            dt (float): Time step
+            method (str): 'euler' (as in `simulate`) or 'zoh'.
+
+        Returns:
+            callable: step(state, u) mapping (n_runs x n) states and
+            (n_runs x m) inputs to the next states.
+        """
+        Ad, Bd = discretize_batch(params['A'], params['B'], dt, method)
+
+        def step(state, u):
+            u = np.asarray(u).reshape(state.shape[0], -1)
+            return np.einsum('...ij,...j->...i', Ad, state) + np.einsum('...ij,...j->...i', Bd, u)
+
+        return step
+
+
+def propagate(Ad, Bd, x_0, u, block_size=32):
+    """
+    Propagate x[k] = Ad * x[k-1] + Bd * u[k] for k = 1..T-1 from x[0] = x_0.
+
+    The steps are grouped into blocks of `block_size`. Inside a block the
+    states are an affine function of the block start state and the block
+    inputs, x_block = Phi * s + Gamma * u_block. The block start states form
+    a recurrence of the same kind (with Ad**block_size), which is solved
+    recursively; the whole trajectory then comes out of one matrix product
+    of [u_block, s] with [Gamma'; Phi'], so no Python loop runs per time step.
+
+    Args:
+        Ad (np.ndarray): Discrete state transition matrix (n x n)
+        Bd (np.ndarray): Discrete input matrix (n x m)
+        x_0 (np.ndarray): Initial state (n,) or (n x 1)
+        u (np.ndarray): Input sequence (T x m), u[0] is not used
+        block_size (int): Steps per block.
+
+    Returns:
+        np.ndarray: State trajectory (T x n) with x[0] = x_0.
+    """
+    u = np.asarray(u)
+    n = Ad.shape[0]
+    T = u.shape[0]
+    dtype = np.result_type(Ad, Bd, x_0, u, float)
+    steps = T - 1
+
+    if steps <= block_size:
+        # Short sequences: a plain loop is cheaper than building the blocks
+        x = np.empty((T, n), dtype=dtype)
+        x[0] = np.ravel(x_0)
+        if steps > 0:
+            w = u[1:] @ Bd.T
+            AdT = Ad.T
+            for k in range(1, T):
+                x[k] = x[k - 1] @ AdT + w[k - 1]
+        return x
+
+    if Bd.shape[1] > n:
+        # Fold Bd into the inputs when that makes the block products smaller
+        u = np.vstack([np.zeros((1, n), dtype=dtype), u[1:] @ Bd.T])
+        Bd = np.eye(n, dtype=dtype)
+    m = Bd.shape[1]
+    L = block_size
+    n_blocks = -(-steps // L)
+
+    # Phi = [Ad; Ad^2; ...; Ad^L] and Gamma[j, i] = Ad^(j-i) * Bd for i <= j
+    powers = [np.eye(n, dtype=dtype)]
+    for _ in range(L):
+        powers.append(Ad @ powers[-1])
+    PhiT = np.hstack([P.T for P in powers[1:]])
+    gamma_blocks = [P @ Bd for P in powers[:L]]
+    GammaT = np.zeros((L * m, L * n), dtype=dtype)
+    for j in range(L):
+        for i in range(j + 1):
+            GammaT[i * m:(i + 1) * m, j * n:(j + 1) * n] = gamma_blocks[j - i].T
+
+    u_blocks = np.zeros((n_blocks * L, m), dtype=dtype)
+    u_blocks[:steps] = u[1:]
+    u_blocks = u_blocks.reshape(n_blocks, L * m)
+
+    # Block start states: s[b] = Ad^L * s[b-1] + (zero-state response at end of block b-1)
+    carry = np.empty((n_blocks, n), dtype=dtype)
+    carry[1:] = u_blocks[:-1] @ GammaT[:, -n:]
+    x_0 = np.ravel(x_0)
+    start = propagate(powers[L], np.eye(n, dtype=dtype), x_0, carry, block_size)
+
+    # Forced plus free response of every block in one product, written
+    # straight into the trajectory: x_block = [u_block, s] @ [Gamma'; Phi']
+    x = np.empty((1 + n_blocks * L, n), dtype=dtype)
+    x[0] = x_0
+    np.matmul(np.hstack([u_blocks, start]), np.vstack([GammaT, PhiT]), out=x[1:].reshape(n_blocks, L * n))
+    return x[:T]
+
+
 # Example usage
 if __name__ == "__main__":
+    import matplotlib.pyplot as plt
+
     # Example 2nd-order system (e.g., a damped oscillator with input)
     A = np.array([[0, 1], [-1, -0.1]])  # State matrix (2 x 2)
     B = np.array([[0], [1]])            # Input matrix (2 x 1)
@@ -0,0 +1,153 @@
+import time
+
+import numpy as np
+
+
+class ClosedLoopSimulator:
+    """Fixed-step closed loop of a BasePlant and a BaseController.
+
+    Every step advances the plant with plant.update(u, dt). Every
+    `decimation` steps the controller is called through
+    controller.compute_control(measurement, reference), and its output is
+    held in between (zero-order hold), so the controller can run at a lower
+    rate than the plant.
+    """
+
+    def __init__(self, plant, controller, dt, control_dt=None, measure=None):
+        """
+        Args:
+            plant (BasePlant): Plant advanced with update(input, dt).
+            controller (BaseController): Controller providing compute_control.
+            dt (float): Plant integration step.
+            control_dt (float, optional): Controller period, an integer
+                multiple of dt. Defaults to dt.
+            measure (callable, optional): Maps the plant state to the
+                measurement passed to the controller, defaults to the full state.
+        """
+        self.plant = plant
+        self.controller = controller
+        self.dt = dt
+        self.control_dt = dt if control_dt is None else control_dt
+        ratio = self.control_dt / dt
+        self.decimation = int(round(ratio))
+        if self.decimation < 1 or abs(ratio - self.decimation) > 1e-9 * ratio:
+            raise ValueError(f"control_dt ({self.control_dt}) must be a positive integer multiple of dt ({dt})")
+        self.measure = measure
+
+    def run(self, steps, reference=None, stop=None, record_timing=True, recorder=None):
+        """Simulate the loop for up to `steps` plant steps from the current plant state.
+
+        Args:
+            steps (int): Number of plant steps.
+            reference: Constant reference (scalar or array) or callable r(t)
+                evaluated at each controller update.
+            stop (callable, optional): stop(t, state) -> bool, checked after
+                every plant step; the run ends early when it returns True.
+                Runs also end when the state becomes non-finite.
+            record_timing (bool): Record wall-clock time of every controller
+                and plant call.
+            recorder (TrajectoryRecorder, optional): Stream the trajectory to
+                this recorder instead of returning it, one row per sample
+                with channels 't', 'x', 'u' and, with record_timing,
+                'controller_time' and 'plant_time'. The last row holds the
+                final state with NaN input and timings. Memory use then no
+                longer grows with `steps`.
+
+        Returns:
+            dict: 't' (k+1,), 'x' (k+1, n) states, 'u' (k, nu) applied inputs,
+            'steps' (k, the number of steps taken) and 'terminated' (True when
+            the run ended early). With record_timing also 'controller_time'
+            (k,), NaN where the input was held, and 'plant_time' (k,) in seconds.
+            With a recorder: 'steps', 'terminated', 'x_final' and 'recorder'.
+        """
+        plant, controller, dt, decimation = self.plant, self.controller, self.dt, self.decimation
+        measure = self.measure
+        if reference is not None and not callable(reference):
+            reference = np.asarray(reference, dtype=float)
+        x_0 = np.asarray(plant.get_state(), dtype=float).ravel()
+        clock = time.perf_counter
+
+        # The first controller call fixes the input dimension
+        start = clock()
+        u_k = controller.compute_control(x_0 if measure is None else measure(x_0), self._reference(reference, 0.0))
+        first_call = clock() - start
+        nu = np.size(u_k)
+
+        streaming = recorder is not None
+        if not streaming:
+            t = np.arange(steps + 1) * dt
+            x = np.empty((steps + 1, x_0.size))
+            u = np.empty((steps, nu))
+            x[0] = x_0
+            if record_timing:
+                controller_time = np.full(steps, np.nan)
+                plant_time = np.empty(steps)
+
+        k = 0
+        x_k = x_0
+        terminated = False
+        while k < steps:
+            t_k = k * dt
+            call_time = np.nan
+            if k and k % decimation == 0:
+                ref = self._reference(reference, t_k)
+                y = x_k if measure is None else measure(x_k)
+                if record_timing:
+                    start = clock()
+                    u_k = controller.compute_control(y, ref)
+                    call_time = clock() - start
+                else:
+                    u_k = controller.compute_control(y, ref)
+            elif k == 0:
+                call_time = first_call
+            u_row = np.asarray(u_k, dtype=float).ravel()
+            command = u_row[0] if nu == 1 else u_row
+
+            if record_timing:
+                start = clock()
+                plant.update(command, dt)
+                step_time = clock() - start
+            else:
+                plant.update(command, dt)
+            x_next = np.array(plant.get_state(), dtype=float).ravel()
+
+            if streaming:
+                row = {'t': t_k, 'x': x_k, 'u': u_row}
+                if record_timing:
+                    row.update(controller_time=call_time, plant_time=step_time)
+                recorder.append(**row)
+            else:
+                u[k] = u_row
+                x[k + 1] = x_next
+                if record_timing:
+                    controller_time[k] = call_time
+                    plant_time[k] = step_time
+            x_k = x_next
+            k += 1
+
+            if not np.isfinite(x_k).all() or (stop is not None and stop(k * dt, x_k)):
+                terminated = True
+                break
+
+        if streaming:
+            row = {'t': k * dt, 'x': x_k, 'u': np.full(nu, np.nan)}
+            if record_timing:
+                row.update(controller_time=np.nan, plant_time=np.nan)
+            recorder.append(**row)
+            recorder.flush()
+            return {'steps': k, 'terminated': terminated, 'x_final': x_k, 'recorder': recorder}
+
+        result = {'t': t[:k + 1], 'x': x[:k + 1], 'u': u[:k], 'steps': k, 'terminated': terminated}
+        if record_timing:
+            result['controller_time'] = controller_time[:k]
+            result['plant_time'] = plant_time[:k]
+        return result
+
+    @staticmethod
+    def _reference(reference, t):
+        return reference(t) if callable(reference) else reference
+
+
+def simulate_closed_loop(plant, controller, dt, steps, reference=None, control_dt=None, measure=None, **options):
+    """Build a ClosedLoopSimulator and run it once, see ClosedLoopSimulator.run."""
+    return ClosedLoopSimulator(plant, controller, dt, control_dt, measure).run(steps, reference, **options)
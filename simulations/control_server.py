@@ -0,0 +1,519 @@
+# Asyncio control server and simulated plant client
+#
+# ControlServer hosts many controller instances ("loops") behind a local
+# socket. Every loop runs as its own task paced on the event loop's
+# monotonic clock: at each tick it takes the latest sensor sample, computes
+# the control and sends the command back. Cheap control laws (PID, LQR) run
+# inline; slow ones (MPC) are offloaded to a thread or process pool, so a
+# long solve delays only its own loop. With processes every loop is pinned
+# to one single-process worker that keeps its controller between ticks, so
+# PID memory and MPC warm starts carry over as they do in-process. A solve that runs past the next tick
+# makes the loop skip the missed ticks (counted as overruns) instead of
+# queueing them.
+#
+# Protocol: one JSON object per line in each direction. Requests carry an
+# 'op' and, for loop operations, the loop 'id':
+#     {"op": "create", "id": "m1", "controller": "pid", "params": {"Kp": 10.0, "DT": 0.01},
+#      "period": 0.01, "reference": 1.0}
+#     {"op": "sample", "id": "m1", "seq": 0, "y": 0.0}        (reference optional)
+#     {"op": "close", "id": "m1"}
+#     {"op": "stats"}
+# The server answers create/close/stats with {"op": ..., "ok": true, ...} or
+# {"ok": false, "error": ...} and sends, at the ticks where a new sample
+# was available,
+#     {"op": "command", "id": "m1", "seq": 0, "tick": 12, "tick_time": 5.02, "u": [3.5]}
+# where seq is the sample the command was computed from and tick_time the
+# scheduled tick on the shared monotonic clock (time.monotonic). A loop
+# whose controller raises is dropped with {"op": "error", "id": ..., "error": ...}.
+#
+# SimulatedPlantClient stands in for hardware: it steps a plant object by
+# one period whenever a command arrives and immediately sends the new
+# state as the next sample, recording the tick-to-actuation latency.
+# run_load_test and the command line measure throughput and tail latency:
+#     python -m simulations.control_server --loops 200 --controller pid --duration 5
+
+import argparse
+import asyncio
+import itertools
+import json
+import math
+import os
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import numpy as np
+
+from controllers.lqr import LQRController
+from controllers.mpc import MPCController
+from controllers.pid import PIDController
+from plants.mass_spring_damper import MassSpringDamper
+
+# name -> (controller class built with **params, offloaded by default)
+CONTROLLERS = {
+    'pid': (PIDController, False),
+    'lqr': (LQRController, False),
+    'mpc': (MPCController, True),
+}
+LATENCY_HISTORY = 100000  # latency samples kept for the percentiles
+WORKER_CACHE_SIZE = 1024  # controllers kept per pool worker process
+
+_worker_controllers = OrderedDict()  # key -> controller, inside process pool workers
+
+
+def _build_controller(factory, params):
+    # JSON lists become arrays (weights, model matrices, limits)
+    return factory(**{name: np.asarray(value, dtype=float) if isinstance(value, list) else value
+                      for name, value in params.items()})
+
+
+def _solve_in_worker(key, factory, params, measurement, reference):
+    """compute_control in a pinned worker process, which keeps one controller per loop."""
+    controller = _worker_controllers.get(key)
+    if controller is None:
+        controller = _build_controller(factory, params)
+        _worker_controllers[key] = controller
+        if len(_worker_controllers) > WORKER_CACHE_SIZE:
+            _worker_controllers.popitem(last=False)
+    else:
+        _worker_controllers.move_to_end(key)
+    return controller.compute_control(measurement, reference)
+
+
+def _encode(message):
+    return (json.dumps(message, separators=(',', ':')) + '\n').encode()
+
+
+def _as_list(u):
+    return np.atleast_1d(np.asarray(u, dtype=float)).tolist()
+
+
+def latency_summary(latencies):
+    """Count, mean, p50, p90, p99, p99.9 and max of latencies, in milliseconds."""
+    values = np.asarray(latencies, dtype=float) * 1e3
+    if values.size == 0:
+        return {'count': 0}
+    p50, p90, p99, p999 = np.percentile(values, [50, 90, 99, 99.9])
+    return {'count': int(values.size), 'mean_ms': float(values.mean()), 'p50_ms': float(p50),
+            'p90_ms': float(p90), 'p99_ms': float(p99), 'p999_ms': float(p999), 'max_ms': float(values.max())}
+
+
+class _Loop:
+    """State of one hosted controller."""
+
+    def __init__(self, loop_id, name, controller, params, period, reference, offload, writer, key):
+        self.id = loop_id
+        self.name = name
+        self.controller = controller
+        self.params = params
+        self.period = period
+        self.reference = reference
+        self.offload = offload
+        self.writer = writer
+        self.key = key  # identifies the loop's controller in pool workers
+        self.worker = 0  # index of the pinned worker process (process executor)
+        self.sample = None  # (seq, measurement) of the latest sample
+        self.last_seq = None  # sample the last command was computed from
+        self.ticks = 0
+        self.commands = 0
+        self.stale = 0  # ticks without a new sample
+        self.overruns = 0  # ticks skipped because the control ran past them
+        self.compute_time = 0.0
+        self.task = None
+
+
+class ControlServer:
+    """Host controller loops behind a local JSON-lines socket."""
+
+    def __init__(self, executor='thread', workers=None, controllers=None):
+        """
+        Args:
+            executor (str): 'thread' or 'process' pool for offloaded solves.
+                Each loop is pinned to one worker process, which builds the
+                loop's controller from its params and keeps it, so the class
+                must be importable there. The server-side controller then
+                only validates the params.
+            workers (int, optional): Pool size, os.cpu_count() by default.
+            controllers (dict, optional): Extra entries for CONTROLLERS,
+                name -> (class, offload).
+        """
+        if executor not in ('thread', 'process'):
+            raise ValueError(f"Unknown executor '{executor}', expected 'thread' or 'process'")
+        self.executor = executor
+        self.workers = workers or os.cpu_count() or 1
+        self.controllers = {**CONTROLLERS, **(controllers or {})}
+        self.loops = {}
+        self.latencies = deque(maxlen=LATENCY_HISTORY)  # tick -> command written, seconds
+        self.jitter = deque(maxlen=LATENCY_HISTORY)  # tick wake-up delay, seconds
+        self._pools = []  # one thread pool, or one single-process pool per worker
+        self._server = None
+        self._keys = itertools.count()
+        self._connections = {}  # handler task -> writer
+        self.address = None
+
+    async def start(self, host='127.0.0.1', port=0, path=None):
+        """Listen on a TCP port (0 picks a free one) or, with path, a Unix socket.
+
+        Returns:
+            The bound (host, port) or the socket path, also in self.address.
+        """
+        if path is not None:
+            self._server = await asyncio.start_unix_server(self._handle, path)
+            self.address = path
+        else:
+            self._server = await asyncio.start_server(self._handle, host, port)
+            self.address = self._server.sockets[0].getsockname()[:2]
+        if self.executor == 'thread':
+            self._pools = [ThreadPoolExecutor(max_workers=self.workers)]
+        else:
+            self._pools = [ProcessPoolExecutor(max_workers=1) for _ in range(self.workers)]
+        return self.address
+
+    async def close(self):
+        for loop in list(self.loops.values()):
+            self._close_loop(loop)
+        if self._server is not None:
+            self._server.close()
+            # Closing the transports ends the handlers, which then exit normally
+            for writer in self._connections.values():
+                writer.close()
+            await asyncio.gather(*self._connections, return_exceptions=True)
+            await self._server.wait_closed()
+            if isinstance(self.address, str) and os.path.exists(self.address):
+                os.unlink(self.address)  # a Unix socket file outlives its server
+        for pool in self._pools:
+            pool.shutdown(wait=True, cancel_futures=True)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def _handle(self, reader, writer):
+        task = asyncio.current_task()
+        self._connections[task] = writer
+        owned = []
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                message = {}
+                try:
+                    message = json.loads(line)
+                    reply = self._dispatch(message, writer, owned)
+                except Exception as error:
+                    # Errors name the request they answer so the client can route them
+                    reply = {'op': message.get('op'), 'ok': False, 'error': f"{type(error).__name__}: {error}"}
+                    if 'id' in message:
+                        reply['id'] = message['id']
+                if reply is not None:
+                    writer.write(_encode(reply))
+        except ConnectionError:
+            pass
+        finally:
+            # The loops of a connection go away with it
+            for loop_id in owned:
+                if loop_id in self.loops:
+                    self._close_loop(self.loops[loop_id])
+            writer.close()
+            self._connections.pop(task, None)
+
+    def _dispatch(self, message, writer, owned):
+        op = message.get('op')
+        if op == 'sample':
+            loop = self.loops[message['id']]
+            loop.sample = (message['seq'], message['y'])
+            if 'reference' in message:
+                loop.reference = message['reference']
+            return None
+        if op == 'create':
+            loop_id = message['id']
+            if loop_id in self.loops:
+                raise ValueError(f"Loop '{loop_id}' already exists")
+            name = message['controller']
+            if name not in self.controllers:
+                raise ValueError(f"Unknown controller '{name}', expected one of {sorted(self.controllers)}")
+            factory, offload = self.controllers[name]
+            params = message.get('params', {})
+            period = float(message['period'])
+            if not period > 0:
+                raise ValueError(f"period must be positive, got {period}")
+            index = next(self._keys)
+            loop = _Loop(loop_id, name, _build_controller(factory, params), params, period,
+                         message.get('reference'), message.get('offload', offload), writer,
+                         f"{os.getpid()}:{index}")
+            loop.worker = index % self.workers
+            self.loops[loop_id] = loop
+            owned.append(loop_id)
+            loop.task = asyncio.get_running_loop().create_task(self._run(loop))
+            return {'op': 'create', 'id': loop_id, 'ok': True}
+        if op == 'close':
+            self._close_loop(self.loops[message['id']])
+            return {'op': 'close', 'id': message['id'], 'ok': True}
+        if op == 'stats':
+            return {'op': 'stats', 'ok': True, **self.stats()}
+        raise ValueError(f"Unknown op {op!r}")
+
+    def _close_loop(self, loop):
+        self.loops.pop(loop.id, None)
+        if loop.task is not None:
+            loop.task.cancel()
+
+    async def _compute(self, loop, measurement, reference):
+        if isinstance(measurement, list):
+            measurement = np.asarray(measurement, dtype=float)
+        if isinstance(reference, list):
+            reference = np.asarray(reference, dtype=float)
+        if not loop.offload:
+            return loop.controller.compute_control(measurement, reference)
+        event_loop = asyncio.get_running_loop()
+        if self.executor == 'thread':
+            return await event_loop.run_in_executor(self._pools[0], loop.controller.compute_control,
+                                                    measurement, reference)
+        factory = self.controllers[loop.name][0]
+        return await event_loop.run_in_executor(self._pools[loop.worker], _solve_in_worker, loop.key, factory,
+                                                loop.params, measurement, reference)
+
+    async def _run(self, loop):
+        event_loop = asyncio.get_running_loop()
+        clock = event_loop.time  # time.monotonic
+        period = loop.period
+        tick_time = clock()
+        while True:
+            delay = tick_time - clock()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            now = clock()
+            self.jitter.append(now - tick_time)
+            sample = loop.sample
+            if sample is None or sample[0] == loop.last_seq:
+                loop.stale += 1
+            else:
+                seq, measurement = sample
+                try:
+                    u = await self._compute(loop, measurement, loop.reference)
+                except Exception as error:
+                    # A failing controller ends its own loop only
+                    loop.writer.write(_encode({'op': 'error', 'id': loop.id, 'ok': False,
+                                               'error': f"{type(error).__name__}: {error}"}))
+                    self.loops.pop(loop.id, None)
+                    return
+                loop.compute_time += clock() - now
+                loop.last_seq = seq
+                writer = loop.writer
+                writer.write(_encode({'op': 'command', 'id': loop.id, 'seq': seq, 'tick': loop.ticks,
+                                      'tick_time': tick_time, 'u': _as_list(u)}))
+                self.latencies.append(clock() - tick_time)
+                loop.commands += 1
+                if writer.transport.get_write_buffer_size() > 1 << 16:
+                    await writer.drain()
+            loop.ticks += 1
+            tick_time += period
+            late = clock() - tick_time
+            if late > 0:
+                # Skip the ticks the control ran past rather than bunching them up
+                missed = math.floor(late / period) + 1
+                loop.overruns += missed
+                loop.ticks += missed
+                tick_time += missed * period
+
+    def stats(self):
+        """Totals over the hosted loops (compute_time in seconds) and latency summaries (milliseconds)."""
+        loops = self.loops.values()
+        return {
+            'loops': len(self.loops),
+            'ticks': sum(loop.ticks for loop in loops),
+            'commands': sum(loop.commands for loop in loops),
+            'stale': sum(loop.stale for loop in loops),
+            'overruns': sum(loop.overruns for loop in loops),
+            'compute_time': sum(loop.compute_time for loop in loops),
+            'latency': latency_summary(self.latencies),
+            'jitter': latency_summary(self.jitter),
+        }
+
+
+class SimulatedPlantClient:
+    """Plants driven by a ControlServer in place of hardware.
+
+    Each plant advances by one period with plant.update(u, period) when its
+    command arrives and then reports its new state as the next sample, so
+    the server's ticks pace the simulation as a real-time clock would.
+    """
+
+    def __init__(self):
+        self.plants = {}  # loop id -> {'plant', 'period', 'measure_index', 'seq', 'states'}
+        self.latencies = deque(maxlen=LATENCY_HISTORY)  # tick -> command received, seconds
+        self.commands = 0
+        self.errors = {}  # loop id -> error that ended the loop on the server
+        self._reader = None
+        self._writer = None
+        self._replies = {}
+        self._task = None
+        self.record_states = True
+
+    async def connect(self, address):
+        """Connect to a (host, port) pair or a Unix socket path."""
+        if isinstance(address, str):
+            self._reader, self._writer = await asyncio.open_unix_connection(address)
+        else:
+            self._reader, self._writer = await asyncio.open_connection(*address)
+        self._task = asyncio.get_running_loop().create_task(self._receive())
+
+    async def _request(self, message, key):
+        future = asyncio.get_running_loop().create_future()
+        self._replies[key] = future
+        self._writer.write(_encode(message))
+        reply = await future
+        if not reply.get('ok', False):
+            raise RuntimeError(reply.get('error', 'request failed'))
+        return reply
+
+    async def add_loop(self, loop_id, plant, controller, params, period, reference=None, measure_index=None,
+                       offload=None):
+        """Create a loop on the server and start driving `plant` with it.
+
+        Args:
+            loop_id (str): Loop name, unique on the server.
+            plant (BasePlant): Plant advanced with update(u, period).
+            controller (str): Controller name, see CONTROLLERS.
+            params (dict): JSON-serializable constructor arguments.
+            period (float): Tick period in seconds, also the plant step.
+            reference: Constant reference passed to compute_control.
+            measure_index (int, optional): Send only this state component
+                (a PIDController's measurement); the full state otherwise.
+            offload (bool, optional): Override the controller's default.
+        """
+        message = {'op': 'create', 'id': loop_id, 'controller': controller, 'params': params,
+                   'period': period, 'reference': reference}
+        if offload is not None:
+            message['offload'] = offload
+        await self._request(message, ('create', loop_id))
+        # Registered only once the server accepted the loop
+        self.plants[loop_id] = {'plant': plant, 'period': period, 'measure_index': measure_index, 'seq': 0,
+                                'states': [np.array(plant.get_state(), dtype=float)]}
+        self._send_sample(loop_id)
+
+    def _send_sample(self, loop_id):
+        entry = self.plants[loop_id]
+        state = np.asarray(entry['plant'].get_state(), dtype=float)
+        y = state.tolist() if entry['measure_index'] is None else float(state[entry['measure_index']])
+        self._writer.write(_encode({'op': 'sample', 'id': loop_id, 'seq': entry['seq'], 'y': y}))
+
+    def _on_command(self, message):
+        received = time.monotonic()
+        entry = self.plants.get(message['id'])
+        if entry is None or message['seq'] != entry['seq']:
+            return
+        self.latencies.append(received - message['tick_time'])
+        self.commands += 1
+        u = message['u']
+        entry['plant'].update(u[0] if len(u) == 1 else np.asarray(u), entry['period'])
+        if self.record_states:
+            entry['states'].append(np.array(entry['plant'].get_state(), dtype=float))
+        entry['seq'] += 1
+        self._send_sample(message['id'])
+
+    async def _receive(self):
+        while True:
+            line = await self._reader.readline()
+            if not line:
+                break
+            message = json.loads(line)
+            op = message.get('op')
+            if op == 'command':
+                self._on_command(message)
+                continue
+            if op == 'error':
+                self.errors[message['id']] = message['error']  # the server dropped this loop
+                continue
+            key = (op, message['id']) if 'id' in message else (op,)
+            future = self._replies.pop(key, None)
+            if future is not None and not future.done():
+                future.set_result(message)
+
+    async def remove_loop(self, loop_id):
+        await self._request({'op': 'close', 'id': loop_id}, ('close', loop_id))
+        return self.plants.pop(loop_id)
+
+    async def server_stats(self):
+        return await self._request({'op': 'stats'}, ('stats',))
+
+    async def close(self):
+        if self._writer is not None:
+            self._writer.close()
+        if self._task is not None:
+            self._task.cancel()
+
+
+async def run_load_test(n_loops=100, controller='pid', period=0.01, duration=5.0, executor='thread', workers=None,
+                        path=None):
+    """Drive n_loops MassSpringDamper loops through a local server and measure them.
+
+    Returns:
+        dict: 'loops', 'duration', the server stats (ticks, commands,
+        stale, overruns, server latency and tick jitter), 'client_latency'
+        (tick to command received), 'commands_per_sec', 'cpu_utilization'
+        (CPU time of this process over wall time, client included and
+        process pool workers excluded) and
+        'loops_per_core', the loops one fully used core would carry at this
+        period.
+    """
+    if controller == 'pid':
+        params, measure_index, reference = {'Kp': 10.0, 'Ki': 1.0, 'Kd': 1.0, 'DT': period}, 0, 1.0
+    elif controller == 'mpc':
+        params, measure_index, reference = {'dt': period, 'horizon': 10}, None, [1.0, 0.0]
+    else:
+        raise ValueError(f"Unknown load-test controller '{controller}', expected 'pid' or 'mpc'")
+
+    server = ControlServer(executor, workers)
+    address = await server.start(path=path)
+    client = SimulatedPlantClient()
+    client.record_states = False
+    try:
+        await client.connect(address)
+        for i in range(n_loops):
+            await client.add_loop(f'loop-{i}', MassSpringDamper(solver='zoh'), controller, params, period,
+                                  reference, measure_index)
+        # Measure a window of steady operation only
+        await asyncio.sleep(min(1.0, duration))
+        client.commands = 0
+        for samples in (client.latencies, server.latencies, server.jitter):
+            samples.clear()
+        before = server.stats()
+        start, cpu_start = time.perf_counter(), time.process_time()
+        await asyncio.sleep(duration)
+        wall, cpu = time.perf_counter() - start, time.process_time() - cpu_start
+        stats = server.stats()
+        for name in ('ticks', 'commands', 'stale', 'overruns', 'compute_time'):
+            stats[name] -= before[name]
+    finally:
+        await client.close()
+        await server.close()
+
+    utilization = cpu / wall
+    return {'loops': n_loops, 'duration': wall, **stats,
+            'client_latency': latency_summary(client.latencies),
+            'commands_per_sec': client.commands / wall,
+            'cpu_utilization': utilization,
+            'loops_per_core': n_loops / utilization if utilization > 0 else math.inf}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure the control server with simulated plants.")
+    parser.add_argument('--loops', type=int, default=100)
+    parser.add_argument('--controller', choices=['pid', 'mpc'], default='pid')
+    parser.add_argument('--period', type=float, default=0.01, help="tick period in seconds")
+    parser.add_argument('--duration', type=float, default=5.0, help="measured seconds")
+    parser.add_argument('--executor', choices=['thread', 'process'], default='thread')
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--unix', default=None, help="Unix socket path instead of a TCP port")
+    args = parser.parse_args(argv)
+    result = asyncio.run(run_load_test(args.loops, args.controller, args.period, args.duration, args.executor,
+                                       args.workers, args.unix))
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,134 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+
+class EnsembleSimulator:
+    """Advance many independent copies of a plant in one vectorized step.
+
+    The plant class provides `make_batch_step(params, dt, **options)`, which
+    returns a function mapping (n_runs, n) states and (n_runs, ...) inputs to
+    the next states. Every parameter is either a scalar shared by all runs or
+    an array with a leading n_runs axis.
+
+    Sharded runs use a process pool that is started on the first such run
+    and kept for the following ones; release it with close() or by using
+    the simulator as a context manager.
+    """
+
+    def __init__(self, plant_class, params, initial_states, dt, **options):
+        self.plant_class = plant_class
+        self.initial_states = np.array(initial_states, dtype=float)
+        if self.initial_states.ndim != 2:
+            raise ValueError(f"initial_states must be (n_runs, n), got shape {self.initial_states.shape}")
+        self.n_runs = self.initial_states.shape[0]
+        self.params = _check_params(params, self.n_runs)
+        self.dt = dt
+        self.options = options
+        self._step = plant_class.make_batch_step(self.params, dt, **options)
+        self.state = self.initial_states.copy()
+        self._pool = None
+        self._pool_workers = None
+
+    def step(self, inputs):
+        """Advance every run by one time step and return the new (n_runs, n) states."""
+        self.state = self._step(self.state, np.asarray(inputs, dtype=float))
+        return self.state
+
+    def reset(self):
+        self.state = self.initial_states.copy()
+
+    def run(self, inputs, n_workers=None, return_trajectory=True, executor=None):
+        """Simulate all runs over an input sequence.
+
+        Args:
+            inputs (np.ndarray): Inputs shaped (n_runs, time_steps, ...)
+            n_workers (int, optional): Shard the runs across this many
+                processes. Runs in the current process when None or 1
+                (unless an executor is given).
+            return_trajectory (bool): Return the full (n_runs, time_steps + 1, n)
+                trajectory, or only the final (n_runs, n) states.
+            executor (concurrent.futures.Executor, optional): Run the shards
+                on this pool instead of the simulator's own; n_workers then
+                sets the number of shards (os.cpu_count() by default).
+
+        Returns:
+            np.ndarray: Trajectories or final states, starting from the
+            current state. The simulator state is advanced to the end.
+        """
+        inputs = np.asarray(inputs, dtype=float)
+        if inputs.shape[0] != self.n_runs:
+            raise ValueError(f"inputs must have n_runs ({self.n_runs}) rows, got shape {inputs.shape}")
+
+        if (executor is None and (n_workers is None or n_workers <= 1)) or self.n_runs < 2:
+            result = simulate_ensemble(self.plant_class, self.params, self.state, inputs, self.dt,
+                                       return_trajectory, **self.options)
+        else:
+            if executor is None:
+                executor = self._get_pool(n_workers)
+            shards = np.array_split(np.arange(self.n_runs), min(n_workers or os.cpu_count() or 1, self.n_runs))
+            futures = [executor.submit(simulate_ensemble, self.plant_class,
+                                       _slice_params(self.params, idx),
+                                       self.state[idx], inputs[idx], self.dt,
+                                       return_trajectory, **self.options)
+                       for idx in shards]
+            result = np.concatenate([f.result() for f in futures], axis=0)
+
+        self.state = np.array(result[:, -1] if return_trajectory else result)
+        return result
+
+    def _get_pool(self, n_workers):
+        if self._pool is None or self._pool_workers != n_workers:
+            self.close()
+            self._pool = ProcessPoolExecutor(max_workers=n_workers)
+            self._pool_workers = n_workers
+        return self._pool
+
+    def close(self):
+        """Shut down the worker pool, if one was started."""
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+            self._pool_workers = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def simulate_ensemble(plant_class, params, initial_states, inputs, dt, return_trajectory=True, **options):
+    """Run one batch of trajectories in the current process (also the worker entry point)."""
+    initial_states = np.asarray(initial_states, dtype=float)
+    step = plant_class.make_batch_step(params, dt, **options)
+    time_steps = inputs.shape[1]
+
+    state = initial_states
+    if not return_trajectory:
+        for k in range(time_steps):
+            state = step(state, inputs[:, k])
+        return state
+
+    # Stored step-major so every write is contiguous; returned as (n_runs, time, n)
+    trajectory = np.empty((time_steps + 1,) + initial_states.shape)
+    trajectory[0] = state
+    for k in range(time_steps):
+        state = step(state, inputs[:, k])
+        trajectory[k + 1] = state
+    return np.moveaxis(trajectory, 0, 1)
+
+
+def _check_params(params, n_runs):
+    checked = {}
+    for name, value in params.items():
+        value = np.asarray(value, dtype=float)
+        if value.ndim > 0 and value.shape[0] != n_runs:
+            raise ValueError(f"Parameter '{name}' must be a scalar or have a leading n_runs ({n_runs}) axis, got shape {value.shape}")
+        checked[name] = value
+    return checked
+
+
+def _slice_params(params, idx):
+    return {name: (value[idx] if value.ndim > 0 else value) for name, value in params.items()}
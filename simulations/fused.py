@@ -0,0 +1,312 @@
+# Fused closed-loop kernels
+#
+# ClosedLoopSimulator calls plant.update and controller.compute_control
+# through Python objects, so every step costs several microseconds of
+# interpreter overhead however simple the arithmetic. FusedClosedLoop
+# instead reads the parameters of a supported plant and controller once and
+# runs the whole loop (control law, plant right-hand side and integrator)
+# in one kernel written with scalar arithmetic only.
+#
+# With numba installed the kernel is compiled with numba.njit, the first
+# time each plant/integrator/controller combination is used; otherwise the
+# same Python functions run uncompiled. Both backends evaluate the same
+# floating-point expressions in the same order, so they give identical
+# trajectories, which also match ClosedLoopSimulator with the original
+# objects up to rounding.
+#
+# Supported plants: DCMotor and InvertedPendulum (integrators 'euler',
+# 'rk4', 'symplectic_euler') and MassSpringDamper (any solver, through its
+# discrete matrices). Supported controllers: PIDController on one state
+# and LQRController.
+
+import math
+
+import numpy as np
+
+from controllers.lqr import LQRController
+from controllers.pid import PIDController
+from plants.dc_motor import DCMotor
+from plants.inverted_pendulum import InvertedPendulum
+from plants.mass_spring_damper import MassSpringDamper
+
+BACKENDS = ('auto', 'numba', 'python')
+INTEGRATORS = ('euler', 'rk4', 'symplectic_euler')
+
+_kernels = {}  # (plant, integrator, controller, backend) -> kernel
+
+
+def numba_available():
+    """True when numba can be imported."""
+    try:
+        import numba  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def resolve_backend(backend='auto'):
+    """Map 'auto' to 'numba' when it is installed and 'python' otherwise."""
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown backend '{backend}', expected one of {BACKENDS}")
+    if backend == 'auto':
+        return 'numba' if numba_available() else 'python'
+    if backend == 'numba' and not numba_available():
+        raise ImportError("The numba backend requires numba, install it with 'pip install numba'")
+    return backend
+
+
+# Plant right-hand sides rhs(x0, x1, u, p) -> (dx0, dx1), written as the
+# vectorized dynamics of the plant classes so both round identically
+
+def _dc_motor_rhs(x0, x1, u, p):
+    # p = [resistance, inductance, back_emf_constant, torque_constant, inertia, damping_coefficient]
+    back_emf = p[2] * x1
+    current_dot = (u - back_emf - p[0] * x0) / p[1]
+    torque = p[3] * x0
+    return current_dot, (torque - p[5] * x1) / p[4]
+
+
+def _pendulum_rhs(x0, x1, u, p):
+    # p = [length, mass, damping_coefficient]
+    return x1, (u - p[2] * x1 - p[1] * 9.81 * p[0] * math.sin(x0)) / (p[1] * p[0] ** 2)
+
+
+def _make_step(rhs, integrator):
+    """Plant step(x, u, p, dt, out) integrating a two-state rhs, as utils.integrators."""
+    if integrator == 'euler':
+        def step(x, u, p, dt, out):
+            d0, d1 = rhs(x[0], x[1], u, p)
+            out[0] = x[0] + dt * d0
+            out[1] = x[1] + dt * d1
+    elif integrator == 'rk4':
+        def step(x, u, p, dt, out):
+            x0, x1 = x[0], x[1]
+            a0, a1 = rhs(x0, x1, u, p)
+            b0, b1 = rhs(x0 + 0.5 * dt * a0, x1 + 0.5 * dt * a1, u, p)
+            c0, c1 = rhs(x0 + 0.5 * dt * b0, x1 + 0.5 * dt * b1, u, p)
+            d0, d1 = rhs(x0 + dt * c0, x1 + dt * c1, u, p)
+            out[0] = x0 + dt / 6.0 * (a0 + 2.0 * b0 + 2.0 * c0 + d0)
+            out[1] = x1 + dt / 6.0 * (a1 + 2.0 * b1 + 2.0 * c1 + d1)
+    else:  # 'symplectic_euler'
+        def step(x, u, p, dt, out):
+            x0 = x[0]
+            v = x[1] + dt * rhs(x0, x[1], u, p)[1]
+            out[0] = x0 + dt * rhs(x0, v, u, p)[0]
+            out[1] = v
+    return step
+
+
+def _linear_step(x, u, p, dt, out):
+    # p = [Ad.ravel(), Bd[:, 0]] of a discrete model x+ = Ad x + Bd u
+    n = x.shape[0]
+    for i in range(n):
+        total = 0.0
+        for j in range(n):
+            total += p[i * n + j] * x[j]
+        out[i] = total + p[n * n + i] * u
+
+
+def _propagate(Ad, Bd, x, u):
+    # x[k] = Ad x[k-1] + Bd u[k] for k >= 1, x[0] set, as plants.stateSpaceSim.propagate
+    n, m = Bd.shape
+    for k in range(1, x.shape[0]):
+        for i in range(n):
+            total = 0.0
+            for j in range(n):
+                total += Ad[i, j] * x[k - 1, j]
+            for j in range(m):
+                total += Bd[i, j] * u[k, j]
+            x[k, i] = total
+
+
+# Control laws control(x, reference, gains, memory) -> u; memory holds the
+# controller state and is updated in place
+
+def _pid_control(x, reference, gains, memory):
+    # gains = [Kp, Ki, Kd, DT, integral low, integral high, measured state]
+    # memory = [previous error, integral], as PIDController.update
+    error = reference[0] - x[int(gains[6])]
+    derivative = (error - memory[0]) / gains[3]
+    memory[0] = error
+    integral = memory[1] + error * gains[3]
+    if integral < gains[4]:
+        integral = gains[4]
+    elif integral > gains[5]:
+        integral = gains[5]
+    memory[1] = integral
+    return gains[0] * error + gains[1] * integral + gains[2] * derivative
+
+
+def _lqr_control(x, reference, gains, memory):
+    # gains = -K[0], u = -K (x - reference)
+    total = 0.0
+    for j in range(x.shape[0]):
+        total += gains[j] * (x[j] - reference[j])
+    return total
+
+
+def _make_loop(step, control):
+    def loop(x, u, p, dt, decimation, reference, gains, memory):
+        # x (steps + 1, n) with x[0] set, u (steps,); returns the steps taken
+        steps = u.shape[0]
+        n = x.shape[1]
+        u_k = 0.0
+        for k in range(steps):
+            if k % decimation == 0:
+                u_k = control(x[k], reference, gains, memory)
+            u[k] = u_k
+            step(x[k], u_k, p, dt, x[k + 1])
+            for i in range(n):
+                if not math.isfinite(x[k + 1, i]):
+                    return k + 1
+        return steps
+    return loop
+
+
+def _kernel(plant_kind, integrator, control_kind, backend):
+    key = (plant_kind, integrator, control_kind, backend)
+    if key not in _kernels:
+        if backend == 'numba':
+            import numba
+            compile_ = numba.njit
+        else:
+            def compile_(fn):
+                return fn
+        if plant_kind == 'linear':
+            step = compile_(_linear_step)
+        else:
+            rhs = compile_(_dc_motor_rhs if plant_kind == 'dc_motor' else _pendulum_rhs)
+            step = compile_(_make_step(rhs, integrator))
+        control = compile_(_pid_control if control_kind == 'pid' else _lqr_control)
+        _kernels[key] = compile_(_make_loop(step, control))
+    return _kernels[key]
+
+
+def propagate_loop(Ad, Bd, x_0, u, backend='auto'):
+    """Step-by-step version of plants.stateSpaceSim.propagate.
+
+    Faster than the blocked NumPy propagation for small models when numba
+    is installed; results agree with it up to rounding.
+
+    Returns:
+        np.ndarray: States (T, n) for inputs u (T, m), u[0] unused.
+    """
+    backend = resolve_backend(backend)
+    key = ('propagate', backend)
+    if key not in _kernels:
+        if backend == 'numba':
+            import numba
+            _kernels[key] = numba.njit(_propagate)
+        else:
+            _kernels[key] = _propagate
+    u = np.ascontiguousarray(u, dtype=float)
+    x = np.empty((u.shape[0], np.size(x_0)))
+    x[0] = np.ravel(x_0)
+    _kernels[key](np.ascontiguousarray(Ad, dtype=float), np.ascontiguousarray(Bd, dtype=float), x, u)
+    return x
+
+
+def _plant_parameters(plant, dt):
+    """(kind, integrator, parameter vector) of a supported plant."""
+    integrator = getattr(plant, 'integrator', None)
+    if isinstance(plant, (DCMotor, InvertedPendulum)) and integrator not in INTEGRATORS:
+        raise ValueError(f"Integrator {integrator!r} has no fused kernel, expected one of {INTEGRATORS}")
+    if isinstance(plant, DCMotor):
+        params = plant.get_params()
+        names = ['resistance', 'inductance', 'back_emf_constant', 'torque_constant', 'inertia', 'damping_coefficient']
+        return 'dc_motor', plant.integrator, np.array([params[name] for name in names], dtype=float)
+    if isinstance(plant, InvertedPendulum):
+        return 'pendulum', plant.integrator, np.array([plant.length, plant.mass, plant.damping_coefficient], dtype=float)
+    if isinstance(plant, MassSpringDamper):
+        A, B = plant._discretize(dt, plant.solver)
+        return 'linear', None, np.concatenate([np.ravel(A), B[:, 0]]).astype(float)
+    raise ValueError(f"No fused kernel for plant {type(plant).__name__}")
+
+
+def _controller_parameters(controller, measure_index, n):
+    """(kind, gains, memory) of a supported controller."""
+    if isinstance(controller, PIDController):
+        low, high = controller.integralLimits
+        gains = np.array([controller.Kp, controller.Ki, controller.Kd, controller.DT, low, high, measure_index],
+                         dtype=float)
+        return 'pid', gains, np.array([controller.error, controller.integral], dtype=float)
+    if isinstance(controller, LQRController):
+        K = np.atleast_2d(np.asarray(controller.K, dtype=float))
+        if K.shape != (1, n):
+            raise ValueError(f"Fused LQR needs a single-input gain of shape (1, {n}), got {K.shape}")
+        return 'lqr', -K[0], np.zeros(0)
+    raise ValueError(f"No fused kernel for controller {type(controller).__name__}")
+
+
+class FusedClosedLoop:
+    """Closed loop of a supported plant and controller run in one kernel.
+
+    The loop has the semantics of ClosedLoopSimulator: the controller runs
+    every `decimation` plant steps, starting at step 0, and its output is
+    held in between. Runs end early when the state becomes non-finite.
+    """
+
+    def __init__(self, plant, controller, dt, control_dt=None, measure_index=0, backend='auto'):
+        """
+        Args:
+            plant (BasePlant): DCMotor, InvertedPendulum or MassSpringDamper.
+            controller (BaseController): PIDController or LQRController.
+            dt (float): Plant integration step.
+            control_dt (float, optional): Controller period, an integer
+                multiple of dt. Defaults to dt.
+            measure_index (int): State fed to a PIDController (a
+                LQRController gets the full state).
+            backend (str): 'numba', 'python' or 'auto' (numba when installed).
+        """
+        self.plant = plant
+        self.controller = controller
+        self.dt = dt
+        self.control_dt = dt if control_dt is None else control_dt
+        ratio = self.control_dt / dt
+        self.decimation = int(round(ratio))
+        if self.decimation < 1 or abs(ratio - self.decimation) > 1e-9 * ratio:
+            raise ValueError(f"control_dt ({self.control_dt}) must be a positive integer multiple of dt ({dt})")
+        self.measure_index = measure_index
+        self.backend = resolve_backend(backend)
+        _plant_parameters(plant, dt)  # reject unsupported plants here rather than in run
+
+    def run(self, steps, reference=None):
+        """Simulate up to `steps` plant steps from the current plant state.
+
+        The plant parameters, controller gains and state are read at every
+        call, and the plant state and the PID memory are written back
+        afterwards, so runs can be chained or continued with the objects
+        themselves.
+
+        Args:
+            steps (int): Number of plant steps.
+            reference: Constant reference, a scalar for a PIDController or
+                a state vector (scalars broadcast) for a LQRController.
+
+        Returns:
+            dict: 't' (k+1,), 'x' (k+1, n), 'u' (k, 1), 'steps' (k) and
+            'terminated', as ClosedLoopSimulator.run without timings.
+        """
+        x_0 = np.asarray(self.plant.get_state(), dtype=float).ravel()
+        n = x_0.size
+        plant_kind, integrator, params = _plant_parameters(self.plant, self.dt)
+        control_kind, gains, memory = _controller_parameters(self.controller, self.measure_index, n)
+        reference = np.zeros(1 if control_kind == 'pid' else n) + (0.0 if reference is None else reference)
+        kernel = _kernel(plant_kind, integrator, control_kind, self.backend)
+
+        x = np.empty((steps + 1, n))
+        u = np.empty(steps)
+        x[0] = x_0
+        with np.errstate(over='ignore', invalid='ignore'):  # divergence is reported as 'terminated'
+            k = kernel(x, u, params, float(self.dt), self.decimation, reference, gains, memory)
+
+        self.plant.set_state(x[k].copy())
+        if control_kind == 'pid':
+            self.controller.error, self.controller.integral = float(memory[0]), float(memory[1])
+        return {'t': np.arange(k + 1) * self.dt, 'x': x[:k + 1], 'u': u[:k, None], 'steps': k,
+                'terminated': k < steps or not np.isfinite(x[k]).all()}
+
+
+def simulate_fused(plant, controller, dt, steps, reference=None, control_dt=None, measure_index=0, backend='auto'):
+    """Build a FusedClosedLoop and run it once, see FusedClosedLoop.run."""
+    return FusedClosedLoop(plant, controller, dt, control_dt, measure_index, backend).run(steps, reference)
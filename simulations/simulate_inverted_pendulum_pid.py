@@ -1,35 +1,31 @@
 import numpy as np
 import matplotlib.pyplot as plt
 from controllers.pid import PIDController
+from plants.inverted_pendulum import InvertedPendulum
+from simulations.closed_loop import simulate_closed_loop
 
 def simulate_inverted_pendulum_pid():
     # Define system parameters
     pendulum_length = 1.0
-    gravity = 9.81
+    pendulum_mass = 1.0
+    damping_coefficient = 0.1
+    dt = 0.01
 
-    # Initialize PID controller
-    pid_controller = PIDController()
+    # Initialize plant and PID controller
+    pendulum = InvertedPendulum(pendulum_length, pendulum_mass, damping_coefficient)
+    pid_controller = PIDController(Kp=40.0, Ki=20.0, Kd=8.0, DT=dt)
 
-    # Initialize state
-    state = 0.0
-
-    # Initialize time and angle arrays
-    time = np.linspace(0, 10, 100)
-    angles = []
-
-    # Simulation loop
-    for t in time:
-        # Compute control input
-        control_input = pid_controller.compute_control(state)
-        
-        # Update state (this is a placeholder, replace with actual state update logic)
-        state += control_input * 0.1
-        
-        # Store the angle
-        angles.append(state)
+    # Regulate the angle to the setpoint
+    setpoint = 0.5
+    result = simulate_closed_loop(pendulum, pid_controller, dt, steps=1000, reference=setpoint,
+                                  measure=lambda state: state[0])
 
     # Plot results
-    plt.plot(time, angles)
+    plt.plot(result['t'], result['x'][:, 0], label='Angle')
+    plt.axhline(setpoint, color='r', linestyle='--', label='Setpoint')
+    plt.xlabel('Time [s]')
+    plt.ylabel('Angle [rad]')
+    plt.legend()
     plt.show()
 
 if __name__ == "__main__":
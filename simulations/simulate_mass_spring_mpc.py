@@ -1,9 +1,9 @@
 import numpy as np
 import matplotlib.pyplot as plt
-from scipy.integrate import solve_ivp
 
 from controllers.mpc import MPCController
 from plants.mass_spring_damper import MassSpringDamper
+from simulations.closed_loop import simulate_closed_loop
 
 # Plant Parameters
 mass = 1.0
@@ -14,33 +14,27 @@ initial_velocity = 0.0
 
 # Simulation Parameters
 solver='continuous'
-t_span = (0, 10)
+dt = 0.01          # plant step
+duration = 10.0
 
 # Controller Parameters
 setpoint = 1.0  # desired position
-
+control_dt = 0.1   # MPC sampling time, the plant runs 10 steps per control update
 
 
 def simulate_mass_spring_mpc():
 
+    plant = MassSpringDamper(mass, spring_constant, damping_coefficient, initial_position, initial_velocity, solver)
 
-    def closed_loop_dynamics(t, y):
-        x, v = y
-        u = mpc_control(x, v, setpoint)
-        return mass_spring_dynamics(t, y, u)
-
-    sol = solve_ivp(closed_loop_dynamics, t_span, y0, t_eval=np.linspace(0, 10, 100))
-
-    # Initialize MPC controller
-    mpc_controller = MPCController()
+    # Initialize MPC controller on the same model
+    mpc_controller = MPCController(dt=control_dt, mass=mass, spring_k=spring_constant, damping_b=damping_coefficient)
 
-    # Simulation loop
-    for t in range(100):
-        state = [sol.y[0][t], sol.y[1][t]]  # Define the state as [position, velocity]
-        control_input = mpc_controller.compute_control(state)
+    result = simulate_closed_loop(plant, mpc_controller, dt, steps=int(round(duration / dt)),
+                                  reference=[setpoint, 0.0], control_dt=control_dt)
+    print(f"Mean MPC solve time: {1e3 * np.nanmean(result['controller_time']):.3f} ms")
 
-    plt.plot(sol.t, sol.y[0], label='Position')
-    plt.plot(sol.t, sol.y[1], label='Velocity')
+    plt.plot(result['t'], result['x'][:, 0], label='Position')
+    plt.plot(result['t'], result['x'][:, 1], label='Velocity')
     plt.axhline(setpoint, color='r', linestyle='--', label='Setpoint')
     plt.xlabel('Time [s]')
     plt.ylabel('State')
@@ -0,0 +1,257 @@
+# Parameter sweeps and controller tuning over closed-loop simulations
+#
+# A sweep evaluates a picklable function config -> metrics (for example
+# mass_spring_mpc below) for every configuration of a design made with
+# grid_design or random_design. Configurations run on a process pool in
+# chunks, and every finished point is appended to a JSON-lines file in
+# cache_dir keyed by a hash of the evaluator and the configuration, so an
+# interrupted or extended sweep never recomputes completed points.
+#
+# Example:
+#     configs = random_design(10000, seed=0, mass=(0.5, 2.0), horizon=(5, 30), r=[0.01, 0.1, 1.0])
+#     results = ParameterSweep(mass_spring_mpc, cache_dir='sweep_cache').run(configs)
+#     table = results_table(results)
+#     best = configs[np.nanargmin(table['iae'])]
+
+import hashlib
+import itertools
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from controllers.mpc import MPCController
+from controllers.pid import PIDController
+from plants.mass_spring_damper import MassSpringDamper
+from simulations.closed_loop import simulate_closed_loop
+from utils.metrics import step_metrics
+
+CACHE_FILE = 'results.jsonl'
+
+
+def grid_design(**axes):
+    """Full factorial design, one dict per combination of the axis values.
+
+    Example:
+        grid_design(mass=[1.0, 2.0], horizon=[10, 20])  # 4 configurations
+    """
+    names = list(axes)
+    return [dict(zip(names, values)) for values in itertools.product(*(axes[name] for name in names))]
+
+
+def random_design(n, seed=None, **ranges):
+    """Random design of n configurations.
+
+    Each range is a (low, high) tuple sampled uniformly (integers when both
+    ends are ints, inclusive), a list sampled as a choice, or a fixed value.
+    """
+    rng = np.random.default_rng(seed)
+    columns = {}
+    for name, spec in ranges.items():
+        if isinstance(spec, tuple) and len(spec) == 2:
+            low, high = spec
+            if isinstance(low, int) and isinstance(high, int):
+                columns[name] = [int(v) for v in rng.integers(low, high + 1, n)]
+            else:
+                columns[name] = [float(v) for v in rng.uniform(low, high, n)]
+        elif isinstance(spec, list):
+            columns[name] = [spec[i] for i in rng.integers(0, len(spec), n)]
+        else:
+            columns[name] = [spec] * n
+    return [{name: columns[name][i] for name in columns} for i in range(n)]
+
+
+def _to_builtin(value):
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"Cannot serialize {type(value).__name__}")
+
+
+def config_key(config, evaluate=None):
+    """Hash identifying a configuration (and the evaluator it was run with)."""
+    payload = json.dumps(config, sort_keys=True, default=_to_builtin)
+    if evaluate is not None:
+        payload = f"{evaluate.__module__}.{evaluate.__qualname__}:{payload}"
+    return hashlib.sha1(payload.encode()).hexdigest()
+
+
+def _diverged(metrics):
+    return {**{name: np.inf for name in metrics}, 'diverged': True}
+
+
+# Defaults of the built-in evaluators; a configuration overrides any of them
+MASS_SPRING_DEFAULTS = {
+    'mass': 1.0, 'spring_constant': 1.0, 'damping_coefficient': 0.5,
+    'setpoint': 1.0, 'dt': 0.01, 'duration': 10.0, 'tolerance': 0.02,
+}
+MPC_DEFAULTS = {'control_dt': 0.1, 'horizon': 10, 'q_position': 1.0, 'q_velocity': 1.0, 'r': 1.0}
+PID_DEFAULTS = {'Kp': 10.0, 'Ki': 1.0, 'Kd': 1.0}
+
+
+def _mass_spring_metrics(config, plant, controller, control_dt, measure, reference):
+    result = simulate_closed_loop(plant, controller, config['dt'], int(round(config['duration'] / config['dt'])),
+                                  reference=reference, control_dt=control_dt, measure=measure,
+                                  record_timing=False)
+    metrics = step_metrics(result['t'], result['x'][:, 0], config['setpoint'], u=result['u'][:, 0],
+                           tolerance=config['tolerance'])
+    metrics = {name: float(value) for name, value in metrics.items()}
+    if result['terminated']:
+        return _diverged(metrics)
+    return {**metrics, 'diverged': False}
+
+
+def mass_spring_mpc(config):
+    """Step-response metrics of MPCController on MassSpringDamper.
+
+    Recognized keys are those of MASS_SPRING_DEFAULTS and MPC_DEFAULTS;
+    the MPC uses the plant's parameters as its model.
+    """
+    config = {**MASS_SPRING_DEFAULTS, **MPC_DEFAULTS, **config}
+    plant = MassSpringDamper(config['mass'], config['spring_constant'], config['damping_coefficient'])
+    mpc = MPCController(dt=config['control_dt'], horizon=int(config['horizon']),
+                        Q=np.diag([config['q_position'], config['q_velocity']]), R=np.array([[config['r']]]),
+                        mass=config['mass'], spring_k=config['spring_constant'],
+                        damping_b=config['damping_coefficient'])
+    return _mass_spring_metrics(config, plant, mpc, config['control_dt'], None, [config['setpoint'], 0.0])
+
+
+def mass_spring_pid(config):
+    """Step-response metrics of a position PIDController on MassSpringDamper.
+
+    Recognized keys are those of MASS_SPRING_DEFAULTS and PID_DEFAULTS;
+    the PID runs at the plant rate.
+    """
+    config = {**MASS_SPRING_DEFAULTS, **PID_DEFAULTS, **config}
+    plant = MassSpringDamper(config['mass'], config['spring_constant'], config['damping_coefficient'])
+    pid = PIDController(config['Kp'], config['Ki'], config['Kd'], DT=config['dt'])
+    return _mass_spring_metrics(config, plant, pid, None, lambda x: x[0], config['setpoint'])
+
+
+def _evaluate_chunk(evaluate, configs):
+    """Run one chunk in a worker. Failures are returned as {'error': message}, not raised."""
+    results = []
+    for config in configs:
+        try:
+            results.append(evaluate(config))
+        except Exception as error:
+            results.append({'error': f"{type(error).__name__}: {error}"})
+    return results
+
+
+class ParameterSweep:
+    """Evaluate many configurations in parallel with an on-disk result cache."""
+
+    def __init__(self, evaluate=mass_spring_mpc, cache_dir=None, n_workers=None, chunksize=None):
+        """
+        Args:
+            evaluate (callable): Module-level function config -> dict of
+                JSON-serializable metrics.
+            cache_dir (str, optional): Directory of the result cache. Without
+                it nothing is stored between runs.
+            n_workers (int, optional): Worker processes, os.cpu_count() by
+                default; 1 runs in the current process.
+            chunksize (int, optional): Configurations per task, chosen from
+                the number of pending points and workers by default.
+        """
+        self.evaluate = evaluate
+        self.cache_dir = cache_dir
+        self.n_workers = n_workers or os.cpu_count() or 1
+        self.chunksize = chunksize
+        self.cache = self._load_cache()
+
+    def _load_cache(self):
+        cache = {}
+        if self.cache_dir is None:
+            return cache
+        path = os.path.join(self.cache_dir, CACHE_FILE)
+        if os.path.exists(path):
+            with open(path) as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue  # a line cut short by an interrupted run
+                    cache[entry['key']] = entry['metrics']
+        return cache
+
+    def run(self, configs, progress=None):
+        """Evaluate every configuration, skipping the ones already cached.
+
+        Args:
+            configs (list): Configuration dicts.
+            progress (callable, optional): progress(done, total) called as
+                chunks finish.
+
+        Returns:
+            list: One dict per configuration, in order, with the
+            configuration and its metrics (or an 'error' entry; failed
+            points are not cached and run again next time).
+        """
+        keys = [config_key(config, self.evaluate) for config in configs]
+        pending = {}
+        for i, key in enumerate(keys):
+            if key not in self.cache:
+                pending.setdefault(key, i)
+        order = list(pending.values())
+        metrics = {}
+
+        log = None
+        if self.cache_dir is not None and order:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            log = open(os.path.join(self.cache_dir, CACHE_FILE), 'a')
+        try:
+            done = 0
+
+            def collect(indices, results):
+                nonlocal done
+                for i, result in zip(indices, results):
+                    metrics[keys[i]] = result
+                    if 'error' not in result:
+                        self.cache[keys[i]] = result
+                        if log is not None:
+                            log.write(json.dumps({'key': keys[i], 'config': configs[i], 'metrics': result},
+                                                 default=_to_builtin) + '\n')
+                if log is not None:
+                    log.flush()
+                done += len(indices)
+                if progress is not None:
+                    progress(done, len(order))
+
+            workers = min(self.n_workers, len(order))
+            if workers <= 1:
+                for i in order:
+                    collect([i], _evaluate_chunk(self.evaluate, [configs[i]]))
+            else:
+                size = self.chunksize or max(1, min(64, len(order) // (4 * workers)))
+                chunks = [order[s:s + size] for s in range(0, len(order), size)]
+                with ProcessPoolExecutor(max_workers=workers) as pool:
+                    futures = {pool.submit(_evaluate_chunk, self.evaluate, [configs[i] for i in chunk]): chunk
+                               for chunk in chunks}
+                    for future in as_completed(futures):
+                        collect(futures[future], future.result())
+        finally:
+            if log is not None:
+                log.close()
+
+        return [{**config, **(self.cache.get(key) or metrics[key])} for config, key in zip(configs, keys)]
+
+
+def run_sweep(configs, evaluate=mass_spring_mpc, cache_dir=None, n_workers=None, **options):
+    """Build a ParameterSweep and run it once, see ParameterSweep.run."""
+    return ParameterSweep(evaluate, cache_dir, n_workers).run(configs, **options)
+
+
+def results_table(results):
+    """Sweep results as a dict of columns (NaN where a key is missing)."""
+    names = list(dict.fromkeys(name for result in results for name in result))
+    table = {}
+    for name in names:
+        column = [result.get(name, np.nan) for result in results]
+        try:
+            table[name] = np.array(column, dtype=float)
+        except (TypeError, ValueError):
+            table[name] = np.array(column, dtype=object)
+    return table
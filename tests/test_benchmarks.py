@@ -0,0 +1,24 @@
+# Tests for the benchmark runner
+
+import json
+
+from benchmarks import run_benchmarks
+
+
+def test_compare_flags_only_regressions_beyond_threshold():
+    baseline = {'a': {'us_per_call': 10.0}, 'b': {'us_per_call': 10.0}, 'gone': {'us_per_call': 1.0}}
+    results = {'a': {'us_per_call': 11.9}, 'b': {'us_per_call': 12.5}, 'new': {'us_per_call': 99.0}}
+    assert run_benchmarks.compare(results, baseline, threshold=0.2) == [('b', 10.0, 12.5, 1.25)]
+    assert run_benchmarks.compare(results, baseline, threshold=0.3) == []
+
+
+def test_main_saves_results_and_fails_on_regression(tmp_path):
+    output = tmp_path / 'results.json'
+    args = ['--filter', 'pid_update', '--repeat', '1', '--min-time', '0.001', '--output', str(output)]
+    assert run_benchmarks.main(args) == 0
+    results = run_benchmarks.load_results(output)
+    assert set(results) == {'pid_update'} and results['pid_update']['steps_per_sec'] > 0
+
+    baseline = tmp_path / 'baseline.json'
+    baseline.write_text(json.dumps({'results': {'pid_update': {'us_per_call': 1e-6}}}))
+    assert run_benchmarks.main(args + ['--baseline', str(baseline)]) == 1
@@ -1,4 +1,272 @@
 # Tests for controllers
 
+import numpy as np
+import pytest
+import scipy.linalg
+
+from controllers import lqr
+from controllers.explicit_mpc import ExplicitMPCController
+from controllers.fleet_mpc import FleetMPC
+from controllers.linear_mpc import LinearMPC
+from controllers.lqr import GainScheduledLQR, LQRController
+from controllers.mpc import MPCController
+from controllers.pid import PIDBank, PIDController
+from utils.discretization import discretize
+
+
 def test_controller_example():
     pass  # Replace with actual test code
+
+
+def test_mpc_osqp_backend_matches_cvxpy():
+    fast = MPCController()
+    reference_mpc = MPCController(backend='cvxpy')
+    state = np.array([0.5, 0.0])
+    reference = np.array([1.0, 0.0])
+    for _ in range(5):
+        u_fast = fast.compute_control(state, reference)
+        u_ref = reference_mpc.compute_control(state, reference)
+        np.testing.assert_allclose(u_fast, u_ref, atol=1e-4)
+        state = fast.A @ state + fast.B @ u_fast
+    np.testing.assert_allclose(fast.get_prediction(), reference_mpc.get_prediction(), atol=1e-4)
+
+
+def test_mpc_weight_and_bound_updates_match_fresh_controller():
+    mpc = MPCController()
+    state = np.array([0.2, -0.1])
+    mpc.compute_control(state)
+    mpc.set_weights(Q=np.diag([10.0, 1.0]), R=np.array([[0.1]]))
+    mpc.set_constraints(u_min=[-1.0], u_max=[1.0])
+
+    fresh = MPCController(Q=np.diag([10.0, 1.0]), R=np.array([[0.1]]))
+    fresh.set_constraints(u_min=[-1.0], u_max=[1.0])
+    np.testing.assert_allclose(mpc.compute_control(state), fresh.compute_control(state), atol=1e-4)
+
+
+def test_mpc_keeps_previous_plan_when_solve_fails():
+    mpc = MPCController()
+    mpc.compute_control(np.array([1.0, 0.0]))
+    plan = mpc.get_prediction()
+    # A state outside the state bounds makes the QP infeasible
+    u = mpc.compute_control(np.array([6.0, 0.0]))
+    assert mpc.status != 'solved'
+    np.testing.assert_allclose(mpc.get_prediction()[:, 1:-1], plan[:, 2:])
+    assert np.all(np.abs(u) <= 10.0)
+
+
+def _random_linear_model(nx=6, nu=2, seed=0):
+    rng = np.random.default_rng(seed)
+    A_cont = 0.3 * rng.normal(size=(nx, nx)) - 0.5 * np.eye(nx)
+    return discretize(A_cont, rng.normal(size=(nx, nu)), 0.1, 'zoh')
+
+
+def test_linear_mpc_sparse_and_condensed_agree():
+    A, B = _random_linear_model()
+    common = dict(Q=np.eye(6), R=0.1 * np.eye(2), P=5 * np.eye(6), horizon=25,
+                  x_min=-1.5, x_max=[1.5, np.inf, 1.5, np.inf, 1.5, np.inf], u_min=-0.5, u_max=0.5,
+                  solver_settings={'eps_abs': 1e-8, 'eps_rel': 1e-8})
+    sparse_mpc = LinearMPC(A, B, formulation='sparse', **common)
+    condensed_mpc = LinearMPC(A, B, formulation='condensed', **common)
+    reference = np.outer(np.linspace(0, 1, 26), np.ones(6))
+    x = np.full(6, 0.8)
+    for _ in range(5):
+        u = sparse_mpc.compute_control(x, reference)
+        np.testing.assert_allclose(condensed_mpc.compute_control(x, reference), u, atol=1e-5)
+        assert np.all(np.abs(u) <= 0.5 + 1e-6)
+        x = A @ x + B @ u
+    np.testing.assert_allclose(condensed_mpc.get_prediction(), sparse_mpc.get_prediction(), atol=1e-4)
+    assert sparse_mpc.get_prediction().shape == (6, 26)
+
+    # Both formulations bound the measured state, so both report this one as infeasible
+    outside = np.array([2.0, 0.0, 0.0, 0.0, 0.0, 0.0])
+    for mpc in (sparse_mpc, condensed_mpc):
+        mpc.compute_control(outside, reference)
+        assert mpc.status == 'primal infeasible' and mpc.solve_info['fallback']
+
+
+def test_linear_mpc_move_blocking():
+    A, B = _random_linear_model()
+    for formulation in ('sparse', 'condensed'):
+        mpc = LinearMPC(A, B, np.eye(6), np.eye(2), horizon=20, u_min=-1, u_max=1,
+                        formulation=formulation, move_blocking=[1, 2, 3, 4, 10])
+        assert mpc.n_blocks == 5
+        mpc.compute_control(np.ones(6))
+        inputs = mpc.get_inputs()
+        assert inputs.shape == (2, 20)
+        np.testing.assert_array_equal(inputs[:, 1], inputs[:, 2])
+        np.testing.assert_array_equal(inputs[:, 10], inputs[:, 19])
+    assert LinearMPC(A, B, np.eye(6), np.eye(2), horizon=20, move_blocking=6).blocks.tolist() == [6, 6, 6, 2]
+    with pytest.raises(ValueError):
+        LinearMPC(A, B, np.eye(6), np.eye(2), horizon=20, move_blocking=[5, 5])
+
+
+def test_mpc_controller_condensed_formulation_matches_sparse():
+    sparse_mpc, condensed_mpc = MPCController(), MPCController(formulation='condensed')
+    state = np.array([0.5, -0.2])
+    for reference in ([1.0, 0.0], [-0.5, 0.0]):
+        np.testing.assert_allclose(condensed_mpc.compute_control(state, np.array(reference)),
+                                   sparse_mpc.compute_control(state, np.array(reference)), atol=1e-3)
+
+
+def test_fleet_mpc_matches_individual_controllers():
+    rng = np.random.default_rng(3)
+    fleet = FleetMPC.from_mpc(MPCController(), 20, eps_abs=1e-6, eps_rel=1e-6)
+    states = rng.uniform(-4, 4, (20, 2))
+    references = np.column_stack([rng.uniform(-1, 1, 20), np.zeros(20)])
+    for _ in range(3):
+        u = fleet.compute_control(states, references)
+        assert u.shape == (20, 1) and fleet.status == 'solved'
+        expected = [MPCController(solver_settings={'eps_abs': 1e-8, 'eps_rel': 1e-8}).compute_control(x, r)
+                    for x, r in zip(states, references)]
+        np.testing.assert_allclose(u, expected, atol=1e-3)
+        states = states @ fleet.template.A.T + u @ fleet.template.B.T
+    assert fleet.get_predictions().shape == (20, 11, 2)
+
+    # Larger problems take the sparse factorization path
+    A, B = _random_linear_model(nx=6, nu=2)
+    fleet = FleetMPC(A, B, np.eye(6), np.eye(2), 4, horizon=60, u_min=-1, u_max=1, eps_abs=1e-6, eps_rel=1e-6)
+    single = LinearMPC(A, B, np.eye(6), np.eye(2), horizon=60, u_min=-1, u_max=1,
+                       solver_settings={'eps_abs': 1e-8, 'eps_rel': 1e-8})
+    x = rng.uniform(-1, 1, (4, 6))
+    np.testing.assert_allclose(fleet.compute_control(x, np.ones(6)), [single.compute_control(xi, np.ones(6)) for xi in x], atol=1e-3)
+
+
+def test_fleet_mpc_solves_hard_states():
+    # States near the bounds, where ADMM alone needs thousands of iterations
+    states = np.random.default_rng(0).uniform(-4, 4, (100, 2))
+    states[0] = [3.85, 3.66]
+    expected, failed = [], []
+    for x in states:
+        mpc = MPCController()
+        expected.append(mpc.compute_control(x, np.zeros(2)))
+        failed.append(mpc.solve_info['fallback'])
+    expected, failed = np.array(expected), np.array(failed)
+    assert failed.sum() == 1
+
+    # Stragglers are handed to OSQP, and a unit OSQP cannot solve is reported
+    fleet = FleetMPC.from_mpc(MPCController(), 100)
+    assert fleet.status is None and not fleet.converged.any()
+    u = fleet.compute_control(states)
+    assert fleet.solve_info['resolved'] > 0 and fleet.solve_info['fallback']
+    np.testing.assert_array_equal(fleet.converged, ~failed)
+    np.testing.assert_allclose(u[~failed], expected[~failed], atol=1e-4)
+
+    # Without the hand-off, adapting rho lets ADMM converge on its own
+    fleet = FleetMPC.from_mpc(MPCController(), 100, min_batch=0, eps_abs=1e-6, eps_rel=1e-6)
+    u = fleet.compute_control(states)
+    assert fleet.solve_info['rho_updates'] > 0 and fleet.solve_info['admm_converged'] >= 99
+    np.testing.assert_allclose(u[~failed], expected[~failed], atol=1e-3)
+
+
+def test_explicit_mpc_matches_online_solution(tmp_path):
+    mpc = MPCController(horizon=4)
+    reference = np.array([1.0, 0.0])
+    explicit = ExplicitMPCController.from_mpc(mpc, reference=reference)
+    assert explicit.n_regions > 1
+
+    rng = np.random.default_rng(0)
+    for state in rng.uniform(-3.0, 3.0, size=(50, 2)):
+        u_online = mpc.compute_control(state, reference)
+        if mpc.status != 'solved':
+            continue
+        assert explicit.locate(state) >= 0
+        np.testing.assert_allclose(explicit.compute_control(state), u_online, atol=1e-5)
+
+    path = tmp_path / 'law.npz'
+    explicit.save(path)
+    loaded = ExplicitMPCController.load(path)
+    np.testing.assert_allclose(loaded.compute_control([0.5, -0.5]), explicit.compute_control([0.5, -0.5]))
+
+
+def test_explicit_mpc_parametric_reference():
+    mpc = MPCController(horizon=3)
+    explicit = ExplicitMPCController.from_mpc(mpc, parametric_reference=True,
+                                              reference_min=[-1.0, -0.5], reference_max=[1.0, 0.5])
+    state, reference = np.array([0.2, 0.1]), np.array([-0.5, 0.0])
+    np.testing.assert_allclose(explicit.compute_control(state, reference),
+                               mpc.compute_control(state, reference), atol=1e-5)
+
+
+def test_pid_bank_single_channel_matches_scalar_pid():
+    scalar = PIDController(Kp=2.0, Ki=0.5, Kd=0.1, DT=0.01, INT_LIMITS=[-0.05, 0.05])
+    bank = PIDBank(Kp=2.0, Ki=0.5, Kd=0.1, DT=0.01, INT_LIMITS=[-0.05, 0.05])
+    rng = np.random.default_rng(0)
+    for measurement in rng.normal(size=200):
+        expected = scalar.update(1.0, measurement)
+        result = bank.update(np.array([1.0]), np.array([measurement]))
+        assert result[0] == expected
+    assert bank.integral[0] == scalar.integral
+
+
+def test_pid_bank_channels_are_independent():
+    Kp = np.array([1.0, 2.0, 3.0])
+    bank = PIDBank(Kp=Kp, Ki=1.0, Kd=0.0, DT=0.1)
+    singles = [PIDController(Kp=k, Ki=1.0, Kd=0.0, DT=0.1) for k in Kp]
+    setpoints = np.array([1.0, -1.0, 0.5])
+    for _ in range(10):
+        measurements = np.array([0.2, 0.1, -0.3])
+        result = bank.update(setpoints, measurements)
+        np.testing.assert_allclose(result, [pid.update(sp, pv) for pid, sp, pv in zip(singles, setpoints, measurements)])
+
+
+def test_pid_bank_back_calculation_limits_windup():
+    unprotected = PIDBank(Kp=1.0, Ki=1.0, DT=0.1, OUT_LIMITS=[-1, 1], ANTI_WINDUP='none', N_CHANNELS=2)
+    back = PIDBank(Kp=1.0, Ki=1.0, DT=0.1, OUT_LIMITS=[-1, 1], ANTI_WINDUP='back_calculation', KB=1.0, N_CHANNELS=2)
+    for _ in range(100):
+        u_none = unprotected.update(np.array([5.0, 5.0]), np.zeros(2))
+        u_back = back.update(np.array([5.0, 5.0]), np.zeros(2))
+    np.testing.assert_allclose(u_none, 1.0)
+    np.testing.assert_allclose(u_back, 1.0)
+    assert np.all(back.integral < unprotected.integral)
+    # After the error reverses, the back-calculated integrator leaves saturation first
+    u_none = unprotected.update(np.zeros(2), np.full(2, 5.5))
+    u_back = back.update(np.zeros(2), np.full(2, 5.5))
+    assert np.all(u_back < u_none)
+
+
+def _mass_spring(mass=1.0, spring_k=1.0, damping_b=0.2):
+    A = np.array([[0.0, 1.0], [-spring_k / mass, -damping_b / mass]])
+    B = np.array([[0.0], [1.0 / mass]])
+    return A, B
+
+
+def test_lqr_continuous_and_discrete_gains_stabilize():
+    A, B = _mass_spring()
+    Q, R = np.eye(2), np.array([[0.1]])
+    continuous = LQRController(A, B, Q, R)
+    assert np.all(np.linalg.eigvals(A - B @ continuous.K).real < 0)
+
+    dt = 0.1
+    Ad, Bd = np.eye(2) + dt * A, dt * B
+    discrete = LQRController(Ad, Bd, Q, R, dt=dt)
+    assert np.all(np.abs(np.linalg.eigvals(Ad - Bd @ discrete.K)) < 1)
+    np.testing.assert_allclose(discrete.update([1.0, 0.0], [1.0, 0.0]), [0.0])
+
+
+def test_lqr_riccati_solutions_are_cached(tmp_path, monkeypatch):
+    A, B = _mass_spring(spring_k=3.0)
+    Q, R = np.eye(2), np.eye(1)
+    lqr.clear_riccati_cache()
+    first = LQRController(A, B, Q, R, cache_dir=str(tmp_path))
+    assert [path.suffix for path in tmp_path.iterdir()] == ['.npz']
+
+    def fail(*args, **kwargs):
+        raise AssertionError("Riccati equation solved again")
+
+    # controllers.lqr imports the solver from scipy.linalg when it needs one
+    monkeypatch.setattr(scipy.linalg, 'solve_continuous_are', fail)
+    assert LQRController(A.copy(), B, Q, R).K is first.K
+    with pytest.raises(ValueError):
+        first.K[0, 0] = 0.0  # shared with the cache
+    lqr.clear_riccati_cache()
+    np.testing.assert_allclose(LQRController(A, B, Q, R, cache_dir=str(tmp_path)).K, first.K)
+
+
+def test_gain_scheduled_lqr_interpolates_between_grid_points():
+    Q, R = np.eye(2), np.eye(1)
+    scheduled = GainScheduledLQR(lambda p: _mass_spring(spring_k=p[0]), [np.array([1.0, 2.0, 3.0])],
+                                 Q, R, scheduling=lambda x: np.array([2.0]))
+    np.testing.assert_allclose(scheduled.gain(np.array([2.0])), LQRController(*_mass_spring(spring_k=2.0), Q, R).K)
+    midpoint = 0.5 * (scheduled.gains[0] + scheduled.gains[1])
+    np.testing.assert_allclose(scheduled.gain(np.array([1.5])), midpoint)
+    np.testing.assert_allclose(scheduled.update([1.0, 0.0]), -scheduled.gains[1] @ [1.0, 0.0])
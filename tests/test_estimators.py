@@ -0,0 +1,110 @@
+# Tests for estimators
+
+import numpy as np
+import pytest
+
+from estimators.kalman import (ExtendedKalmanFilter, KalmanFilter, SteadyStateKalmanFilter,
+                               kalman_filter, rts_smoother, steady_state_gain)
+from plants.inverted_pendulum import InvertedPendulum
+
+
+def _tracking_problem(T=500, channels=None, seed=0):
+    """Position/velocity model with noisy position measurements."""
+    rng = np.random.default_rng(seed)
+    A = np.array([[1.0, 0.1], [0.0, 1.0]])
+    B = np.array([[0.005], [0.1]])
+    C = np.array([[1.0, 0.0]])
+    Q = 1e-3 * np.eye(2)
+    R = np.array([[0.05]])
+    shape = (T,) if channels is None else (T, channels)
+    u = rng.normal(size=shape + (1,))
+    x = np.zeros(shape + (2,))
+    for k in range(1, T):
+        x[k] = x[k - 1] @ A.T + u[k] @ B.T + rng.normal(0, np.sqrt(1e-3), shape[1:] + (2,))
+    y = x @ C.T + rng.normal(0, np.sqrt(0.05), shape + (1,))
+    return A, B, C, Q, R, x, u, y
+
+
+def test_batch_kalman_filter_matches_online_filter():
+    A, B, C, Q, R, x, u, y = _tracking_problem()
+    kf = KalmanFilter(A, B, C, Q, R)
+    online = np.array([kf.update(y[k], u[k]).copy() for k in range(len(y))])
+    # tol=0 only switches once the covariance stops changing in floating point
+    exact = kalman_filter(A, B, C, Q, R, y, u, tol=0)
+    np.testing.assert_allclose(exact['x'], online, atol=1e-12)
+    np.testing.assert_allclose(exact['P'][-1], kf.P, atol=1e-12)
+
+    switched = kalman_filter(A, B, C, Q, R, y, u)
+    assert len(switched['P']) < len(y)
+    np.testing.assert_allclose(switched['x'], online, atol=1e-6)
+
+
+def test_steady_state_filter_matches_batch():
+    A, B, C, Q, R, x, u, y = _tracking_problem()
+    M, P = steady_state_gain(A, C, Q, R)
+    # P is the fixed point of the a-priori covariance recursion
+    P_f = P - M @ C @ P
+    np.testing.assert_allclose(A @ P_f @ A.T + Q, P, atol=1e-10)
+
+    kf = SteadyStateKalmanFilter(A, B, C, Q, R)
+    online = np.array([kf.update(y[k], u[k]).copy() for k in range(len(y))])
+    batch = kalman_filter(A, B, C, Q, R, y, u, steady_state=True)
+    np.testing.assert_allclose(batch['x'], online, atol=1e-10)
+
+
+def test_batch_filter_channels_match_single_runs():
+    A, B, C, Q, R, x, u, y = _tracking_problem(T=300, channels=4)
+    batch = kalman_filter(A, B, C, Q, R, y, u)
+    for c in range(4):
+        single = kalman_filter(A, B, C, Q, R, y[:, c], u[:, c])
+        np.testing.assert_allclose(batch['x'][:, c], single['x'], atol=1e-12)
+
+
+def test_rts_smoother_matches_loop_and_reduces_error():
+    A, B, C, Q, R, x, u, y = _tracking_problem(T=1000)
+    filtered = kalman_filter(A, B, C, Q, R, y, u, tol=0)
+    smoothed, P_smooth = rts_smoother(A, filtered, return_covariance=True)
+
+    P, P_pred = filtered['P'], filtered['P_pred']
+    last = len(P) - 1
+    x_s = filtered['x'].copy()
+    for k in range(len(y) - 2, -1, -1):
+        G = P[min(k, last)] @ A.T @ np.linalg.inv(P_pred[min(k + 1, last)])
+        x_s[k] = filtered['x'][k] + G @ (x_s[k + 1] - filtered['x_pred'][k + 1])
+    np.testing.assert_allclose(smoothed, x_s, atol=1e-9)
+    # The steady-state stretch of a converged filter gives the same means
+    np.testing.assert_allclose(rts_smoother(A, kalman_filter(A, B, C, Q, R, y, u)), x_s, atol=1e-6)
+
+    filter_error = np.sqrt(((filtered['x'] - x) ** 2).mean())
+    smoother_error = np.sqrt(((smoothed - x) ** 2).mean())
+    assert smoother_error < filter_error
+    P_filtered = P[np.minimum(np.arange(len(y)), last)]
+    assert np.all(np.diagonal(P_smooth, axis1=1, axis2=2) <= np.diagonal(P_filtered, axis1=1, axis2=2) + 1e-12)
+
+
+def test_ekf_tracks_pendulum_from_angle_measurements():
+    dt = 0.01
+    plant = InvertedPendulum(length=1.0, mass=1.0, damping_coefficient=0.1, integrator='rk4')
+    plant.state = np.array([0.3, 0.0])
+    ekf = ExtendedKalmanFilter.from_plant(plant, Q=1e-6 * np.eye(2), R=np.array([[1e-4]]), dt=dt,
+                                          C=[[1.0, 0.0]], P0=np.diag([1e-2, 1.0]))
+    ekf.x0 = np.array([0.25, 0.5])
+    ekf.reset()
+    rng = np.random.default_rng(1)
+    for _ in range(300):
+        state = plant.update(0.0, dt)
+        ekf.update(state[0] + rng.normal(0, 1e-2), 0.0)
+    np.testing.assert_allclose(ekf.x, plant.state, atol=0.05)
+
+
+def test_ekf_requires_measurement_model():
+    with pytest.raises(ValueError):
+        ExtendedKalmanFilter(InvertedPendulum.dynamics, {}, np.eye(2), np.eye(1), 0.01, np.zeros(2))
+
+
+def test_ekf_omitted_input_has_the_model_input_dimension():
+    B = np.array([[1.0, 0.0], [0.0, 2.0]])
+    ekf = ExtendedKalmanFilter(lambda x, u, params: -x + u @ B.T, {}, np.eye(2), np.eye(2), 0.1, np.ones(2),
+                               C=np.eye(2), integrator='euler', n_inputs=2)
+    np.testing.assert_allclose(ekf.predict(), [0.9, 0.9])
+    np.testing.assert_allclose(ekf.predict([1.0, 1.0]), [0.91, 1.01])
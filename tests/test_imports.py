@@ -0,0 +1,49 @@
+# Import-time budget of the core plant and controller APIs
+
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# What a short-lived simulation worker imports
+CORE_IMPORTS = """
+from controllers import PIDBank, PIDController, LQRController
+from plants import DCMotor, InvertedPendulum, MassSpringDamper, StateSpaceSim
+import controllers.mpc
+import simulations.closed_loop
+import simulations.fused
+import utils.filters
+"""
+HEAVY_MODULES = ['cvxpy', 'matplotlib', 'numba', 'pandas', 'scipy.integrate', 'scipy.optimize', 'scipy.signal']
+# Seconds for the imports above after numpy is loaded (about 0.3 s, mostly osqp)
+IMPORT_BUDGET = 1.0
+
+
+def _import_profile(code):
+    script = (
+        "import json, sys, time\n"
+        "import numpy\n"
+        "start = time.perf_counter()\n"
+        f"{code}\n"
+        "print(json.dumps({'seconds': time.perf_counter() - start, 'modules': sorted(sys.modules)}))\n"
+    )
+    output = subprocess.run([sys.executable, '-c', script], cwd=ROOT, capture_output=True, text=True, check=True)
+    return json.loads(output.stdout)
+
+
+def test_core_imports_skip_heavy_dependencies_and_meet_budget():
+    profile = _import_profile(CORE_IMPORTS)
+    assert [m for m in HEAVY_MODULES if m in profile['modules']] == []
+    assert profile['seconds'] < IMPORT_BUDGET
+
+
+@pytest.mark.parametrize('name, module', [('PIDController', 'controllers.pid'), ('MassSpringDamper', 'plants.mass_spring_damper')])
+def test_package_exports_load_only_their_module(name, module):
+    package = module.split('.')[0]
+    profile = _import_profile(f"import {package}\nassert '{module}' not in sys.modules\nfrom {package} import {name}")
+    assert module in profile['modules']
+    assert not {'controllers.mpc', 'controllers.explicit_mpc', 'plants.batteryModel'} & set(profile['modules'])
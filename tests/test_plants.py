@@ -1,4 +1,142 @@
 # Tests for plant models
 
+import numpy as np
+import pytest
+from scipy.signal import cont2discrete
+
+from plants.batteryModel import fit_ecm_batch, simulate_ecm
+from plants.dc_motor import DCMotor
+from plants.inverted_pendulum import InvertedPendulum
+from plants.mass_spring_damper import MassSpringDamper
+from plants.stateSpaceSim import StateSpaceSim, propagate
+from utils.integrators import INTEGRATORS
+
+
 def test_plant_example():
     pass  # Replace with actual test code
+
+
+def _damped_oscillator(steps=500, dt=0.01):
+    A = np.array([[0.0, 1.0], [-1.0, -0.1]])
+    B = np.array([[0.0], [1.0]])
+    C = np.array([[1.0, 0.0]])
+    D = np.array([[0.0]])
+    x_0 = np.array([[1.0], [0.0]])
+    u = np.sin(np.arange(steps) * dt).reshape(-1, 1)
+    return A, B, C, D, x_0, u, dt
+
+
+def test_state_space_euler_matches_stepwise_loop():
+    A, B, C, D, x_0, u, dt = _damped_oscillator()
+    x_ref = np.zeros((len(u), 2))
+    x_ref[0] = x_0.flatten()
+    for k in range(1, len(u)):
+        x_ref[k] = x_ref[k-1] + dt * (A @ x_ref[k-1] + B @ u[k])
+
+    x, y = StateSpaceSim(A, B, C, D, x_0, u, dt).simulate()
+    np.testing.assert_allclose(x, x_ref, atol=1e-12)
+    np.testing.assert_allclose(y, x_ref @ C.T, atol=1e-12)
+
+
+def test_state_space_zoh_uses_exact_discretization():
+    A, B, C, D, x_0, u, dt = _damped_oscillator()
+    Ad, Bd, _, _, _ = cont2discrete((A, B, C, D), dt, method='zoh')
+    sim = StateSpaceSim(A, B, C, D, x_0, u, dt)
+    np.testing.assert_allclose(sim.discretize('zoh')[0], Ad, atol=1e-12)
+    np.testing.assert_allclose(sim.discretize('zoh')[1], Bd, atol=1e-12)
+
+    x, _ = sim.simulate(method='zoh')
+    x_ref = np.zeros_like(x)
+    x_ref[0] = x_0.flatten()
+    for k in range(1, len(u)):
+        x_ref[k] = Ad @ x_ref[k-1] + Bd @ u[k]
+    np.testing.assert_allclose(x, x_ref, atol=1e-12)
+
+
+def test_propagate_handles_partial_blocks_and_wide_inputs():
+    rng = np.random.default_rng(0)
+    n, m = 4, 6
+    Ad = 0.9 * np.eye(n) + 0.05 * rng.normal(size=(n, n))
+    Bd = rng.normal(size=(n, m))
+    x_0 = rng.normal(size=n)
+    for steps in (1, 2, 9, 10, 77):
+        u = rng.normal(size=(steps, m))
+        x_ref = np.zeros((steps, n))
+        x_ref[0] = x_0
+        for k in range(1, steps):
+            x_ref[k] = Ad @ x_ref[k-1] + Bd @ u[k]
+        np.testing.assert_allclose(propagate(Ad, Bd, x_0, u, block_size=3), x_ref, atol=1e-12)
+
+
+def _pulse_current(n=2000):
+    k = np.arange(n)
+    return 2.0 * ((k // 200) % 2 == 0) + 0.5
+
+
+def test_ecm_recursion_matches_loop():
+    current, dt = _pulse_current(300), 0.1
+    params = {'E0': 3.7, 'R0': 0.05, 'R1': 0.02, 'C1': 800.0}
+    Vc = np.zeros_like(current)
+    for k in range(1, len(current)):
+        Vc[k] = Vc[k-1] + dt * (current[k] / 800.0 - Vc[k-1] / (0.02 * 800.0))
+    np.testing.assert_allclose(simulate_ecm(params, current, dt), 3.7 - 0.05 * current - Vc, atol=1e-12)
+
+
+def test_ecm_sensitivities_match_finite_differences():
+    current, dt = _pulse_current(500), 1.0
+    params = {'E0': 3.7, 'R0': 0.05, 'R1': 0.02, 'C1': 800.0, 'R2': 0.03, 'C2': 5000.0}
+    for method in ('euler', 'zoh'):
+        _, sens = simulate_ecm(params, current, dt, method, return_sensitivities=True)
+        for name, value in params.items():
+            step = 1e-6 * abs(value)
+            up = simulate_ecm(dict(params, **{name: value + step}), current, dt, method)
+            down = simulate_ecm(dict(params, **{name: value - step}), current, dt, method)
+            np.testing.assert_allclose(sens[name], (up - down) / (2 * step), rtol=1e-5, atol=1e-7)
+
+
+def test_fit_ecm_recovers_two_rc_parameters():
+    current, dt = _pulse_current(), 1.0
+    true = {'E0': 3.7, 'R0': 0.05, 'R1': 0.02, 'C1': 500.0, 'R2': 0.04, 'C2': 20000.0}
+    voltage = simulate_ecm(true, current, dt, 'zoh')
+    fits = fit_ecm_batch([current, current], [voltage, voltage + 0.01], dt, n_rc=2, method='zoh',
+                         initial={'R1': 0.01, 'C1': 1000.0, 'R2': 0.02, 'C2': 10000.0})
+    for name, value in true.items():
+        assert fits[0]['params'][name] == pytest.approx(value, rel=1e-4)
+    assert fits[1]['params']['E0'] == pytest.approx(3.71, rel=1e-6)
+
+
+def test_mass_spring_damper_update_state_solvers():
+    from scipy.integrate import solve_ivp
+
+    exact = MassSpringDamper(mass=2.0, initial_position=1.0)
+    euler = MassSpringDamper(mass=2.0, initial_position=1.0, solver='euler')
+    sol = solve_ivp(lambda t, x: exact._dynamics(t, x, 0.5), [0, 0.5], exact.get_state(), rtol=1e-10, atol=1e-12)
+    x = euler.get_state()
+    for _ in range(50):
+        exact.update_state(0.5, 0.01)
+        x = x + 0.01 * exact._dynamics(0, x, 0.5)
+        euler.update_state(0.5, 0.01)
+    np.testing.assert_allclose(exact.get_state(), sol.y[:, -1], atol=1e-8)
+    np.testing.assert_allclose(euler.get_state(), x, atol=1e-12)
+
+    # Changing a parameter invalidates the cached step matrices
+    euler.spring_constant = 4.0
+    before = euler.get_state()
+    np.testing.assert_allclose(euler.update_state(0.0, 0.01)[1], before[1] - 0.01 * (2.0 * before[0] + 0.25 * before[1]))
+
+
+@pytest.mark.parametrize('integrator', ['euler', 'rk4', 'symplectic_euler'])
+@pytest.mark.parametrize('make_plant', [lambda integrator: DCMotor(1.0, 0.5, 0.01, 0.01, 0.01, 0.1, integrator=integrator),
+                                        lambda integrator: InvertedPendulum(1.0, 1.0, 0.1, integrator=integrator)])
+def test_scalar_update_matches_batched_integrator(make_plant, integrator):
+    fast, batched = make_plant(integrator), make_plant(INTEGRATORS[integrator])
+    fast.set_state([0.3, -0.2])
+    batched.set_state(np.array([0.3, -0.2]))
+    for u in np.random.default_rng(0).normal(scale=5.0, size=500):
+        fast.update(u, 0.001)
+        batched.update(u, 0.001)
+    np.testing.assert_array_equal(fast.get_state(), batched.get_state())
+
+    # Parameters changed after construction are picked up by both paths
+    fast.damping_coefficient = batched.damping_coefficient = 0.5
+    np.testing.assert_array_equal(fast.update(1.0, 0.001), batched.update(1.0, 0.001))
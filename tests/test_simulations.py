@@ -0,0 +1,304 @@
+# Tests for simulation utilities
+
+import asyncio
+import time
+
+import numpy as np
+import pytest
+
+from controllers.base_controller import BaseController
+from controllers.lqr import LQRController
+from controllers.mpc import MPCController
+from controllers.pid import PIDController
+from plants.dc_motor import DCMotor
+from plants.inverted_pendulum import InvertedPendulum
+from plants.mass_spring_damper import MassSpringDamper
+from plants.stateSpaceSim import StateSpaceSim
+from simulations.closed_loop import ClosedLoopSimulator, simulate_closed_loop
+from simulations.ensemble import EnsembleSimulator
+from simulations import control_server, fused, sweep
+from utils.recorder import TrajectoryRecorder
+
+
+def test_ensemble_matches_scalar_plants():
+    rng = np.random.default_rng(1)
+    n_runs, steps, dt = 5, 50, 0.01
+    lengths = rng.uniform(0.5, 1.5, n_runs)
+    params = {'length': lengths, 'mass': 1.0, 'damping_coefficient': 0.1}
+    x0 = rng.normal(scale=0.2, size=(n_runs, 2))
+    torques = rng.normal(size=(n_runs, steps))
+
+    ens = EnsembleSimulator(InvertedPendulum, params, x0, dt)
+    traj = ens.run(torques)
+    assert traj.shape == (n_runs, steps + 1, 2)
+
+    for r in range(n_runs):
+        plant = InvertedPendulum(lengths[r], 1.0, 0.1)
+        plant.set_state(list(x0[r]))
+        for k in range(steps):
+            plant.update(torques[r, k], dt)
+        np.testing.assert_allclose(traj[r, -1], plant.get_state(), rtol=1e-12)
+    np.testing.assert_allclose(ens.state, traj[:, -1])
+
+
+def test_ensemble_dc_motor_step_matches_update():
+    motor = DCMotor(1.0, 0.5, 0.01, 0.01, 0.01, 0.1)
+    motor.set_state([0.2, 3.0])
+    ens = EnsembleSimulator(DCMotor, motor.get_params(), [[0.2, 3.0]], 0.001)
+    motor.update(12.0, 0.001)
+    np.testing.assert_allclose(ens.step([12.0])[0], motor.get_state())
+
+
+def test_ensemble_mass_spring_zoh_and_state_space_agree():
+    n_runs, steps, dt = 4, 20, 0.05
+    masses = np.linspace(0.5, 2.0, n_runs)
+    x0 = np.tile([1.0, 0.0], (n_runs, 1))
+    forces = np.ones((n_runs, steps))
+    msd = EnsembleSimulator(MassSpringDamper,
+                            {'mass': masses, 'spring_constant': 2.0, 'damping_coefficient': 0.3},
+                            x0, dt, solver='zoh').run(forces)
+
+    A = np.zeros((n_runs, 2, 2))
+    A[:, 0, 1] = 1.0
+    A[:, 1, 0] = -2.0 / masses
+    A[:, 1, 1] = -0.3 / masses
+    B = np.zeros((n_runs, 2, 1))
+    B[:, 1, 0] = 1.0 / masses
+    ss = EnsembleSimulator(StateSpaceSim, {'A': A, 'B': B}, x0, dt, method='zoh').run(forces[..., None])
+    np.testing.assert_allclose(msd, ss, atol=1e-12)
+
+
+def test_ensemble_process_pool_matches_serial():
+    n_runs, steps = 6, 30
+    params = {'length': np.linspace(0.5, 1.5, n_runs), 'mass': 1.0, 'damping_coefficient': 0.1}
+    x0 = np.full((n_runs, 2), 0.1)
+    torques = np.zeros((n_runs, steps))
+    serial = EnsembleSimulator(InvertedPendulum, params, x0, 0.01).run(torques)
+    with EnsembleSimulator(InvertedPendulum, params, x0, 0.01) as ensemble:
+        sharded = ensemble.run(torques, n_workers=2)
+        pool = ensemble._pool
+        ensemble.reset()
+        # The pool is started once and reused by later runs
+        np.testing.assert_allclose(ensemble.run(torques, n_workers=2), sharded)
+        assert ensemble._pool is pool
+    assert ensemble._pool is None
+    np.testing.assert_allclose(sharded, serial)
+
+
+def test_closed_loop_multi_rate_matches_manual_loop():
+    reference = np.array([1.0, 0.0])
+    result = simulate_closed_loop(MassSpringDamper(solver='zoh'), MPCController(dt=0.1), 0.01, 95,
+                                  reference=reference, control_dt=0.1)
+
+    plant, mpc = MassSpringDamper(solver='zoh'), MPCController(dt=0.1)
+    states = [plant.get_state()]
+    for k in range(95):
+        if k % 10 == 0:
+            u = mpc.compute_control(states[-1], reference)
+        states.append(plant.update(u[0], 0.01))
+    np.testing.assert_allclose(result['x'], states, atol=1e-12)
+    assert result['u'].shape == (95, 1) and result['steps'] == 95 and not result['terminated']
+    assert np.isfinite(result['controller_time']).sum() == 10
+    assert np.all(np.diff(result['u'][:10, 0]) == 0)
+
+
+def test_closed_loop_pid_measure_and_early_stop():
+    sim = ClosedLoopSimulator(InvertedPendulum(1.0, 1.0, 0.1), PIDController(Kp=40.0, Ki=20.0, Kd=8.0, DT=0.01), 0.01,
+                              measure=lambda state: state[0])
+    result = sim.run(1000, reference=0.5, stop=lambda t, x: abs(x[0] - 0.5) < 0.01, record_timing=False)
+    assert result['terminated'] and result['steps'] < 1000
+    assert abs(result['x'][-1, 0] - 0.5) < 0.01
+    assert len(result['t']) == len(result['x']) == result['steps'] + 1
+    assert 'plant_time' not in result
+
+    with pytest.raises(ValueError):
+        ClosedLoopSimulator(sim.plant, sim.controller, 0.01, control_dt=0.015)
+
+
+def test_closed_loop_and_state_space_stream_to_recorder():
+    reference = np.array([1.0, 0.0])
+    expected = simulate_closed_loop(MassSpringDamper(solver='zoh'), MPCController(dt=0.1), 0.01, 250,
+                                    reference=reference, control_dt=0.1)
+    recorder = TrajectoryRecorder(chunk_size=32)
+    result = simulate_closed_loop(MassSpringDamper(solver='zoh'), MPCController(dt=0.1), 0.01, 250,
+                                  reference=reference, control_dt=0.1, recorder=recorder)
+    arrays = recorder.to_arrays()
+    assert result['steps'] == 250 and arrays['x'].shape == (251, 2)
+    np.testing.assert_allclose(arrays['x'], expected['x'], atol=1e-12)
+    np.testing.assert_allclose(arrays['t'], expected['t'])
+    np.testing.assert_allclose(arrays['u'][:-1], expected['u'])
+    assert np.isnan(arrays['u'][-1]).all() and np.isfinite(arrays['controller_time']).sum() == 25
+
+    A, B = np.array([[0.0, 1.0], [-1.0, -0.5]]), np.array([[0.0], [1.0]])
+    C, D = np.eye(2), np.zeros((2, 1))
+    u = np.sin(np.arange(1000) * 0.01)[:, None]
+    x, y = StateSpaceSim(A, B, C, D, np.array([1.0, 0.0]), u, 0.01).simulate('zoh')
+    recorder = StateSpaceSim(A, B, C, D, np.array([1.0, 0.0]), u, 0.01).simulate(
+        'zoh', recorder=TrajectoryRecorder(chunk_size=100), chunk_size=300)
+    np.testing.assert_allclose(recorder.to_arrays()['x'], x, atol=1e-12)
+    np.testing.assert_allclose(recorder.to_arrays()['y'], y, atol=1e-12)
+
+
+def _fused_cases():
+    A, B = np.array([[-2.0, -0.02], [1.0, -10.0]]), np.array([[2.0], [0.0]])
+    yield (lambda: InvertedPendulum(1.0, 1.0, 0.1), lambda: PIDController(40.0, 20.0, 8.0, DT=0.01), 0.01, None, 0.5)
+    yield (lambda: DCMotor(1.0, 0.5, 0.01, 0.01, 0.01, 0.1, integrator='rk4'),
+           lambda: LQRController(A, B, np.eye(2), np.eye(1)), 0.001, 0.01, [0.0, 1.0])
+    yield (lambda: MassSpringDamper(solver='zoh'), lambda: PIDController(10.0, 2.0, 1.0, DT=0.05), 0.01, 0.05, 1.0)
+
+
+@pytest.mark.parametrize('backend', ['python', 'numba'])
+def test_fused_closed_loop_matches_closed_loop_simulator(backend):
+    if backend == 'numba':
+        pytest.importorskip('numba')
+    for make_plant, make_controller, dt, control_dt, reference in _fused_cases():
+        measure = (lambda x: x[0]) if isinstance(make_controller(), PIDController) else None
+        expected = simulate_closed_loop(make_plant(), make_controller(), dt, 500, reference=reference,
+                                        control_dt=control_dt, measure=measure, record_timing=False)
+        plant, controller = make_plant(), make_controller()
+        result = fused.simulate_fused(plant, controller, dt, 500, reference=reference, control_dt=control_dt,
+                                      backend=backend)
+        np.testing.assert_allclose(result['x'], expected['x'], rtol=1e-12, atol=1e-14)
+        np.testing.assert_allclose(result['u'], expected['u'], rtol=1e-12, atol=1e-14)
+        np.testing.assert_array_equal(result['t'], expected['t'])
+        assert result['steps'] == 500 and not result['terminated']
+        np.testing.assert_array_equal(plant.get_state(), result['x'][-1])
+        # Both backends evaluate the same expressions, so they agree exactly
+        python = fused.simulate_fused(make_plant(), make_controller(), dt, 500, reference=reference,
+                                      control_dt=control_dt, backend='python')
+        np.testing.assert_array_equal(result['x'], python['x'])
+
+
+def test_fused_closed_loop_reads_plant_parameters_every_run():
+    plant = InvertedPendulum(1.0, 1.0, 0.1)
+    loop = fused.FusedClosedLoop(plant, PIDController(40.0, 20.0, 8.0, DT=0.01), 0.01, backend='python')
+    loop.run(100, reference=0.5)
+    fresh = InvertedPendulum(1.0, 1.0, 0.5)
+    fresh.set_state(plant.get_state().copy())
+    controller = PIDController(40.0, 20.0, 8.0, DT=0.01)
+    controller.error, controller.integral = loop.controller.error, loop.controller.integral
+
+    plant.damping_coefficient = 0.5
+    continued = loop.run(100, reference=0.5)
+    expected = fused.FusedClosedLoop(fresh, controller, 0.01, backend='python').run(100, reference=0.5)
+    np.testing.assert_array_equal(continued['x'], expected['x'])
+
+def test_fused_closed_loop_stops_on_divergence_and_rejects_unsupported():
+    result = fused.simulate_fused(InvertedPendulum(1.0, 1.0, 0.1, integrator='euler'),
+                                  PIDController(-1e6, 0.0, 0.0, DT=0.1), 0.1, 1000, reference=1.0, backend='python')
+    assert result['terminated'] and result['steps'] < 1000 and not np.isfinite(result['x'][-1]).all()
+    with pytest.raises(ValueError):
+        fused.FusedClosedLoop(InvertedPendulum(1.0, 1.0, 0.1, integrator='rk45'), PIDController(), 0.01)
+    with pytest.raises(ValueError):
+        fused.FusedClosedLoop(MassSpringDamper(), MPCController(), 0.01).run(10)
+
+    A, B = np.array([[0.0, 1.0], [-1.0, -0.5]]), np.array([[0.0], [1.0]])
+    u = np.sin(np.arange(1000) * 0.01)[:, None]
+    sim = StateSpaceSim(A, B, np.eye(2), np.zeros((2, 1)), np.array([1.0, 0.0]), u, 0.01)
+    x, _ = sim.simulate('zoh')
+    np.testing.assert_allclose(sim.simulate('zoh', backend='python')[0], x, atol=1e-12)
+
+
+def test_designs():
+    grid = sweep.grid_design(mass=[1.0, 2.0], horizon=[5, 10, 20])
+    assert len(grid) == 6 and grid[0] == {'mass': 1.0, 'horizon': 5}
+    design = sweep.random_design(50, seed=0, mass=(0.5, 2.0), horizon=(5, 30), r=[0.1, 1.0], dt=0.01)
+    assert all(0.5 <= c['mass'] <= 2.0 and 5 <= c['horizon'] <= 30 and c['r'] in (0.1, 1.0) for c in design)
+    assert isinstance(design[0]['horizon'], int) and design[0]['dt'] == 0.01
+    assert design == sweep.random_design(50, seed=0, mass=(0.5, 2.0), horizon=(5, 30), r=[0.1, 1.0], dt=0.01)
+
+
+def _square(config):
+    return {'value': config['x'] ** 2}
+
+
+def test_sweep_caches_results_on_disk(tmp_path):
+    configs = sweep.grid_design(Kp=[5.0, 50.0], Kd=[0.5, 5.0], duration=[2.0])
+    first = sweep.ParameterSweep(sweep.mass_spring_pid, cache_dir=str(tmp_path), n_workers=2).run(configs)
+    assert [r['Kp'] for r in first] == [5.0, 5.0, 50.0, 50.0]
+    assert all(np.isfinite(r['iae']) and not r['diverged'] for r in first)
+
+    # A new sweep over a superset only evaluates the new point
+    done = []
+    extended = configs + [{'Kp': 20.0, 'Kd': 1.0, 'duration': 2.0}]
+    second = sweep.ParameterSweep(sweep.mass_spring_pid, cache_dir=str(tmp_path), n_workers=1).run(
+        extended, progress=lambda n, total: done.append(total))
+    assert done == [1]
+    assert second[:4] == first
+    table = sweep.results_table(second)
+    assert table['iae'].shape == (5,)
+
+    # The evaluator is part of the key
+    other = sweep.ParameterSweep(_square, cache_dir=str(tmp_path), n_workers=1)
+    assert sweep.config_key({'x': 1}, _square) != sweep.config_key({'x': 1}, sweep.mass_spring_pid)
+    assert other.run([{'x': 3}, {'y': 1}])[0]['value'] == 9
+    assert 'error' in other.run([{'y': 1}])[0]
+
+
+class _SlowController(BaseController):
+    def update(self, measurement, reference=None):
+        time.sleep(0.05)
+        return 0.0
+
+    def reset(self):
+        pass
+
+
+def test_control_server_drives_simulated_plants_and_isolates_slow_loops():
+    period = 0.005
+    params = {'Kp': 10.0, 'Ki': 1.0, 'Kd': 1.0, 'DT': period}
+
+    async def session():
+        server = control_server.ControlServer(controllers={'slow': (_SlowController, True)}, workers=2)
+        client = control_server.SimulatedPlantClient()
+        try:
+            await client.connect(await server.start())
+            for i in range(3):
+                await client.add_loop(f'pid-{i}', MassSpringDamper(solver='zoh'), 'pid', params, period, 1.0, 0)
+            await client.add_loop('slow', MassSpringDamper(solver='zoh'), 'slow', {}, period, None, 0)
+            with pytest.raises(RuntimeError, match='Unknown controller'):
+                await client.add_loop('bad', MassSpringDamper(), 'nope', {}, period)
+            assert 'bad' not in client.plants
+            await asyncio.sleep(0.5)
+            stats = await client.server_stats()
+            return stats, {name: (await client.remove_loop(name))['states'] for name in ('pid-0', 'slow')}
+        finally:
+            await client.close()
+            await server.close()
+
+    stats, states = asyncio.run(session())
+    assert stats['loops'] == 4 and stats['overruns'] > 0 and stats['latency']['count'] == stats['commands']
+    # Every command answers the sample sent after the previous one, so the
+    # served loop reproduces the offline closed loop step for step
+    steps = len(states['pid-0']) - 1
+    assert steps > 20 and len(states['slow']) < steps
+    expected = simulate_closed_loop(MassSpringDamper(solver='zoh'), PIDController(**params), period, steps,
+                                    reference=1.0, measure=lambda x: x[0], record_timing=False)
+    np.testing.assert_allclose(states['pid-0'], expected['x'], atol=1e-12)
+
+
+def test_control_server_keeps_offloaded_controller_state_in_process_workers():
+    period = 0.005
+    params = {'Kp': 10.0, 'Ki': 1.0, 'Kd': 1.0, 'DT': period}
+
+    async def session():
+        server = control_server.ControlServer(executor='process', workers=2)
+        client = control_server.SimulatedPlantClient()
+        try:
+            await client.connect(await server.start())
+            for i in range(2):
+                await client.add_loop(f'pid-{i}', MassSpringDamper(solver='zoh'), 'pid', params, period, 1.0, 0,
+                                      offload=True)
+            await asyncio.sleep(0.5)
+            return [(await client.remove_loop(f'pid-{i}'))['states'] for i in range(2)]
+        finally:
+            await client.close()
+            await server.close()
+
+    # The integral and previous error live in one worker, so the loop matches the offline one
+    for states in asyncio.run(session()):
+        steps = len(states) - 1
+        assert steps > 10
+        expected = simulate_closed_loop(MassSpringDamper(solver='zoh'), PIDController(**params), period, steps,
+                                        reference=1.0, measure=lambda x: x[0], record_timing=False)
+        np.testing.assert_allclose(states, expected['x'], atol=1e-12)
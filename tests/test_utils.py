@@ -0,0 +1,411 @@
+# Tests for utility functions
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from controllers.mpc import MPCController
+from controllers.pid import PIDController
+from plants.dc_motor import DCMotor
+from plants.inverted_pendulum import InvertedPendulum
+from plants.mass_spring_damper import MassSpringDamper
+from controllers.lqr import LQRController
+from plants.stateSpaceSim import StateSpaceSim
+from simulations.closed_loop import simulate_closed_loop
+from utils import discretization, filters, frequency, ingest, instrumentation, integrators, linearization, metrics, sysid
+from utils.recorder import TrajectoryReader, TrajectoryRecorder
+from utils.dataAnalysis import movingAverage
+
+
+def _reference_moving_average(data, window):
+    return [np.mean(data[max(0, i - window + 1):i + 1]) for i in range(len(data))]
+
+
+def test_moving_average_matches_sliding_window():
+    data = np.random.default_rng(0).normal(size=200)
+    for window in (1, 3, 16):
+        np.testing.assert_allclose(filters.moving_average(data, window),
+                                   _reference_moving_average(data, window), atol=1e-12)
+    assert isinstance(movingAverage(list(data), 3), list)
+    np.testing.assert_allclose(movingAverage(list(data), 3), _reference_moving_average(data, 3), atol=1e-12)
+
+
+@pytest.mark.parametrize('make_filter', [
+    lambda: filters.MovingAverageFilter(7),
+    lambda: filters.EMAFilter(0.2),
+    lambda: filters.ButterworthFilter(5.0, 100.0, order=4),
+    lambda: filters.MedianFilter(4),
+])
+def test_streaming_filters_are_chunk_invariant(make_filter):
+    data = np.random.default_rng(1).normal(size=(500, 3))
+    whole = make_filter().process(data)
+    streaming = make_filter()
+    chunks = np.array_split(data, [1, 2, 40, 41, 300, 499])
+    np.testing.assert_array_equal(np.concatenate([streaming.process(c) for c in chunks]), whole)
+
+
+def test_ema_and_median_definitions():
+    data = np.array([1.0, 3.0, 2.0, 10.0, 4.0])
+    np.testing.assert_allclose(filters.ema(data, 0.5), [1.0, 2.0, 2.0, 6.0, 5.0])
+    np.testing.assert_allclose(filters.median(data, 3), [1.0, 1.0, 2.0, 3.0, 4.0])
+
+
+def test_butterworth_zero_phase_preserves_low_frequencies():
+    t = np.arange(0, 10, 0.01)
+    slow = np.sin(2 * np.pi * 0.5 * t)
+    noisy = slow + 0.5 * np.sin(2 * np.pi * 30 * t)
+    smoothed = filters.butterworth(noisy, cutoff=5.0, fs=100.0, zero_phase=True)
+    assert np.max(np.abs(smoothed - slow)[100:-100]) < 0.02
+
+
+def _write_log(path, n=1000):
+    t = np.arange(n) * 0.1
+    voltage = 3.7 - 0.001 * np.arange(n)
+    current = 2.0 + 0.1 * np.sin(t)
+    temperature = 25.0 + 0.01 * np.arange(n)
+    pd.DataFrame({'time': t, 'voltage': voltage, 'current': current, 'temperature': temperature}).to_csv(path, index=False)
+    return t, voltage, current
+
+
+def test_csv_to_npy_round_trip(tmp_path):
+    csv_path = tmp_path / 'log.csv'
+    t, voltage, current = _write_log(csv_path)
+    paths = ingest.csv_to_npy(str(csv_path), str(tmp_path / 'cols'), chunksize=128)
+    assert set(paths) == {'time', 'voltage', 'current', 'temperature'}
+    columns = ingest.load_columns(str(tmp_path / 'cols'))
+    assert isinstance(columns['voltage'], np.memmap)
+    np.testing.assert_allclose(columns['time'], t)
+    np.testing.assert_allclose(columns['current'], current)
+
+
+def test_analyze_log_matches_full_frame_analysis(tmp_path):
+    csv_path = tmp_path / 'log.csv'
+    t, voltage, current = _write_log(csv_path)
+    expected_energy = np.trapezoid(voltage * current, t)
+
+    from_csv = ingest.analyze_log(str(csv_path), chunksize=77,
+                                  filters={'current': filters.MovingAverageFilter(3)}, out_dir=str(tmp_path / 'out'))
+    np.testing.assert_allclose(from_csv['energy'], expected_energy, rtol=1e-12)
+    np.testing.assert_allclose(from_csv['stats']['voltage']['mean'], voltage.mean())
+    np.testing.assert_allclose(from_csv['stats']['current']['std'], current.std())
+    assert from_csv['stats']['time']['max'] == t[-1]
+    np.testing.assert_allclose(np.load(from_csv['filtered']['current']), filters.moving_average(current, 3), rtol=1e-12)
+
+    ingest.csv_to_npy(str(csv_path), str(tmp_path / 'cols'))
+    from_npy = ingest.analyze_log(str(tmp_path / 'cols'), chunksize=300)
+    np.testing.assert_allclose(from_npy['energy'], expected_energy, rtol=1e-12)
+
+
+def test_discretize_is_memoized_and_matches_cont2discrete():
+    from scipy.signal import cont2discrete
+
+    A = np.array([[0.0, 1.0], [-2.0, -0.3]])
+    B = np.array([[0.0], [0.5]])
+    discretization.clear_discretization_cache()
+    for method, alias in (('zoh', 'expm'), ('tustin', 'bilinear'), ('euler', 'forward_diff')):
+        Ad, Bd = discretization.discretize(A, B, 0.05, method)
+        assert discretization.discretize(A.copy(), B.copy(), 0.05, alias)[0] is Ad
+        reference = cont2discrete((A, B, np.eye(2), np.zeros((2, 1))), 0.05, method=method)
+        np.testing.assert_allclose(Ad, reference[0], atol=1e-12)
+        np.testing.assert_allclose(Bd, reference[1], atol=1e-12)
+        assert not Ad.flags.writeable
+    assert len(discretization._DISCRETIZATION_CACHE) == 3
+    with pytest.raises(ValueError):
+        discretization.discretize(A, B, 0.05, 'rk4')
+
+
+def test_linearize_pendulum_over_grid():
+    params = {'length': 0.8, 'mass': 1.5, 'damping_coefficient': 0.2}
+    angles = np.linspace(-np.pi, np.pi, 201)
+    x = linearization.operating_grid(angles, [0.3])[:, 0]
+    A, B = linearization.linearize(InvertedPendulum.dynamics, x, np.array([0.5]), params)
+    assert A.shape == (201, 2, 2) and B.shape == (201, 2, 1)
+    np.testing.assert_allclose(A[:, 1, 0], -9.81 * np.cos(angles) / 0.8, atol=1e-12)
+    np.testing.assert_allclose(A[:, 1, 1], -0.2 / (1.5 * 0.8 ** 2))
+    np.testing.assert_allclose(B[:, 1, 0], 1 / (1.5 * 0.8 ** 2))
+
+    central = linearization.jacobians(InvertedPendulum.dynamics, x, np.array([0.5]), params, method='central')
+    np.testing.assert_allclose(central[0], A, atol=1e-8)
+    assert linearization.linearize(InvertedPendulum.dynamics, x.copy(), np.array([0.5]), params)[0] is A
+
+
+def test_linearize_plants_match_linear_models():
+    plant = MassSpringDamper(mass=2.0, spring_constant=3.0)
+    A, B = linearization.linearize_plant(plant, x=[0.4, -0.1], u=1.0)
+    np.testing.assert_allclose(A, plant._continuous_dynamics_matrices()[0])
+    np.testing.assert_allclose(B, plant._continuous_dynamics_matrices()[1])
+    Ad, Bd = linearization.linearize_plant(plant, x=[0.4, -0.1], u=1.0, dt=0.05)
+    np.testing.assert_allclose(Ad, plant._discretize(0.05, 'zoh')[0], atol=1e-12)
+
+    # Per-point parameters broadcast against the grid
+    motor = DCMotor(1.0, 0.5, 0.01, 0.01, 0.01, 0.1)
+    params = dict(motor.get_params(), resistance=np.array([1.0, 2.0]))
+    A, _ = linearization.jacobians(DCMotor.dynamics, np.zeros((2, 2)), np.zeros((2, 1)), params)
+    np.testing.assert_allclose(A[:, 0, 0], [-2.0, -4.0])
+
+
+def test_integrators_accuracy_and_dense_output():
+    from scipy.integrate import solve_ivp
+
+    params = {'length': 1.0, 'mass': 1.0, 'damping_coefficient': 0.3}
+    x0 = np.array([[1.0, 0.0], [2.5, -1.0], [0.1, 3.0]])
+    u = np.array([0.2])
+    reference = np.array([solve_ivp(lambda t, x: InvertedPendulum.dynamics(x, u, params), (0, 2), x, rtol=1e-12, atol=1e-12,
+                                    dense_output=True).sol for x in x0])
+
+    x = x0
+    for _ in range(200):
+        x = integrators.rk4_step(InvertedPendulum.dynamics, x, u, params, 0.01)
+    np.testing.assert_allclose(x, [sol(2.0) for sol in reference], atol=1e-6)
+
+    solution = integrators.solve_rk45(InvertedPendulum.dynamics, x0, u, params, (0, 2), rtol=1e-9, atol=1e-12)
+    assert solution.t[-1] == 2.0 and solution.x.shape == (len(solution.t), 3, 2)
+    times = np.linspace(0, 2, 37)
+    np.testing.assert_allclose(solution(times), np.moveaxis([sol(times) for sol in reference], [0, 1], [1, 2]), atol=1e-6)
+    np.testing.assert_allclose(solution(0.5), [sol(0.5) for sol in reference], atol=1e-6)
+
+
+def test_semi_implicit_euler_is_stable_on_stiff_motor():
+    params = DCMotor(1.0, 1e-4, 0.01, 0.01, 0.01, 0.1).get_params()
+    x = np.zeros((2, 2))
+    explicit, implicit = x, x
+    for _ in range(100):
+        explicit = integrators.euler_step(DCMotor.dynamics, explicit, np.ones((2, 1)), params, 1e-3)
+        implicit = integrators.semi_implicit_euler_step(DCMotor.dynamics, implicit, np.ones((2, 1)), params, 1e-3)
+    assert not np.all(np.isfinite(explicit)) or np.abs(explicit).max() > 1e6
+    # Current settles near V / R while the speed is still spinning up
+    np.testing.assert_allclose(implicit[:, 0], 1.0, rtol=1e-2)
+
+    with pytest.raises(ValueError):
+        integrators.get_integrator('rk8')
+
+
+def test_plant_integrator_option_matches_batch_step():
+    pendulum = InvertedPendulum(1.0, 1.0, 0.1, integrator='rk4')
+    pendulum.set_state([0.5, 0.0])
+    step = InvertedPendulum.make_batch_step(pendulum.get_params(), 0.01, integrator='rk4')
+    batch = np.array([[0.5, 0.0]])
+    for k in range(50):
+        pendulum.update(0.1 * k, 0.01)
+        batch = step(batch, np.array([0.1 * k]))
+    np.testing.assert_array_equal(pendulum.get_state(), batch[0])
+
+
+def test_ring_buffer_keeps_latest_records_in_order():
+    buffer = instrumentation.RingBuffer(4)
+    for k in range(10):
+        buffer.append((k, 0.0, -1, -1, False, False))
+    assert len(buffer) == 4 and buffer.count == 10
+    np.testing.assert_array_equal(buffer.to_array()['start'], [6, 7, 8, 9])
+
+
+def test_loop_monitor_records_solver_stats_and_detaches():
+    mpc, pid = MPCController(), PIDController(Kp=1.0)
+    monitor = instrumentation.LoopMonitor(capacity=8)
+    monitor.instrument(mpc)
+    monitor.instrument(pid, deadline=0.0)
+    for k in range(10):
+        mpc.update(np.array([0.1 * k, 0.0]))  # update -> compute_control is one call
+        pid.compute_control(0.5, 1.0)
+    mpc.compute_control(np.array([6.0, 0.0]))  # infeasible, follows the previous plan
+
+    summary = monitor.summary()
+    assert summary['MPCController']['calls'] == 11 and summary['MPCController']['fallbacks'] == 1
+    assert summary['MPCController']['deadline'] == mpc.dt
+    assert summary['MPCController']['mean_iterations'] > 0
+    assert summary['PIDController']['deadline_misses'] == 10
+    arrays = monitor.to_arrays('MPCController')
+    assert len(arrays['wall_time']) == 8 and arrays['status'][-1] != 'solved' and arrays['fallback'][-1]
+    assert set(arrays['status'][:-1]) == {'solved'} and set(monitor.to_arrays('PIDController')['status']) == {''}
+    assert monitor.histogram('PIDController', bins=4)[0].sum() == 8
+
+    monitor.detach()
+    assert 'update' not in vars(mpc) and 'compute_control' not in vars(pid)
+    mpc.update(np.zeros(2))
+    assert monitor.summary()['MPCController']['calls'] == 11
+
+
+def test_step_metrics_of_second_order_response():
+    t = np.linspace(0.0, 20.0, 20001)
+    zeta, wn = 0.3, 2.0
+    wd = wn * np.sqrt(1 - zeta ** 2)
+    y = 1 - np.exp(-zeta * wn * t) * (np.cos(wd * t) + zeta / np.sqrt(1 - zeta ** 2) * np.sin(wd * t))
+    result = metrics.step_metrics(t, np.column_stack([y, 2 * y]), np.array([1.0, 2.0]))
+    np.testing.assert_allclose(result['overshoot'], np.exp(-np.pi * zeta / np.sqrt(1 - zeta ** 2)), rtol=1e-4)
+    # Last time the envelope-bounded response leaves the 2% band is close to 4 / (zeta wn)
+    assert 4.5 < result['settling_time'][0] < 7.5
+    np.testing.assert_allclose(result['settling_time'][1], result['settling_time'][0])
+    np.testing.assert_allclose(result['iae'][1], 2 * result['iae'][0])
+    np.testing.assert_allclose(metrics.iae(t, np.ones_like(t)), 20.0)
+    assert metrics.settling_time(t, t / 20.0, 2.0) == np.inf
+    assert metrics.overshoot(np.ones(5), 1.0) == 0.0
+
+
+def _arx_data(T=20000, c=0.0, seed=0):
+    rng = np.random.default_rng(seed)
+    u = rng.normal(size=T)
+    e = rng.normal(0, 0.1, T)
+    y = np.zeros(T)
+    for k in range(2, T):
+        y[k] = 1.5 * y[k - 1] - 0.7 * y[k - 2] + u[k - 1] + 0.5 * u[k - 2] + e[k] + c * e[k - 1]
+    return y, u
+
+
+def test_arx_fit_streams_chunks_and_realizes_state_space(tmp_path):
+    y, u = _arx_data()
+    model = sysid.fit_arx(y, u, na=2, nb=2)
+    np.testing.assert_allclose(model.a.ravel(), [1.5, -0.7], atol=5e-3)
+    np.testing.assert_allclose(model.b.ravel(), [1.0, 0.5], atol=5e-3)
+    np.testing.assert_allclose(model.noise_variance, [[0.01]], rtol=0.05)
+
+    accumulator = sysid.ARXAccumulator(na=2, nb=2)
+    for start in range(0, len(y), 777):
+        accumulator.update(y[start:start + 777], u[start:start + 777])
+    chunked = accumulator.solve()
+    np.testing.assert_allclose(chunked.a, model.a, atol=1e-12)
+    np.testing.assert_allclose(chunked.b, model.b, atol=1e-12)
+
+    pd.DataFrame({'y': y, 'u': u}).to_csv(tmp_path / 'log.csv', index=False)
+    logged = sysid.fit_arx_log(str(tmp_path / 'log.csv'), ['y'], ['u'], na=2, nb=2, chunksize=5000)
+    np.testing.assert_allclose(logged.a, model.a, atol=1e-9)
+
+    # The state-space realization reproduces the noise-free ARX recursion
+    y_free = np.zeros(50)
+    for k in range(1, 50):
+        y_free[k] = model.a[0, 0, 0] * y_free[k - 1] + model.b[0, 0, 0] * u[k - 1]
+        if k >= 2:
+            y_free[k] += model.a[1, 0, 0] * y_free[k - 2] + model.b[1, 0, 0] * u[k - 2]
+    np.testing.assert_allclose(model.simulate(u[:50])[:, 0], y_free, atol=1e-12)
+    direct = sysid.fit_arx(y, u, na=2, nb=3, nk=0)
+    assert abs(direct.b[0, 0, 0]) < 5e-3 and np.abs(direct.to_state_space().D) < 5e-3
+
+
+@pytest.mark.parametrize('chunk', [1, 2])
+def test_arx_accumulator_handles_chunks_shorter_than_the_lag(chunk):
+    y, u = _arx_data()
+    y, u = y[:2000], u[:2000]
+    expected = sysid.fit_arx(y, u, na=3, nb=2)
+    accumulator = sysid.ARXAccumulator(na=3, nb=2)
+    for start in range(0, len(y), chunk):
+        accumulator.update(y[start:start + chunk], u[start:start + chunk])
+    assert accumulator.count == len(y) - 3
+    model = accumulator.solve()
+    np.testing.assert_allclose(model.a, expected.a, atol=1e-9)
+    np.testing.assert_allclose(model.b, expected.b, atol=1e-9)
+
+
+def test_armax_recovers_noise_model():
+    y, u = _arx_data(c=0.6)
+    model = sysid.fit_armax(y, u, na=2, nb=2, nc=1)
+    np.testing.assert_allclose(model.a.ravel(), [1.5, -0.7], atol=5e-3)
+    np.testing.assert_allclose(model.c, [0.6], atol=0.03)
+
+
+def test_n4sid_identifies_mimo_model_for_simulation_and_lqr():
+    rng = np.random.default_rng(2)
+    A = np.array([[0.9, 0.2, 0.0], [-0.2, 0.9, 0.0], [0.0, 0.0, 0.5]])
+    true = sysid.StateSpaceModel(A, rng.normal(size=(3, 2)), rng.normal(size=(2, 3)), np.zeros((2, 2)), dt=0.1)
+    u = rng.normal(size=(5000, 2))
+    y = true.simulate(u) + rng.normal(0, 0.01, (5000, 2))
+    model = sysid.n4sid(y, u, horizon=6, dt=0.1)
+    assert model.A.shape == (3, 3)
+    # Noise-free data: the round-off singular values do not count as states
+    assert sysid.n4sid(true.simulate(u), u, horizon=6).A.shape == (3, 3)
+    np.testing.assert_allclose(np.sort_complex(np.linalg.eigvals(model.A)),
+                               np.sort_complex(np.linalg.eigvals(A)), atol=2e-3)
+    u_test = rng.normal(size=(200, 2))
+    error = model.simulate(u_test) - true.simulate(u_test)
+    assert np.sqrt(np.mean(error ** 2)) < 0.01 * np.std(true.simulate(u_test))
+
+    # StateSpaceSim with the continuous-time equivalent and a one-sample input shift
+    Ac, Bc, C, D = model.to_continuous()
+    sim = StateSpaceSim(Ac, Bc, C, D, np.zeros(3), np.vstack([np.zeros((1, 2)), u_test[:-1]]), model.dt)
+    np.testing.assert_allclose(sim.simulate('zoh')[1], model.simulate(u_test), atol=1e-9)
+    lqr = LQRController(model.A, model.B, model.C.T @ model.C, np.eye(2), dt=model.dt)
+    assert np.abs(np.linalg.eigvals(model.A - model.B @ lqr.K)).max() < 1
+
+
+def test_freqresp_matches_direct_solve_including_defective_systems():
+    rng = np.random.default_rng(3)
+    A = rng.normal(size=(5, 3, 3))
+    A[0] = [[-1.0, 1.0, 0.0], [0.0, -1.0, 1.0], [0.0, 0.0, -1.0]]  # Jordan block, uses the fallback
+    B, C, D = rng.normal(size=(5, 3, 2)), rng.normal(size=(5, 2, 3)), rng.normal(size=(5, 2, 2))
+    w = np.logspace(-1, 2, 50)
+    H = frequency.freqresp(A, B, C, D, w)
+    for i in range(5):
+        for f in (0, 25, 49):
+            direct = C[i] @ np.linalg.solve(1j * w[f] * np.eye(3) - A[i], B[i]) + D[i]
+            np.testing.assert_allclose(H[i, f], direct, rtol=1e-9, atol=1e-12)
+    H_d = frequency.freqresp(A[1], B[1], C[1], D[1], w, dt=0.01)
+    z = np.exp(1j * w[7] * 0.01)
+    np.testing.assert_allclose(H_d[7], C[1] @ np.linalg.solve(z * np.eye(3) - A[1], B[1]) + D[1], rtol=1e-9)
+
+
+def test_pid_mass_spring_margins_match_control_library():
+    control = pytest.importorskip('control')
+    w = np.logspace(-2, 3, 4000)
+    loops = frequency.pid_mass_spring_loop(np.array([5.0, 20.0]), 2.0, np.array([[1.0], [0.5]]))
+    result = frequency.loop_analysis(*loops, w)
+    assert result['phase_margin'].shape == (2, 2) and result['poles'].shape == (2, 2, 4)
+    for index in np.ndindex(2, 2):
+        system = control.ss(*(M[index] for M in loops))
+        _, pm, _, wgc = control.margin(system)
+        np.testing.assert_allclose(result['phase_margin'][index], pm, rtol=1e-4)
+        np.testing.assert_allclose(result['gain_crossover'][index], wgc, rtol=1e-4)
+        np.testing.assert_allclose(result['bandwidth'][index], control.bandwidth(control.feedback(system, 1)), rtol=1e-3)
+    assert result['stable'].all() and np.isinf(result['gain_margin']).all()
+
+
+def test_discrete_gain_margin_predicts_pid_closed_loop_stability():
+    dt = 0.01
+    w = np.logspace(-2, np.log10(np.pi / dt), 2000)
+    gain_margin = frequency.loop_analysis(*frequency.pid_mass_spring_loop(10.0, 2.0, 20.0, dt=dt), w, dt=dt)['gain_margin']
+    for factor, stable in ((0.9, True), (1.1, False)):
+        gains = factor * gain_margin * np.array([10.0, 2.0, 20.0])
+        analysis = frequency.loop_analysis(*frequency.pid_mass_spring_loop(*gains, dt=dt), w, dt=dt)
+        assert analysis['stable'] == stable
+        pid = PIDController(*gains, DT=dt, INT_LIMITS=[-1e9, 1e9])
+        result = simulate_closed_loop(MassSpringDamper(solver='zoh'), pid, dt, 3000, reference=1.0,
+                                      measure=lambda x: x[0], record_timing=False)
+        assert (np.abs(result['x'][-100:, 0] - 1.0).max() < 1e-3) == stable
+
+
+@pytest.mark.parametrize('compress', [True, False])
+def test_trajectory_recorder_round_trip_with_decimation(tmp_path, compress):
+    rng = np.random.default_rng(0)
+    x, u = rng.normal(size=(1000, 3)), rng.normal(size=(1000, 1))
+    with TrajectoryRecorder(tmp_path / 'run', chunk_size=64, decimation=3, compress=compress) as recorder:
+        for k in range(10):
+            recorder.append(x=x[k], u=u[k])
+        recorder.extend(x=x[10:], u=u[10:])
+
+    reader = TrajectoryReader(tmp_path / 'run')
+    assert reader['x'].shape == (334, 3) and len(reader['u']) == 334
+    np.testing.assert_array_equal(np.asarray(reader['x']), x[::3])
+    np.testing.assert_array_equal(reader['x'][20:300:7], x[::3][20:300:7])
+    np.testing.assert_array_equal(reader['x'][-1], x[999])
+    np.testing.assert_array_equal(reader['x'][5:30, 1], x[::3][5:30, 1])
+    assert reader['x'][1, 2] == x[3, 2] and reader['x'][-1, -1] == x[999, 2]
+    np.testing.assert_array_equal(reader['x'][100, 1:], x[300, 1:])
+    np.testing.assert_array_equal(reader['u'][::-2], u[::3][::-2])
+    # Statistics cover every sample, not only the stored ones
+    stats = reader.stats['x']
+    assert stats['count'] == 1000
+    np.testing.assert_allclose(stats['mean'], x.mean(axis=0))
+    np.testing.assert_allclose(stats['std'], x.std(axis=0))
+    np.testing.assert_array_equal(stats['max'], x.max(axis=0))
+
+
+def test_trajectory_recorder_stats_only_and_in_memory():
+    y = np.arange(100.0)
+    recorder = TrajectoryRecorder(chunk_size=16, stats_only=True)
+    recorder.extend(y=y)
+    recorder.close()
+    assert recorder.summary()['y']['count'] == 100 and recorder.summary()['y']['mean'] == y.mean()
+    assert recorder.to_arrays()['y'].shape == (0,)
+
+    recorder = TrajectoryRecorder(chunk_size=16, decimation=5)
+    recorder.extend(y=y)
+    np.testing.assert_array_equal(recorder.to_arrays()['y'], y[::5])
+    with pytest.raises(ValueError):
+        recorder.append(z=1.0)
@@ -1,10 +1,11 @@
 import os
-import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
+from utils.filters import moving_average
 
 def movingAverage(data, windowSize):
     """Compute a moving average with a sliding window.
+
+    Thin wrapper around utils.filters.moving_average, kept for its list output.
     
     Args:
         data (list or np.ndarray): Input data sequence.
@@ -13,19 +14,12 @@ def movingAverage(data, windowSize):
     Returns:
         list: Smoothed data sequence.
     """
-    buffer = [0] * windowSize
-    filtData = []
-    runningSum = 0
-    for i in range(len(data)):
-        buffer_ind = i % windowSize
-        runningSum -= buffer[buffer_ind]  # Remove oldest value
-        buffer[buffer_ind] = data[i]      # Add new value
-        runningSum += data[i]
-        window = min(i + 1, windowSize)   # Adjust for initial steps
-        filtData.append(runningSum / window if window > 0 else 0)
-    return filtData
+    return moving_average(np.asarray(data, dtype=float), windowSize).tolist()
 
 if __name__ == '__main__':
+    import matplotlib.pyplot as plt
+    import pandas as pd
+
     try:
         # Get the absolute path to the data file
         data_path = os.path.join('..', 'Data', 'sample.csv')
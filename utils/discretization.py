@@ -1,4 +1,96 @@
 # Functions for discretizing continuous-time systems
 
-def discretize_example():
-    pass  # Replace with actual discretization code
+import hashlib
+from collections import OrderedDict
+
+import numpy as np
+
+# LRU cache of discretized pairs, keyed by the bytes of (A, B), dt and method
+_DISCRETIZATION_CACHE = OrderedDict()
+DISCRETIZATION_CACHE_SIZE = 512
+
+_METHOD_ALIASES = {'expm': 'zoh', 'forward_diff': 'euler', 'bilinear': 'tustin'}
+
+
+def discretize(A, B, dt, method='zoh'):
+    """Memoized discretization of a continuous-time pair (A, B).
+
+    Repeated calls with the same matrices, time step and method return the
+    cached result without recomputing the matrix exponential or solve. The
+    returned arrays are read-only because they are shared between callers.
+
+    Args:
+        A (np.ndarray): State matrix (n x n)
+        B (np.ndarray): Input matrix (n x m)
+        dt (float): Sampling time
+        method (str): 'zoh' (matrix exponential, alias 'expm'), 'euler'
+            (alias 'forward_diff'), 'backward_diff' or 'tustin' (alias 'bilinear')
+
+    Returns:
+        tuple: (Ad, Bd)
+    """
+    method = _METHOD_ALIASES.get(method, method)
+    A = np.ascontiguousarray(A, dtype=float)
+    B = np.ascontiguousarray(B, dtype=float)
+    digest = hashlib.sha1(A.tobytes())
+    digest.update(B.tobytes())
+    key = (A.shape, B.shape, float(dt), method, digest.hexdigest())
+
+    cached = _DISCRETIZATION_CACHE.get(key)
+    if cached is not None:
+        _DISCRETIZATION_CACHE.move_to_end(key)
+        return cached
+
+    Ad, Bd = discretize_batch(A, B, dt, method)
+    Ad.flags.writeable = False
+    Bd.flags.writeable = False
+    _DISCRETIZATION_CACHE[key] = (Ad, Bd)
+    if len(_DISCRETIZATION_CACHE) > DISCRETIZATION_CACHE_SIZE:
+        _DISCRETIZATION_CACHE.popitem(last=False)
+    return Ad, Bd
+
+
+def clear_discretization_cache():
+    _DISCRETIZATION_CACHE.clear()
+
+
+def discretize_batch(A, B, dt, method='zoh'):
+    """Discretize a stack of continuous-time (A, B) pairs.
+
+    Args:
+        A (np.ndarray): State matrices (..., n, n)
+        B (np.ndarray): Input matrices (..., n, m)
+        dt (float): Sampling time
+        method (str): 'zoh', 'euler', 'backward_diff' or 'tustin', or one
+            of the aliases accepted by discretize
+
+    Returns:
+        tuple: (Ad, Bd) with the same leading dimensions as A and B.
+    """
+    method = _METHOD_ALIASES.get(method, method)
+    A = np.asarray(A, dtype=float)
+    B = np.asarray(B, dtype=float)
+    n = A.shape[-1]
+    m = B.shape[-1]
+    lead = np.broadcast_shapes(A.shape[:-2], B.shape[:-2])
+    A = np.broadcast_to(A, lead + (n, n))
+    B = np.broadcast_to(B, lead + (n, m))
+    I = np.eye(n)
+
+    if method == 'zoh':
+        from scipy.linalg import expm  # imported on first use to keep plant imports light
+
+        M = np.zeros(lead + (n + m, n + m))
+        M[..., :n, :n] = A
+        M[..., :n, n:] = B
+        E = expm(M * dt)
+        return E[..., :n, :n].copy(), E[..., :n, n:].copy()
+    if method == 'euler':
+        return I + dt * A, dt * B
+    if method in ('backward_diff', 'tustin'):
+        alpha = 1.0 if method == 'backward_diff' else 0.5
+        ima = I - alpha * dt * A
+        Ad = np.linalg.solve(ima, I + (1.0 - alpha) * dt * A)
+        Bd = np.linalg.solve(ima, dt * B)
+        return Ad, Bd
+    raise ValueError(f"Unknown discretization method '{method}'")
@@ -0,0 +1,172 @@
+# Batch and streaming signal filters
+#
+# Every filter exists as a stateful streaming class with process(chunk) and
+# reset(). The batch functions run the same class over the whole array as a
+# single chunk, so filtering a signal in one call or chunk by chunk gives
+# bit-identical results. Data is filtered along axis 0, so (n,) signals and
+# (n, channels) arrays are both accepted. scipy.signal and scipy.ndimage are
+# imported by the filters that use them, so importing this module is cheap.
+
+import numpy as np
+
+
+class MovingAverageFilter:
+    """Causal moving average over the last `window` samples.
+
+    The first window-1 outputs average the samples seen so far, as
+    utils.dataAnalysis.movingAverage does. Each output is a difference of a
+    running cumulative sum, so the cost is O(n) independent of the window.
+    """
+
+    def __init__(self, window):
+        if window < 1:
+            raise ValueError(f"window must be at least 1, got {window}")
+        self.window = int(window)
+        self.reset()
+
+    def reset(self):
+        self._tail = None  # cumulative sums of the last `window` samples (zero before the start)
+        self._count = 0
+
+    def process(self, chunk):
+        chunk = np.asarray(chunk, dtype=float)
+        n = chunk.shape[0]
+        if n == 0:
+            return chunk.copy()
+        if self._tail is None:
+            self._tail = np.zeros((self.window,) + chunk.shape[1:])
+
+        # Prepending the carried total keeps the accumulation order identical
+        # to one cumsum over the whole signal
+        csum = np.cumsum(np.concatenate([self._tail[-1:], chunk]), axis=0)[1:]
+        sums = np.concatenate([self._tail, csum])
+        counts = np.minimum(np.arange(self._count + 1, self._count + n + 1), self.window)
+        out = (csum - sums[:n]) / counts.reshape((-1,) + (1,) * (chunk.ndim - 1))
+
+        self._tail = sums[-self.window:]
+        self._count += n
+        return out
+
+
+class EMAFilter:
+    """Exponential moving average y[k] = alpha * x[k] + (1 - alpha) * y[k-1].
+
+    The filter starts at the first sample (y[0] = x[0]) unless `initial` is given.
+    """
+
+    def __init__(self, alpha, initial=None):
+        if not 0 < alpha <= 1:
+            raise ValueError(f"alpha must be in (0, 1], got {alpha}")
+        self.alpha = alpha
+        self.initial = initial
+        self.reset()
+
+    def reset(self):
+        self._zi = None
+
+    def process(self, chunk):
+        chunk = np.asarray(chunk, dtype=float)
+        if chunk.shape[0] == 0:
+            return chunk.copy()
+        if self._zi is None:
+            start = chunk[0] if self.initial is None else np.broadcast_to(self.initial, chunk.shape[1:])
+            self._zi = ((1 - self.alpha) * np.asarray(start, dtype=float))[None]
+        from scipy.signal import lfilter
+
+        out, self._zi = lfilter([self.alpha], [1.0, self.alpha - 1.0], chunk, axis=0, zi=self._zi)
+        return out
+
+
+class SOSFilter:
+    """IIR filter in second-order sections with state carried across chunks.
+
+    With initial='steady' the state starts at the steady state for the first
+    sample (no start-up transient); with 'zero' it starts at rest.
+    """
+
+    def __init__(self, sos, initial='steady'):
+        if initial not in ('steady', 'zero'):
+            raise ValueError(f"initial must be 'steady' or 'zero', got '{initial}'")
+        self.sos = np.asarray(sos, dtype=float)
+        self.initial = initial
+        self.reset()
+
+    def reset(self):
+        self._zi = None
+
+    def process(self, chunk):
+        chunk = np.asarray(chunk, dtype=float)
+        if chunk.shape[0] == 0:
+            return chunk.copy()
+        from scipy.signal import sosfilt, sosfilt_zi
+
+        if self._zi is None:
+            zi = sosfilt_zi(self.sos).reshape((self.sos.shape[0], 2) + (1,) * (chunk.ndim - 1))
+            scale = chunk[0] if self.initial == 'steady' else np.zeros(chunk.shape[1:])
+            self._zi = zi * scale
+        out, self._zi = sosfilt(self.sos, chunk, axis=0, zi=self._zi)
+        return out
+
+
+class ButterworthFilter(SOSFilter):
+    """Butterworth filter designed in second-order sections."""
+
+    def __init__(self, cutoff, fs, order=4, btype='low', initial='steady'):
+        from scipy.signal import butter
+
+        super().__init__(butter(order, cutoff, btype=btype, fs=fs, output='sos'), initial)
+
+
+class MedianFilter:
+    """Causal median over the last `window` samples.
+
+    The signal is padded at the start with its first sample. For even
+    windows the upper of the two middle values is returned.
+    """
+
+    def __init__(self, window):
+        if window < 1:
+            raise ValueError(f"window must be at least 1, got {window}")
+        self.window = int(window)
+        self.reset()
+
+    def reset(self):
+        self._history = None
+
+    def process(self, chunk):
+        chunk = np.asarray(chunk, dtype=float)
+        if chunk.shape[0] == 0:
+            return chunk.copy()
+        w = self.window
+        if self._history is None:
+            self._history = np.repeat(chunk[:1], w - 1, axis=0)
+        buffer = np.concatenate([self._history, chunk])
+        size = (w,) + (1,) * (chunk.ndim - 1)
+        origin = ((w - 1) // 2,) + (0,) * (chunk.ndim - 1)
+        from scipy import ndimage
+
+        out = ndimage.median_filter(buffer, size=size, origin=origin, mode='nearest')[w - 1:]
+        self._history = buffer[len(buffer) - (w - 1):]
+        return out
+
+
+def moving_average(data, window):
+    return MovingAverageFilter(window).process(data)
+
+
+def ema(data, alpha, initial=None):
+    return EMAFilter(alpha, initial).process(data)
+
+
+def butterworth(data, cutoff, fs, order=4, btype='low', zero_phase=False):
+    """Butterworth filter, or its forward-backward (zero-phase) version for offline use."""
+    if zero_phase:
+        from scipy.signal import butter, sosfiltfilt
+
+        sos = butter(order, cutoff, btype=btype, fs=fs, output='sos')
+        return sosfiltfilt(sos, np.asarray(data, dtype=float), axis=0)
+    return ButterworthFilter(cutoff, fs, order, btype).process(data)
+
+
+def median(data, window):
+    return MedianFilter(window).process(data)
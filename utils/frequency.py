@@ -0,0 +1,251 @@
+# Batched frequency response and stability margins
+#
+# Systems are stacks of state-space matrices A (..., n, n), B (..., n, m),
+# C (..., p, n), D (..., p, m), continuous-time by default or discrete-time
+# with sampling time dt, in which case s = exp(j w dt). The frequency
+# response H(s) = C (sI - A)^-1 B + D is evaluated from the eigendecomposition
+# A = V diag(l) V^-1 as a sum of residue terms
+#     H(s) = sum_k (C V)[:, k] (V^-1 B)[k, :] / (s - l_k) + D,
+# so after one O(n^3) decomposition per system every frequency costs O(n p m)
+# instead of a linear solve. Systems whose eigenvectors are ill-conditioned
+# (repeated or nearly defective eigenvalues) fall back to a batched solve.
+
+import numpy as np
+
+from utils.discretization import discretize_batch
+
+# Eigenvector condition number above which a system uses the solve fallback
+EIG_COND_LIMIT = 1e8
+
+
+def _laplace_variable(w, dt):
+    w = np.asarray(w, dtype=float)
+    return 1j * w if dt is None else np.exp(1j * w * dt)
+
+
+def freqresp(A, B, C, D, w, dt=None):
+    """Frequency response of a stack of state-space systems.
+
+    Args:
+        A, B, C, D (np.ndarray): Systems with broadcastable leading dimensions.
+        w (np.ndarray): Frequencies in rad/s (F,).
+        dt (float, optional): Sampling time of discrete-time systems.
+
+    Returns:
+        np.ndarray: H with shape (..., F, p, m).
+    """
+    A, B, C, D = (np.asarray(M, dtype=float) for M in (A, B, C, D))
+    lead = np.broadcast_shapes(A.shape[:-2], B.shape[:-2], C.shape[:-2], D.shape[:-2])
+    n, m, p = A.shape[-1], B.shape[-1], C.shape[-2]
+    A = np.broadcast_to(A, lead + (n, n)).reshape(-1, n, n)
+    B = np.broadcast_to(B, lead + (n, m)).reshape(-1, n, m)
+    C = np.broadcast_to(C, lead + (p, n)).reshape(-1, p, n)
+    D = np.broadcast_to(D, lead + (p, m)).reshape(-1, p, m)
+    s = _laplace_variable(w, dt)
+
+    eigenvalues, V = np.linalg.eig(A)
+    H = np.empty((len(A), len(s), p, m), dtype=complex)
+    well_conditioned = np.linalg.cond(V) < EIG_COND_LIMIT
+    good = np.flatnonzero(well_conditioned)
+    if good.size:
+        CV = C[good] @ V[good]
+        VinvB = np.linalg.solve(V[good], B[good].astype(complex))
+        resolvent = 1.0 / (s[None, :, None] - eigenvalues[good][:, None, :])  # (b, F, n)
+        residues = (CV.transpose(0, 2, 1)[..., :, None] * VinvB[..., None, :]).reshape(-1, n, p * m)
+        H[good] = (resolvent @ residues).reshape(-1, len(s), p, m) + D[good][:, None]
+    bad = np.flatnonzero(~well_conditioned)
+    if bad.size:
+        sI_A = s[None, :, None, None] * np.eye(n) - A[bad][:, None]
+        H[bad] = C[bad][:, None] @ np.linalg.solve(sI_A, B[bad][:, None].astype(complex)) + D[bad][:, None]
+    return H.reshape(lead + (len(s), p, m))
+
+
+def _crossings(value):
+    """Sign changes of value (B, F) between grid points: (system, interval) indices and fractions t."""
+    v0, v1 = value[:, :-1], value[:, 1:]
+    rows, cols = np.nonzero((v0 > 0) != (v1 > 0))
+    a, b = v0[rows, cols], v1[rows, cols]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        t = np.where(a == b, 0.0, a / (a - b))
+    return rows, cols, t
+
+
+def _worst(n_systems, rows, score, *values):
+    """Per system, the values at the crossing with the smallest |score| (inf score where there is none)."""
+    best = np.full(n_systems, np.inf)
+    np.minimum.at(best, rows, np.abs(score))
+    chosen = np.abs(score) == best[rows]
+    out = []
+    for value, fill in values:
+        result = np.full(n_systems, fill)
+        result[rows[chosen]] = value[chosen]
+        out.append(result)
+    return out
+
+
+def margins(L, w):
+    """Gain and phase margins of SISO loop frequency responses.
+
+    Crossings are located between grid points by linear interpolation
+    (in log|L| for the gain crossover, in Im L for the phase crossover), so
+    the accuracy follows the density of the frequency grid. With several
+    crossings the smallest margins are reported.
+
+    Args:
+        L (np.ndarray): Loop responses (..., F) on the increasing grid w.
+        w (np.ndarray): Frequencies (F,).
+
+    Returns:
+        dict: 'gain_margin' (absolute, inf without phase crossover),
+        'phase_margin' (degrees, inf without gain crossover),
+        'gain_crossover' and 'phase_crossover' frequencies (NaN without).
+    """
+    L = np.asarray(L, dtype=complex)
+    lead = L.shape[:-1]
+    L = L.reshape(-1, L.shape[-1])
+    log_w = np.log(np.asarray(w, dtype=float))
+
+    def at(rows, cols, t, values):
+        if values.ndim == 1:
+            return values[cols] + t * (values[cols + 1] - values[cols])
+        return values[rows, cols] + t * (values[rows, cols + 1] - values[rows, cols])
+
+    # Gain crossover: |L| = 1
+    with np.errstate(divide='ignore'):
+        rows, cols, t = _crossings(np.log(np.abs(L)))
+    pm = np.degrees(np.angle(-at(rows, cols, t, L)))
+    phase_margin, gain_crossover = _worst(len(L), rows, pm, (pm, np.inf), (np.exp(at(rows, cols, t, log_w)), np.nan))
+
+    # Phase crossover: L crosses the negative real axis
+    rows, cols, t = _crossings(L.imag)
+    L_c = at(rows, cols, t, L)
+    negative = L_c.real < 0
+    rows, cols, t, L_c = rows[negative], cols[negative], t[negative], L_c[negative]
+    with np.errstate(divide='ignore'):
+        log_gm = -np.log(np.abs(L_c))
+    gain_margin, phase_crossover = _worst(len(L), rows, log_gm, (np.exp(log_gm), np.inf),
+                                          (np.exp(at(rows, cols, t, log_w)), np.nan))
+
+    result = {'gain_margin': gain_margin, 'phase_margin': phase_margin,
+              'gain_crossover': gain_crossover, 'phase_crossover': phase_crossover}
+    return {name: value.reshape(lead) for name, value in result.items()}
+
+
+def bandwidth(H, w, drop_db=-3.0):
+    """First frequency where |H| falls drop_db below its value at w[0] (NaN if it never does)."""
+    H = np.asarray(H)
+    lead = H.shape[:-1]
+    with np.errstate(divide='ignore'):
+        gain_db = 20 * np.log10(np.abs(H.reshape(-1, H.shape[-1])))
+    below = gain_db - gain_db[:, :1] < drop_db
+    first = np.argmax(below, axis=-1)
+    result = np.full(len(gain_db), np.nan)
+    found = np.flatnonzero(below.any(axis=-1) & (first > 0))
+    k = first[found]
+    # Interpolate in log frequency between the last sample above and the first below
+    a = gain_db[found, k - 1] - gain_db[found, 0] - drop_db
+    b = gain_db[found, k] - gain_db[found, 0] - drop_db
+    log_w = np.log(np.asarray(w, dtype=float))
+    result[found] = np.exp(log_w[k - 1] + a / (a - b) * (log_w[k] - log_w[k - 1]))
+    return result.reshape(lead)
+
+
+def closed_loop(A, B, C, D):
+    """State matrices of the unity negative feedback loop u = r - y around (A, B, C, D).
+
+    Returns:
+        tuple: (A_cl, B_cl, C_cl, D_cl) from r to y.
+    """
+    A, B, C, D = (np.asarray(M, dtype=float) for M in (A, B, C, D))
+    # u = (I + D)^-1 (r - C x)
+    F = np.linalg.inv(np.eye(D.shape[-1]) + D)
+    A_cl = A - B @ F @ C
+    B_cl = B @ F
+    C_cl = C - D @ F @ C
+    D_cl = D @ F
+    return A_cl, B_cl, C_cl, D_cl
+
+
+def pid_mass_spring_loop(Kp, Ki, Kd, mass=1.0, spring_constant=1.0, damping_coefficient=0.5,
+                         dt=None, tau=0.01):
+    """Open loop L = PID * plant from position error to position for a grid of designs.
+
+    All arguments broadcast against each other, so gain arrays of shape (G,)
+    and mass arrays of shape (M, 1) give a (M, G) stack of loops.
+
+    Continuous-time (dt None): the PID is Kp + Ki/s + Kd s / (tau s + 1).
+    Discrete-time: the plant is discretized by zero-order hold and the PID is
+    the one of controllers.pid.PIDController with DT = dt (integral including
+    the current error, backward-difference derivative), integral limits ignored.
+
+    Returns:
+        tuple: (A, B, C, D) with states (position, velocity, two controller states).
+    """
+    Kp, Ki, Kd, mass, k, b = np.broadcast_arrays(*(np.asarray(v, dtype=float) for v in
+                                                   (Kp, Ki, Kd, mass, spring_constant, damping_coefficient)))
+    lead = Kp.shape
+    zeros = np.zeros(lead)
+    Ap = np.stack([np.stack([zeros, zeros + 1.0], -1), np.stack([-k / mass, -b / mass], -1)], -2)
+    Bp = np.stack([zeros, 1.0 / mass], -1)[..., None]
+    if dt is None:
+        # States: integral of the error and the derivative filter state
+        Ac = np.broadcast_to(np.diag([0.0, -1.0 / tau]), lead + (2, 2))
+        Bc = np.broadcast_to(np.array([[1.0], [1.0 / tau]]), lead + (2, 1))
+        Cc = np.stack([Ki, -Kd / tau], -1)[..., None, :]
+        Dc = (Kp + Kd / tau)[..., None, None]
+    else:
+        Ap, Bp = discretize_batch(Ap, Bp, dt, 'zoh')
+        # States: integral up to the previous sample and the previous error
+        Ac = np.broadcast_to(np.diag([1.0, 0.0]), lead + (2, 2))
+        Bc = np.broadcast_to(np.array([[dt], [1.0]]), lead + (2, 1))
+        Cc = np.stack([Ki, -Kd / dt], -1)[..., None, :]
+        Dc = (Kp + Ki * dt + Kd / dt)[..., None, None]
+
+    # Series connection: plant input u = Cc xc + Dc e, output y = position
+    A = np.zeros(lead + (4, 4))
+    A[..., :2, :2] = Ap
+    A[..., :2, 2:] = Bp @ Cc
+    A[..., 2:, 2:] = Ac
+    B = np.concatenate([Bp @ Dc, Bc], axis=-2)
+    C = np.broadcast_to(np.array([[1.0, 0.0, 0.0, 0.0]]), lead + (1, 4))
+    D = np.zeros(lead + (1, 1))
+    return A, B, C, D
+
+
+def loop_analysis(A, B, C, D, w, dt=None, block_size=256):
+    """Margins, closed-loop bandwidth and poles of a stack of SISO loops.
+
+    The stack is processed in blocks of block_size systems so the memory for
+    the frequency responses stays bounded for large design grids.
+
+    Args:
+        A, B, C, D (np.ndarray): Open-loop systems (..., n, n) etc. with one input and output.
+        w (np.ndarray): Increasing frequency grid (F,) in rad/s.
+        dt (float, optional): Sampling time of discrete-time loops.
+        block_size (int): Systems per block.
+
+    Returns:
+        dict: Arrays over the leading dimensions: 'gain_margin',
+        'phase_margin', 'gain_crossover', 'phase_crossover', 'bandwidth'
+        (closed loop), 'poles' (..., n) of the closed loop and 'stable'.
+    """
+    A, B, C, D = (np.asarray(M, dtype=float) for M in (A, B, C, D))
+    lead = np.broadcast_shapes(A.shape[:-2], B.shape[:-2], C.shape[:-2], D.shape[:-2])
+    n = A.shape[-1]
+    A, B, C, D = (np.broadcast_to(M, lead + M.shape[-2:]).reshape((-1,) + M.shape[-2:]) for M in (A, B, C, D))
+    w = np.asarray(w, dtype=float)
+
+    names = ['gain_margin', 'phase_margin', 'gain_crossover', 'phase_crossover', 'bandwidth']
+    result = {name: np.empty(len(A)) for name in names}
+    result['poles'] = np.empty((len(A), n), dtype=complex)
+    for start in range(0, len(A), block_size):
+        block = slice(start, start + block_size)
+        L = freqresp(A[block], B[block], C[block], D[block], w, dt)[..., 0, 0]
+        for name, value in margins(L, w).items():
+            result[name][block] = value
+        result['bandwidth'][block] = bandwidth(L / (1 + L), w)
+        result['poles'][block] = np.linalg.eigvals(closed_loop(A[block], B[block], C[block], D[block])[0])
+
+    magnitude = np.abs(result['poles']) if dt is not None else result['poles'].real
+    result['stable'] = (magnitude < 1.0 if dt is not None else magnitude < 0.0).all(axis=-1)
+    return {name: value.reshape(lead + value.shape[1:]) for name, value in result.items()}
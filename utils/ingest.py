@@ -0,0 +1,235 @@
+# Chunked ingestion of large test-data logs
+#
+# CSV logs are streamed in fixed-size chunks, optionally converted once into
+# one memory-mappable .npy file per column, and analysed incrementally so
+# memory use does not grow with the file size.
+
+import os
+import struct
+
+import numpy as np
+
+DEFAULT_CHUNKSIZE = 1_000_000
+
+
+def iter_csv_chunks(path, chunksize=DEFAULT_CHUNKSIZE, columns=None):
+    """Yield {column: np.ndarray} dicts of at most `chunksize` rows from a CSV file."""
+    import pandas as pd
+
+    reader = pd.read_csv(path, chunksize=chunksize, usecols=columns, dtype=np.float64)
+    with reader:
+        for frame in reader:
+            yield {name: frame[name].to_numpy() for name in frame.columns}
+
+
+def iter_npy_chunks(directory, chunksize=DEFAULT_CHUNKSIZE, columns=None):
+    """Yield {column: np.ndarray} chunks from a directory written by csv_to_npy."""
+    data = load_columns(directory, columns)
+    n_rows = len(next(iter(data.values()))) if data else 0
+    for start in range(0, n_rows, chunksize):
+        yield {name: np.asarray(values[start:start + chunksize]) for name, values in data.items()}
+
+
+def iter_chunks(source, chunksize=DEFAULT_CHUNKSIZE, columns=None):
+    """Chunks from a CSV file or from a directory of per-column .npy files."""
+    if os.path.isdir(source):
+        return iter_npy_chunks(source, chunksize, columns)
+    return iter_csv_chunks(source, chunksize, columns)
+
+
+class NpyColumnWriter:
+    """Append-only writer of a 1-D .npy file of unknown final length.
+
+    A fixed-size header is reserved up front and rewritten with the final
+    row count on close(), so the data is written exactly once.
+    """
+
+    HEADER_SIZE = 128
+
+    def __init__(self, path, dtype=np.float64):
+        self.path = path
+        self.dtype = np.dtype(dtype)
+        self.n_rows = 0
+        self._file = open(path, 'wb')
+        self._file.write(self._header(0))
+
+    def _header(self, n_rows):
+        header = {'descr': np.lib.format.dtype_to_descr(self.dtype), 'fortran_order': False, 'shape': (n_rows,)}
+        body_size = self.HEADER_SIZE - 10  # magic (6) + version (2) + header length (2)
+        body = repr(header).encode('latin1').ljust(body_size - 1) + b'\n'
+        return b'\x93NUMPY\x01\x00' + struct.pack('<H', body_size) + body
+
+    def append(self, values):
+        values = np.ascontiguousarray(values, dtype=self.dtype)
+        self._file.write(values.tobytes())
+        self.n_rows += len(values)
+
+    def close(self):
+        if self._file.closed:
+            return
+        self._file.seek(0)
+        self._file.write(self._header(self.n_rows))
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def csv_to_npy(path, out_dir, columns=None, chunksize=DEFAULT_CHUNKSIZE):
+    """Convert a CSV log into one .npy file per column, in constant memory.
+
+    Returns:
+        dict: Column name -> path of the written .npy file.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    writers = {}
+    try:
+        for chunk in iter_csv_chunks(path, chunksize, columns):
+            for name, values in chunk.items():
+                if name not in writers:
+                    writers[name] = NpyColumnWriter(os.path.join(out_dir, name + '.npy'))
+                writers[name].append(values)
+    finally:
+        for writer in writers.values():
+            writer.close()
+    return {name: writer.path for name, writer in writers.items()}
+
+
+def csv_to_parquet(path, out_path, columns=None, chunksize=DEFAULT_CHUNKSIZE):
+    """Convert a CSV log into a Parquet file chunk by chunk (requires pyarrow)."""
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise ImportError("csv_to_parquet requires pyarrow, install it with 'pip install pyarrow'") from e
+
+    writer = None
+    try:
+        for chunk in iter_csv_chunks(path, chunksize, columns):
+            table = pa.table(chunk)
+            if writer is None:
+                writer = pq.ParquetWriter(out_path, table.schema)
+            writer.write_table(table)
+    finally:
+        if writer is not None:
+            writer.close()
+    return out_path
+
+
+def load_columns(directory, columns=None, mmap_mode='r'):
+    """Memory-map the per-column .npy files written by csv_to_npy."""
+    if columns is None:
+        columns = sorted(f[:-4] for f in os.listdir(directory) if f.endswith('.npy'))
+    return {name: np.load(os.path.join(directory, name + '.npy'), mmap_mode=mmap_mode) for name in columns}
+
+
+class RunningStats:
+    """Count, mean, variance, min and max accumulated chunk by chunk.
+
+    Chunks are merged with the parallel form of Welford's algorithm, which
+    stays accurate for long logs where sum-of-squares formulas cancel.
+    With axis=0 the statistics are kept per component of (n, ...) chunks
+    (for example per state of a trajectory) instead of over all values.
+    """
+
+    def __init__(self, axis=None):
+        self.axis = axis
+        self.count = 0
+        self.mean = 0.0
+        self._m2 = 0.0
+        self.min = np.inf
+        self.max = -np.inf
+
+    def update(self, values):
+        values = np.asarray(values, dtype=float)
+        n = values.size if self.axis is None else values.shape[0]
+        if n == 0:
+            return
+        mean = values.mean(axis=self.axis)
+        m2 = np.sum((values - mean) ** 2, axis=self.axis)
+        total = self.count + n
+        delta = mean - self.mean
+        self.mean = self.mean + delta * n / total
+        self._m2 = self._m2 + m2 + delta ** 2 * self.count * n / total
+        self.count = total
+        self.min = np.minimum(self.min, values.min(axis=self.axis))
+        self.max = np.maximum(self.max, values.max(axis=self.axis))
+
+    @property
+    def var(self):
+        return self._m2 / self.count if self.count else np.nan
+
+    @property
+    def std(self):
+        return np.sqrt(self.var)
+
+    def summary(self):
+        return {'count': self.count, 'mean': self.mean, 'std': self.std, 'min': self.min, 'max': self.max}
+
+
+class TrapezoidIntegrator:
+    """Trapezoidal integral of y(t) over chunks, carrying the last sample across boundaries."""
+
+    def __init__(self):
+        self.total = 0.0
+        self._last = None
+
+    def update(self, t, y):
+        t = np.asarray(t, dtype=float)
+        y = np.asarray(y, dtype=float)
+        if t.size == 0:
+            return self.total
+        if self._last is not None:
+            t = np.concatenate([[self._last[0]], t])
+            y = np.concatenate([[self._last[1]], y])
+        self.total += np.trapezoid(y, t)
+        self._last = (t[-1], y[-1])
+        return self.total
+
+
+def analyze_log(source, chunksize=DEFAULT_CHUNKSIZE, filters=None, out_dir=None,
+                time_column='time', voltage_column='voltage', current_column='current'):
+    """Energy, per-column statistics and filtered channels of a log in one pass.
+
+    Args:
+        source (str): CSV file, or directory of .npy columns from csv_to_npy.
+        chunksize (int): Rows per chunk.
+        filters (dict, optional): Column name -> streaming filter from
+            utils.filters (anything with process(chunk)).
+        out_dir (str, optional): Directory for the filtered channels, written
+            as '<column>_filtered.npy'. Required when filters are given.
+
+    Returns:
+        dict: 'energy' (integral of voltage * current over time, in J when
+        the log is in V, A and s), 'stats' (RunningStats summary per column)
+        and 'filtered' (column -> path of the filtered .npy file).
+    """
+    filters = filters or {}
+    if filters and out_dir is None:
+        raise ValueError("out_dir is required to store filtered channels")
+    if out_dir:
+        os.makedirs(out_dir, exist_ok=True)
+
+    stats = {}
+    energy = TrapezoidIntegrator()
+    writers = {name: NpyColumnWriter(os.path.join(out_dir, name + '_filtered.npy')) for name in filters}
+    try:
+        for chunk in iter_chunks(source, chunksize):
+            for name, values in chunk.items():
+                stats.setdefault(name, RunningStats()).update(values)
+            if all(c in chunk for c in (time_column, voltage_column, current_column)):
+                energy.update(chunk[time_column], chunk[voltage_column] * chunk[current_column])
+            for name, filt in filters.items():
+                writers[name].append(filt.process(chunk[name]))
+    finally:
+        for writer in writers.values():
+            writer.close()
+
+    return {
+        'energy': energy.total,
+        'stats': {name: s.summary() for name, s in stats.items()},
+        'filtered': {name: writer.path for name, writer in writers.items()},
+    }
@@ -0,0 +1,228 @@
+# Real-time loop instrumentation
+#
+# LoopMonitor wraps methods of individual controller and plant instances
+# (update, compute_control, update_state) with timing hooks. Each call is
+# stored in a fixed-size ring buffer per channel together with its deadline
+# miss flag and, when the object exposes a `solve_info` dict after the call
+# (as MPCController does), the solver status, iteration count and fallback
+# flag. The hooks are instance attributes shadowing the class methods, so
+# detach() restores the original methods and a detached monitor costs nothing.
+
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+import numpy as np
+
+RECORD_DTYPE = np.dtype([
+    ('start', 'f8'),        # perf_counter() at the start of the call
+    ('wall_time', 'f8'),    # seconds
+    ('iterations', 'i4'),   # solver iterations, -1 when unknown
+    ('status', 'i2'),       # index into LoopMonitor.statuses, -1 when unknown
+    ('deadline_miss', '?'),
+    ('fallback', '?'),
+])
+
+
+class RingBuffer:
+    """Fixed-capacity record buffer that overwrites the oldest entries."""
+
+    def __init__(self, capacity, dtype=RECORD_DTYPE):
+        if capacity < 1:
+            raise ValueError(f"capacity must be at least 1, got {capacity}")
+        self.capacity = int(capacity)
+        self.data = np.zeros(self.capacity, dtype=dtype)
+        self.count = 0  # records appended in total, including overwritten ones
+
+    def append(self, record):
+        self.data[self.count % self.capacity] = record
+        self.count += 1
+
+    def __len__(self):
+        return min(self.count, self.capacity)
+
+    def to_array(self):
+        """Stored records, oldest first."""
+        if self.count <= self.capacity:
+            return self.data[:self.count].copy()
+        split = self.count % self.capacity
+        return np.concatenate([self.data[split:], self.data[:split]])
+
+    def clear(self):
+        self.count = 0
+
+
+class _Channel:
+    def __init__(self, capacity, deadline):
+        self.buffer = RingBuffer(capacity)
+        self.deadline = deadline
+        self.deadline_misses = 0
+        self.fallbacks = 0
+        self.active = False  # set while a hooked call runs, so nested hooked calls are not counted twice
+
+
+class LoopMonitor:
+    """Per-call timing, deadline-miss and solver statistics of a control loop.
+
+    Example:
+        monitor = LoopMonitor()
+        monitor.instrument(mpc, deadline=mpc.dt)
+        monitor.instrument(plant, name='plant')
+        ...  # run the loop
+        print(monitor.summary())
+        monitor.detach()
+    """
+
+    def __init__(self, capacity=10000):
+        self.capacity = capacity
+        self.channels = {}
+        self.statuses = []  # solver status strings, indexed by the 'status' field
+        self._hooks = []    # (obj, method name) pairs to remove on detach
+
+    def channel(self, name, deadline=None):
+        """Get or create a channel, updating its deadline when one is given."""
+        if name not in self.channels:
+            self.channels[name] = _Channel(self.capacity, deadline)
+        elif deadline is not None:
+            self.channels[name].deadline = deadline
+        return self.channels[name]
+
+    def record(self, name, wall_time, start=0.0, info=None):
+        """Add one call to a channel.
+
+        Args:
+            name (str): Channel name.
+            wall_time (float): Duration of the call in seconds.
+            start (float): Start time stamp of the call.
+            info (dict, optional): Solver information with optional keys
+                'status', 'iterations' and 'fallback'.
+        """
+        channel = self.channel(name)
+        miss = channel.deadline is not None and wall_time > channel.deadline
+        iterations, status, fallback = -1, -1, False
+        if info:
+            if info.get('iterations') is not None:
+                iterations = info['iterations']
+            fallback = bool(info.get('fallback', False))
+            if info.get('status') is not None:
+                status = self._status_code(str(info['status']))
+        channel.buffer.append((start, wall_time, iterations, status, miss, fallback))
+        channel.deadline_misses += miss
+        channel.fallbacks += fallback
+
+    @contextmanager
+    def measure(self, name):
+        """Time a block of code into a channel."""
+        clock = time.perf_counter
+        start = clock()
+        try:
+            yield
+        finally:
+            self.record(name, clock() - start, start)
+
+    def instrument(self, obj, methods=None, name=None, deadline=None):
+        """Hook the given methods of one instance.
+
+        Args:
+            obj: Controller or plant instance.
+            methods (sequence, optional): Method names, by default whichever
+                of 'update', 'compute_control' and 'update_state' exist.
+            name (str, optional): Channel name, defaults to the class name.
+            deadline (float, optional): Calls longer than this (in seconds)
+                count as deadline misses. Defaults to the object's `dt` when
+                it has one.
+
+        Returns:
+            obj, for chaining.
+        """
+        if methods is None:
+            methods = [m for m in ('update', 'compute_control', 'update_state') if hasattr(obj, m)]
+        name = name or type(obj).__name__
+        if deadline is None:
+            deadline = getattr(obj, 'dt', None)
+        channel = self.channel(name, deadline)
+        for method in methods:
+            if method in vars(obj):
+                raise ValueError(f"{name}.{method} is already instrumented")
+            setattr(obj, method, self._hook(obj, getattr(obj, method), name, channel))
+            self._hooks.append((obj, method))
+        return obj
+
+    def _hook(self, obj, method, name, channel):
+        clock = time.perf_counter
+        record = self.record
+
+        @wraps(method)
+        def hooked(*args, **kwargs):
+            if channel.active:
+                return method(*args, **kwargs)
+            channel.active = True
+            start = clock()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                wall_time = clock() - start
+                channel.active = False
+                record(name, wall_time, start, getattr(obj, 'solve_info', None))
+
+        return hooked
+
+    def detach(self):
+        """Remove every hook, restoring the original methods. Recorded data is kept."""
+        for obj, method in self._hooks:
+            vars(obj).pop(method, None)
+        self._hooks = []
+
+    def _status_code(self, status):
+        if status not in self.statuses:
+            self.statuses.append(status)
+        return self.statuses.index(status)
+
+    def to_arrays(self, name):
+        """Records of a channel, oldest first, as a dict of arrays.
+
+        'status' is returned as strings ('' when unknown).
+        """
+        records = self.channels[name].buffer.to_array()
+        arrays = {field: records[field] for field in RECORD_DTYPE.names}
+        labels = np.array(self.statuses + [''], dtype=object)
+        arrays['status'] = labels[records['status']]
+        return arrays
+
+    def histogram(self, name, bins=50, range=None):
+        """np.histogram of the stored wall times of a channel, in seconds."""
+        return np.histogram(self.channels[name].buffer.to_array()['wall_time'], bins=bins, range=range)
+
+    def summary(self):
+        """Per-channel statistics.
+
+        'calls', 'deadline_misses' and 'fallbacks' count every call since
+        the channel was created; the timing percentiles, mean iterations and
+        status counts cover the calls still in the ring buffer.
+        """
+        summary = {}
+        for name, channel in self.channels.items():
+            records = channel.buffer.to_array()
+            wall = records['wall_time']
+            iterations = records['iterations'][records['iterations'] >= 0]
+            codes, counts = np.unique(records['status'][records['status'] >= 0], return_counts=True)
+            summary[name] = {
+                'calls': channel.buffer.count,
+                'deadline': channel.deadline,
+                'deadline_misses': channel.deadline_misses,
+                'fallbacks': channel.fallbacks,
+                'mean': wall.mean() if wall.size else np.nan,
+                'p50': np.percentile(wall, 50) if wall.size else np.nan,
+                'p99': np.percentile(wall, 99) if wall.size else np.nan,
+                'max': wall.max() if wall.size else np.nan,
+                'mean_iterations': iterations.mean() if iterations.size else np.nan,
+                'status_counts': {self.statuses[c]: int(n) for c, n in zip(codes, counts)},
+            }
+        return summary
+
+    def reset(self):
+        """Clear the recorded data, keeping the hooks."""
+        for channel in self.channels.values():
+            channel.buffer.clear()
+            channel.deadline_misses = 0
+            channel.fallbacks = 0
@@ -0,0 +1,220 @@
+# ODE integrators for batched dynamics f(x, u, params) -> dx/dt
+#
+# The fixed-step integrators advance x (..., n) over one step of length dt
+# with the input held constant (zero-order hold), so a single call steps a
+# whole batch of states. They share the signature
+#     step(f, x, u, params, dt) -> x_next
+# and are registered in INTEGRATORS for the plants' `integrator` option.
+
+import numpy as np
+
+from utils.linearization import jacobians
+
+
+def euler_step(f, x, u, params, dt):
+    """Explicit (forward) Euler."""
+    return x + dt * f(x, u, params)
+
+
+def rk4_step(f, x, u, params, dt):
+    """Classical fourth-order Runge-Kutta."""
+    k1 = f(x, u, params)
+    k2 = f(x + 0.5 * dt * k1, u, params)
+    k3 = f(x + 0.5 * dt * k2, u, params)
+    k4 = f(x + dt * k3, u, params)
+    return x + dt / 6.0 * (k1 + 2.0 * k2 + 2.0 * k3 + k4)
+
+
+def semi_implicit_euler_step(f, x, u, params, dt):
+    """Linearly implicit Euler x+ = x + (I - dt J)^-1 dt f(x, u).
+
+    J = df/dx is taken by complex step, so f must accept complex arrays. One
+    linear solve per step makes the scheme stable for stiff dynamics (for
+    example the fast electrical pole of a DC motor) at steps where explicit
+    methods diverge.
+    """
+    J, _ = jacobians(f, x, u, params)
+    n = x.shape[-1]
+    rhs = dt * f(x, u, params)
+    return x + np.linalg.solve(np.eye(n) - dt * J, rhs[..., None])[..., 0]
+
+
+def symplectic_euler_step(f, x, u, params, dt, n_position=None):
+    """Symplectic (semi-implicit) Euler for mechanical states [q, v].
+
+    The velocities are advanced first and the positions then use the new
+    velocities. The first n_position components are positions, half of the
+    state by default.
+    """
+    n_position = x.shape[-1] // 2 if n_position is None else n_position
+    v = x[..., n_position:] + dt * f(x, u, params)[..., n_position:]
+    x_half = np.concatenate([x[..., :n_position], v], axis=-1)
+    q = x[..., :n_position] + dt * f(x_half, u, params)[..., :n_position]
+    return np.concatenate([q, v], axis=-1)
+
+
+# Scalar counterparts for plants with two states stepped one sample at a
+# time. f(x0, x1, u) returns the derivative as a tuple of floats; the
+# arithmetic follows the batched integrators above operation by operation,
+# so both give the same results without the per-step array overhead.
+
+def scalar_euler_step(f, x0, x1, u, dt):
+    d0, d1 = f(x0, x1, u)
+    return x0 + dt * d0, x1 + dt * d1
+
+
+def scalar_rk4_step(f, x0, x1, u, dt):
+    a0, a1 = f(x0, x1, u)
+    b0, b1 = f(x0 + 0.5 * dt * a0, x1 + 0.5 * dt * a1, u)
+    c0, c1 = f(x0 + 0.5 * dt * b0, x1 + 0.5 * dt * b1, u)
+    d0, d1 = f(x0 + dt * c0, x1 + dt * c1, u)
+    return (x0 + dt / 6.0 * (a0 + 2.0 * b0 + 2.0 * c0 + d0),
+            x1 + dt / 6.0 * (a1 + 2.0 * b1 + 2.0 * c1 + d1))
+
+
+def scalar_symplectic_euler_step(f, x0, x1, u, dt):
+    v = x1 + dt * f(x0, x1, u)[1]
+    return x0 + dt * f(x0, v, u)[0], v
+
+
+# Dormand-Prince 5(4) tableau with the free fourth-order interpolant, as in
+# scipy.integrate.RK45
+_DP_C = np.array([0, 1 / 5, 3 / 10, 4 / 5, 8 / 9, 1])
+_DP_A = [
+    [],
+    [1 / 5],
+    [3 / 40, 9 / 40],
+    [44 / 45, -56 / 15, 32 / 9],
+    [19372 / 6561, -25360 / 2187, 64448 / 6561, -212 / 729],
+    [9017 / 3168, -355 / 33, 46732 / 5247, 49 / 176, -5103 / 18656],
+]
+_DP_B = np.array([35 / 384, 0, 500 / 1113, 125 / 192, -2187 / 6784, 11 / 84])
+_DP_E = np.array([-71 / 57600, 0, 71 / 16695, -71 / 1920, 17253 / 339200, -22 / 525, 1 / 40])
+_DP_P = np.array([
+    [1, -8048581381 / 2820520608, 8663915743 / 2820520608, -12715105075 / 11282082432],
+    [0, 0, 0, 0],
+    [0, 131558114200 / 32700410799, -68118460800 / 10900136933, 87487479700 / 32700410799],
+    [0, -1754552775 / 470086768, 14199869525 / 1410260304, -10690763975 / 1880347072],
+    [0, 127303824393 / 49829197408, -318862633887 / 49829197408, 701980252875 / 199316789632],
+    [0, -282668133 / 205662961, 2019193451 / 616988883, -1453857185 / 822651844],
+    [0, 40617522 / 29380423, -110615467 / 29380423, 69997945 / 29380423],
+])
+
+
+class RK45Solution:
+    """Accepted steps of solve_rk45 with continuous (dense) output.
+
+    Attributes:
+        t (np.ndarray): Step times (n_steps + 1,).
+        x (np.ndarray): States at the step times (n_steps + 1, ..., n).
+    """
+
+    def __init__(self, t, x, Q):
+        self.t = t
+        self.x = x
+        self._Q = Q  # interpolant coefficients per step (n_steps, ..., n, 4)
+
+    def __call__(self, t):
+        """States at arbitrary times in [t[0], t[-1]], shape (len(t), ..., n) or (..., n) for scalar t."""
+        times = np.atleast_1d(np.asarray(t, dtype=float))
+        idx = np.clip(np.searchsorted(self.t, times, side='right') - 1, 0, len(self.t) - 2)
+        h = self.t[idx + 1] - self.t[idx]
+        s = (times - self.t[idx]) / h
+        powers = np.cumprod(np.repeat(s[:, None], 4, axis=1), axis=1)
+        shape = (-1,) + (1,) * (self.x.ndim - 1)
+        out = self.x[idx] + h.reshape(shape) * np.einsum('k...j,kj->k...', self._Q[idx], powers)
+        return out[0] if np.ndim(t) == 0 else out
+
+
+def solve_rk45(f, x0, u, params, t_span, rtol=1e-6, atol=1e-9, first_step=None, max_step=np.inf):
+    """Adaptive Dormand-Prince RK45 for a batch of states with dense output.
+
+    All states in the batch share the step size, chosen from the worst
+    error among them, so the batch advances with vectorized stage evaluations.
+
+    Args:
+        f (callable): Dynamics f(x, u, params).
+        x0 (np.ndarray): Initial states (..., n).
+        u (np.ndarray): Input held constant over the span, broadcast against x0.
+        params (dict): Passed to f.
+        t_span (tuple): (t0, t1) with t1 > t0.
+        rtol, atol (float): Relative and absolute error tolerances.
+        first_step (float, optional): Initial step, estimated when None.
+        max_step (float): Upper bound on the step size.
+
+    Returns:
+        RK45Solution
+    """
+    t0, t1 = map(float, t_span)
+    if t1 <= t0:
+        raise ValueError(f"t_span must be increasing, got {t_span}")
+    x = np.asarray(x0, dtype=float)
+    u = np.asarray(u, dtype=float)
+
+    def error_norm(e, x_old, x_new):
+        scale = atol + rtol * np.maximum(np.abs(x_old), np.abs(x_new))
+        return np.max(np.sqrt(np.mean((e / scale) ** 2, axis=-1))) if e.size else 0.0
+
+    k = f(x, u, params)
+    if first_step is None:
+        d0, d1 = error_norm(x, x, x), error_norm(k, x, x)
+        h = 1e-6 if d0 < 1e-5 or d1 < 1e-5 else 0.01 * d0 / d1
+        h = min(h, max_step, t1 - t0)
+    else:
+        h = first_step
+
+    t = t0
+    ts, xs, Qs = [t0], [x], []
+    K = np.empty((7,) + x.shape)
+    while t < t1:
+        h = min(h, max_step, t1 - t)
+        K[0] = k
+        for i in range(1, 6):
+            K[i] = f(x + h * np.tensordot(_DP_A[i], K[:i], axes=1), u, params)
+        x_new = x + h * np.tensordot(_DP_B, K[:6], axes=1)
+        K[6] = f(x_new, u, params)
+        norm = error_norm(h * np.tensordot(_DP_E, K, axes=1), x, x_new)
+
+        if norm <= 1.0:
+            # Step accepted: store the interpolant and grow the step
+            Qs.append(np.moveaxis(np.tensordot(_DP_P.T, K, axes=(1, 0)), 0, -1))
+            t = t1 if t1 - (t + h) <= 1e-12 * max(1.0, abs(t1)) else t + h
+            x, k = x_new, K[6].copy()
+            ts.append(t)
+            xs.append(x)
+            h *= min(10.0, 0.9 * norm ** -0.2) if norm > 0 else 10.0
+        else:
+            h *= max(0.2, 0.9 * norm ** -0.2)
+        if h < 1e-14 * max(1.0, abs(t)):
+            raise RuntimeError(f"solve_rk45 step size underflow at t = {t}")
+
+    return RK45Solution(np.array(ts), np.array(xs), np.array(Qs))
+
+
+def rk45_step(f, x, u, params, dt, rtol=1e-6, atol=1e-9):
+    """Adaptive RK45 over one step of length dt, returning only the final state."""
+    return solve_rk45(f, x, u, params, (0.0, dt), rtol, atol).x[-1]
+
+
+INTEGRATORS = {
+    'euler': euler_step,
+    'rk4': rk4_step,
+    'rk45': rk45_step,
+    'semi_implicit_euler': semi_implicit_euler_step,
+    'symplectic_euler': symplectic_euler_step,
+}
+
+SCALAR_INTEGRATORS = {
+    'euler': scalar_euler_step,
+    'rk4': scalar_rk4_step,
+    'symplectic_euler': scalar_symplectic_euler_step,
+}
+
+
+def get_integrator(integrator):
+    """Resolve an integrator name from INTEGRATORS, or pass a step callable through."""
+    if callable(integrator):
+        return integrator
+    if integrator not in INTEGRATORS:
+        raise ValueError(f"Unknown integrator '{integrator}', expected one of {sorted(INTEGRATORS)}")
+    return INTEGRATORS[integrator]
@@ -0,0 +1,35 @@
+# Lazy package attributes
+#
+# Package __init__ modules re-export their main classes without importing
+# the submodules that define them: lazy_exports returns module-level
+# __getattr__ and __dir__ functions (PEP 562) that import a submodule the
+# first time one of its names is accessed. Importing a package therefore
+# costs nothing until a name is used, and `from controllers import
+# PIDController` loads only controllers.pid.
+
+import importlib
+
+
+def lazy_exports(package, exports):
+    """Module __getattr__ and __dir__ for a package.
+
+    Args:
+        package (str): The package's __name__.
+        exports (dict): Exported name -> submodule name (relative to the package).
+
+    Returns:
+        tuple: (__getattr__, __dir__) to assign in the package namespace.
+    """
+    namespace = importlib.import_module(package).__dict__
+
+    def __getattr__(name):
+        if name not in exports:
+            raise AttributeError(f"module {package!r} has no attribute {name!r}")
+        value = getattr(importlib.import_module(f'{package}.{exports[name]}'), name)
+        namespace[name] = value  # later lookups skip __getattr__
+        return value
+
+    def __dir__():
+        return sorted(set(namespace) | set(exports))
+
+    return __getattr__, __dir__
@@ -1,4 +1,133 @@
 # Functions for linearizing nonlinear systems
+#
+# Dynamics are functions f(x, u, params) -> dx/dt on arrays with arbitrary
+# leading dimensions, such as the `dynamics` static methods of the plants.
+# All perturbed copies of all operating points are stacked into a single call
+# of f, so a grid of hundreds of points costs one vectorized evaluation.
 
-def linearize_example():
-    pass  # Replace with actual linearization code
+import hashlib
+from collections import OrderedDict
+
+import numpy as np
+
+from utils.discretization import discretize_batch
+
+# LRU cache of linearizations, keyed by the dynamics function and the bytes
+# of the operating points, parameters and options
+_LINEARIZATION_CACHE = OrderedDict()
+LINEARIZATION_CACHE_SIZE = 128
+
+
+def jacobians(f, x, u, params=None, method='complex', eps=None):
+    """Jacobians A = df/dx and B = df/du at one or many operating points.
+
+    Args:
+        f (callable): Dynamics f(x, u, params) -> (..., n).
+        x (np.ndarray): States (..., n).
+        u (np.ndarray): Inputs (..., m), broadcast against x.
+        params (dict, optional): Passed to f. Array values must broadcast
+            against the leading dimensions of x and u.
+        method (str): 'complex' for the complex step, exact to machine
+            precision but requires f to accept complex arrays (np.sin, not
+            math.sin), or 'central' for central differences.
+        eps (float, optional): Step size. Defaults to 1e-20 for the complex
+            step and cbrt(machine epsilon) * max(1, |z|) for central differences.
+
+    Returns:
+        tuple: (A, B) with shapes (..., n, n) and (..., n, m).
+    """
+    x = np.asarray(x, dtype=float)
+    u = np.asarray(u, dtype=float)
+    lead = np.broadcast_shapes(x.shape[:-1], u.shape[:-1])
+    n, m = x.shape[-1], u.shape[-1]
+    z = np.concatenate([np.broadcast_to(x, lead + (n,)), np.broadcast_to(u, lead + (m,))], axis=-1)
+    # One extra axis for the perturbation index, so parameters broadcast over it
+    stacked = {name: _expand(value) for name, value in (params or {}).items()}
+    I = np.eye(n + m)
+
+    if method == 'complex':
+        h = 1e-20 if eps is None else eps
+        Z = z[..., None, :] + 1j * h * I
+        J = f(Z[..., :n], Z[..., n:], stacked).imag / h
+    elif method == 'central':
+        h = np.cbrt(np.finfo(float).eps) * np.maximum(1.0, np.abs(z)) if eps is None else np.full(z.shape, eps)
+        steps = h[..., None, :] * I
+        Z = np.concatenate([z[..., None, :] + steps, z[..., None, :] - steps], axis=-2)
+        F = f(Z[..., :n], Z[..., n:], stacked)
+        J = (F[..., :n + m, :] - F[..., n + m:, :]) / (2 * h[..., :, None])
+    else:
+        raise ValueError(f"Unknown method '{method}', expected 'complex' or 'central'")
+
+    # J[..., j, i] = df_i / dz_j
+    J = np.swapaxes(J, -1, -2)
+    return J[..., :n], J[..., n:]
+
+
+def linearize(f, x, u, params=None, method='complex', eps=None, dt=None, discretization='zoh', cache=True):
+    """Linear model of f around operating points, optionally discretized.
+
+    Args:
+        f, x, u, params, method, eps: As for jacobians.
+        dt (float, optional): Discretize the Jacobians with this sampling time.
+        discretization (str): Method passed to discretize_batch when dt is given.
+        cache (bool): Reuse earlier results for identical inputs.
+
+    Returns:
+        tuple: (A, B), continuous-time when dt is None, otherwise the
+        discrete-time pair. Cached results are returned read-only.
+    """
+    key = None
+    if cache:
+        key = _linearization_key(f, x, u, params, method, eps, dt, discretization)
+        cached = _LINEARIZATION_CACHE.get(key)
+        if cached is not None:
+            _LINEARIZATION_CACHE.move_to_end(key)
+            return cached
+
+    A, B = jacobians(f, x, u, params, method, eps)
+    if dt is not None:
+        A, B = discretize_batch(A, B, dt, discretization)
+
+    if cache:
+        A.flags.writeable = False
+        B.flags.writeable = False
+        _LINEARIZATION_CACHE[key] = (A, B)
+        if len(_LINEARIZATION_CACHE) > LINEARIZATION_CACHE_SIZE:
+            _LINEARIZATION_CACHE.popitem(last=False)
+    return A, B
+
+
+def linearize_plant(plant, x=None, u=0.0, **options):
+    """Linearize a plant instance around x (default: its current state) and u.
+
+    The plant must provide a static `dynamics(x, u, params)` and `get_params()`.
+    Scalar inputs are treated as a single input channel.
+    """
+    x = np.asarray(plant.get_state() if x is None else x, dtype=float)
+    u = np.asarray(u, dtype=float)
+    if u.ndim == 0:
+        u = u[None]
+    return linearize(type(plant).dynamics, x, u, plant.get_params(), **options)
+
+
+def operating_grid(*axes):
+    """Stack 1-D axes into an (len(a0), len(a1), ..., n_axes) grid of points."""
+    return np.stack(np.meshgrid(*axes, indexing='ij'), axis=-1)
+
+
+def clear_linearization_cache():
+    _LINEARIZATION_CACHE.clear()
+
+
+def _expand(value):
+    value = np.asarray(value)
+    return value[..., None] if value.ndim else value
+
+
+def _linearization_key(f, x, u, params, method, eps, dt, discretization):
+    digest = hashlib.sha1()
+    for name, value in [('x', x), ('u', u)] + sorted((params or {}).items()):
+        value = np.ascontiguousarray(value, dtype=float)
+        digest.update(f'{name}{value.shape}'.encode())
+        digest.update(value.tobytes())
+    return (f, method, eps, dt, discretization, digest.hexdigest())
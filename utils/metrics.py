@@ -0,0 +1,110 @@
+# Closed-loop performance metrics
+#
+# Signals are taken along axis 0, so (T,) responses and (T, runs) arrays
+# from many runs on the same time grid are both accepted. Step-response
+# metrics are relative to the step size setpoint - y0, where y0 defaults to
+# the first sample.
+
+import numpy as np
+
+
+def _integrate(t, values):
+    """Trapezoidal integral of values (T, ...) over t (T,) along axis 0."""
+    t = np.asarray(t, dtype=float)
+    values = np.asarray(values, dtype=float)
+    if values.shape[0] < 2:
+        return np.zeros(values.shape[1:])
+    dt = np.diff(t).reshape((-1,) + (1,) * (values.ndim - 1))
+    return (0.5 * dt * (values[1:] + values[:-1])).sum(axis=0)
+
+
+def iae(t, error):
+    """Integral of the absolute error."""
+    return _integrate(t, np.abs(error))
+
+
+def ise(t, error):
+    """Integral of the squared error."""
+    return _integrate(t, np.square(error))
+
+
+def itae(t, error):
+    """Integral of the time-weighted absolute error, with time from t[0]."""
+    t = np.asarray(t, dtype=float)
+    weight = (t - t[0]).reshape((-1,) + (1,) * (np.ndim(error) - 1))
+    return _integrate(t, weight * np.abs(error))
+
+
+def _step(y, setpoint, y0):
+    y = np.asarray(y, dtype=float)
+    y0 = y[0] if y0 is None else np.asarray(y0, dtype=float)
+    return y, np.asarray(setpoint, dtype=float) - y0
+
+
+def overshoot(y, setpoint, y0=None):
+    """Peak overshoot past the setpoint as a fraction of the step size (0 when there is none)."""
+    y, step = _step(y, setpoint, y0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        peak = ((y - setpoint) * np.sign(step)).max(axis=0) / np.abs(step)
+    return np.where(step == 0, 0.0, np.maximum(peak, 0.0))
+
+
+def settling_time(t, y, setpoint, tolerance=0.02, y0=None):
+    """Time from t[0] after which y stays within tolerance * |step| of the setpoint.
+
+    Returns inf for responses that are still outside the band at the last sample.
+    """
+    t = np.asarray(t, dtype=float)
+    y, step = _step(y, setpoint, y0)
+    outside = np.abs(y - setpoint) > tolerance * np.abs(step)
+    # Index of the last sample outside the band, -1 when there is none
+    last = np.where(outside.any(axis=0), outside.shape[0] - 1 - np.argmax(outside[::-1], axis=0), -1)
+    settled = np.minimum(last + 1, len(t) - 1)
+    return np.where(last == len(t) - 1, np.inf, t[settled] - t[0])
+
+
+def rise_time(t, y, setpoint, low=0.1, high=0.9, y0=None):
+    """Time between the first crossings of low and high fractions of the step (inf if not reached)."""
+    t = np.asarray(t, dtype=float)
+    y, step = _step(y, setpoint, y0)
+    y0 = y[0] if y0 is None else y0
+    with np.errstate(divide='ignore', invalid='ignore'):
+        progress = (y - y0) / step
+
+    def first(level):
+        reached = progress >= level
+        return np.where(reached.any(axis=0), t[np.argmax(reached, axis=0)], np.inf)
+
+    return first(high) - first(low)
+
+
+def step_metrics(t, y, setpoint, u=None, tolerance=0.02, y0=None):
+    """Step-response metrics of one or many runs.
+
+    Args:
+        t (np.ndarray): Time stamps (T,).
+        y (np.ndarray): Controlled output (T,) or (T, runs).
+        setpoint (float or np.ndarray): Reference, one per run.
+        u (np.ndarray, optional): Inputs along axis 0, shaped like y; adds
+            'control_effort', the mean squared input.
+        tolerance (float): Settling band as a fraction of the step.
+        y0 (float or np.ndarray, optional): Initial output, defaults to y[0].
+
+    Returns:
+        dict: 'iae', 'ise', 'itae', 'overshoot', 'settling_time',
+        'rise_time', 'final_error' and optionally 'control_effort'.
+    """
+    y = np.asarray(y, dtype=float)
+    error = setpoint - y
+    metrics = {
+        'iae': iae(t, error),
+        'ise': ise(t, error),
+        'itae': itae(t, error),
+        'overshoot': overshoot(y, setpoint, y0),
+        'settling_time': settling_time(t, y, setpoint, tolerance, y0),
+        'rise_time': rise_time(t, y, setpoint, y0=y0),
+        'final_error': error[-1],
+    }
+    if u is not None:
+        metrics['control_effort'] = np.square(np.asarray(u, dtype=float)).mean(axis=0)
+    return metrics
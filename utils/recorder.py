@@ -0,0 +1,275 @@
+# Chunked trajectory recording
+#
+# TrajectoryRecorder collects named channels (states, inputs, outputs,
+# timings) sample by sample with append() or block by block with extend()
+# into one fixed-size buffer per channel. Every full buffer updates the
+# running statistics of its channel and is written as a segment file,
+# compressed .npz or memory-mappable .npy, so memory use is bounded by the
+# chunk size however long the run is. TrajectoryReader reads a store back
+# lazily: slicing a channel loads only the segments it overlaps.
+#
+# Store layout:
+#     <path>/meta.json             channels, segment lengths, statistics
+#     <path>/<channel>/000000.npz  (or .npy) consecutive segments
+
+import json
+import os
+
+import numpy as np
+
+from utils.ingest import RunningStats
+
+META_FILE = 'meta.json'
+
+
+class TrajectoryRecorder:
+    """Append-only recorder of named trajectory channels.
+
+    Example:
+        with TrajectoryRecorder('run_01', decimation=10) as recorder:
+            for k in range(steps):
+                ...
+                recorder.append(t=k * dt, x=state, u=force)
+        x = TrajectoryReader('run_01')['x'][1000:2000]
+    """
+
+    def __init__(self, path=None, chunk_size=4096, decimation=1, stats_only=False, compress=True):
+        """
+        Args:
+            path (str, optional): Directory of the store, created if needed.
+                Without it the segments are kept in memory (see to_arrays).
+            chunk_size (int): Samples buffered per channel before a flush.
+            decimation (int): Store every decimation-th sample. Statistics
+                always cover every sample.
+            stats_only (bool): Keep only the running statistics, no samples.
+            compress (bool): Write compressed .npz segments; otherwise .npy
+                segments that TrajectoryReader memory-maps.
+        """
+        if chunk_size < 1 or decimation < 1:
+            raise ValueError(f"chunk_size and decimation must be positive, got {chunk_size} and {decimation}")
+        self.path = path
+        self.chunk_size = int(chunk_size)
+        self.decimation = int(decimation)
+        self.stats_only = stats_only
+        self.compress = compress
+        self.count = 0  # samples appended per channel
+        self.stats = {}
+        self._buffers = {}
+        self._filled = 0
+        self._flushed = 0  # samples already flushed (index of the first buffered sample)
+        self._segments = {}  # name -> list of in-memory arrays or segment lengths
+        self.closed = False
+        if path is not None:
+            os.makedirs(path, exist_ok=True)
+
+    def _allocate(self, samples):
+        for name, value in samples.items():
+            value = np.asarray(value)
+            dtype = value.dtype if np.issubdtype(value.dtype, np.number) or value.dtype == bool else float
+            self._buffers[name] = np.empty((self.chunk_size,) + value.shape, dtype=dtype)
+            self._segments[name] = []
+            self.stats[name] = RunningStats(axis=0)
+            if self.path is not None and not self.stats_only:
+                os.makedirs(os.path.join(self.path, name), exist_ok=True)
+
+    def append(self, **samples):
+        """Add one sample to every channel; the channels are fixed by the first call."""
+        if not self._buffers:
+            self._allocate(samples)
+        if samples.keys() != self._buffers.keys():
+            raise ValueError(f"Expected channels {sorted(self._buffers)}, got {sorted(samples)}")
+        i = self._filled
+        for name, value in samples.items():
+            self._buffers[name][i] = value
+        self._filled += 1
+        self.count += 1
+        if self._filled == self.chunk_size:
+            self.flush()
+
+    def extend(self, **blocks):
+        """Add a block of samples (leading axis) to every channel."""
+        blocks = {name: np.asarray(value) for name, value in blocks.items()}
+        lengths = {len(value) for value in blocks.values()}
+        if len(lengths) != 1:
+            raise ValueError(f"All blocks must have the same length, got {sorted(lengths)}")
+        n = lengths.pop()
+        if not self._buffers:
+            self._allocate({name: value[0] for name, value in blocks.items()} if n else {})
+        if blocks.keys() != self._buffers.keys():
+            raise ValueError(f"Expected channels {sorted(self._buffers)}, got {sorted(blocks)}")
+        start = 0
+        while start < n:
+            take = min(n - start, self.chunk_size - self._filled)
+            for name, value in blocks.items():
+                self._buffers[name][self._filled:self._filled + take] = value[start:start + take]
+            self._filled += take
+            self.count += take
+            start += take
+            if self._filled == self.chunk_size:
+                self.flush()
+
+    def flush(self):
+        """Write the buffered samples as new segments and update the statistics."""
+        n = self._filled
+        if n == 0:
+            return
+        # Global sample indices k with k % decimation == 0
+        first = (-self._flushed) % self.decimation
+        for name, buffer in self._buffers.items():
+            self.stats[name].update(buffer[:n])
+            if self.stats_only or first >= n:
+                continue
+            segment = buffer[first:n:self.decimation].copy()
+            if self.path is None:
+                self._segments[name].append(segment)
+            else:
+                index = len(self._segments[name])
+                base = os.path.join(self.path, name, f'{index:06d}')
+                if self.compress:
+                    np.savez_compressed(base + '.npz', data=segment)
+                else:
+                    np.save(base + '.npy', segment)
+                self._segments[name].append(len(segment))
+        self._flushed += n
+        self._filled = 0
+        if self.path is not None:
+            self._write_meta()
+
+    def _write_meta(self):
+        channels = {}
+        for name, buffer in self._buffers.items():
+            segments = self._segments[name]
+            channels[name] = {'shape': list(buffer.shape[1:]), 'dtype': buffer.dtype.str, 'lengths': segments}
+        meta = {'chunk_size': self.chunk_size, 'decimation': self.decimation, 'compress': self.compress,
+                'stats_only': self.stats_only, 'count': self._flushed, 'channels': channels,
+                'stats': self.summary()}
+        temporary = os.path.join(self.path, META_FILE + '.tmp')
+        with open(temporary, 'w') as f:
+            json.dump(meta, f, default=lambda value: np.asarray(value).tolist())
+        os.replace(temporary, os.path.join(self.path, META_FILE))
+
+    def summary(self):
+        """Running statistics per channel (count, mean, std, min, max) over the flushed samples."""
+        return {name: stats.summary() for name, stats in self.stats.items() if stats.count}
+
+    def close(self):
+        self.flush()
+        if self.path is not None and not self._buffers:
+            self._write_meta()
+        self.closed = True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def to_arrays(self):
+        """Every stored sample of every channel, flushing first."""
+        self.flush()
+        if self.path is not None:
+            reader = TrajectoryReader(self.path)
+            return {name: reader[name][:] for name in reader.channels}
+        return {name: np.concatenate(segments) if segments else self._buffers[name][:0].copy()
+                for name, segments in self._segments.items()}
+
+
+class ChunkedArray:
+    """Read-only view of one channel stored as consecutive segments.
+
+    Supports len(), shape, integer and slice indexing along the first axis
+    (further indices are applied to the result) and np.asarray().
+    """
+
+    def __init__(self, files, lengths, shape, dtype):
+        self.files = files
+        self.lengths = np.asarray(lengths, dtype=int)
+        self.offsets = np.concatenate([[0], np.cumsum(self.lengths)])
+        self.shape = (int(self.offsets[-1]),) + tuple(shape)
+        self.dtype = np.dtype(dtype)
+        self._cached = (None, None)  # last decompressed segment
+
+    def __len__(self):
+        return self.shape[0]
+
+    def segment(self, index):
+        if self._cached[0] == index:
+            return self._cached[1]
+        path = self.files[index]
+        if path.endswith('.npy'):
+            data = np.load(path, mmap_mode='r')
+        else:
+            with np.load(path) as archive:
+                data = archive['data']
+        self._cached = (index, data)
+        return data
+
+    def __getitem__(self, key):
+        rest = ()
+        if isinstance(key, tuple):
+            key, rest = key[0], key[1:]
+        if isinstance(key, (int, np.integer)):
+            index = key + len(self) if key < 0 else key
+            if not 0 <= index < len(self):
+                raise IndexError(f"index {key} out of range for length {len(self)}")
+            segment = int(np.searchsorted(self.offsets, index, side='right') - 1)
+            result = np.array(self.segment(segment)[index - self.offsets[segment]])
+        elif isinstance(key, slice):
+            start, stop, step = key.indices(len(self))
+            # Reversed slices are rare enough to read everything
+            result = self._read_slice(start, stop, step) if step > 0 else np.asarray(self)[key]
+        else:
+            raise TypeError(f"Unsupported index {key!r}")
+        if not rest:
+            return result
+        # An integer key has already dropped the leading axis
+        return result[rest] if isinstance(key, (int, np.integer)) else result[(slice(None),) + rest]
+
+    def _read_slice(self, start, stop, step):
+        parts = []
+        if stop > start:
+            first = int(np.searchsorted(self.offsets, start, side='right') - 1)
+            last = int(np.searchsorted(self.offsets, stop - 1, side='right') - 1)
+            for segment in range(first, last + 1):
+                offset = self.offsets[segment]
+                # First index >= max(start, offset) on the step grid of the slice
+                begin = max(start, offset)
+                begin += (start - begin) % step
+                end = min(stop, self.offsets[segment + 1])
+                if begin < end:
+                    parts.append(np.asarray(self.segment(segment)[begin - offset:end - offset:step]))
+        if not parts:
+            return np.empty((0,) + self.shape[1:], dtype=self.dtype)
+        return np.concatenate(parts)
+
+    def __array__(self, dtype=None, copy=None):
+        data = self._read_slice(0, len(self), 1)
+        return data if dtype is None else data.astype(dtype)
+
+    def iter_segments(self):
+        """Yield the segments in order, one at a time."""
+        for index in range(len(self.files)):
+            yield np.asarray(self.segment(index))
+
+
+class TrajectoryReader:
+    """Lazy access to a store written by TrajectoryRecorder."""
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, META_FILE)) as f:
+            self.meta = json.load(f)
+        self.decimation = self.meta['decimation']
+        self.stats = self.meta['stats']
+        extension = '.npz' if self.meta['compress'] else '.npy'
+        self._arrays = {}
+        for name, info in self.meta['channels'].items():
+            files = [os.path.join(path, name, f'{i:06d}{extension}') for i in range(len(info['lengths']))]
+            self._arrays[name] = ChunkedArray(files, info['lengths'], info['shape'], info['dtype'])
+
+    @property
+    def channels(self):
+        return list(self._arrays)
+
+    def __getitem__(self, name):
+        return self._arrays[name]
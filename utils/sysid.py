@@ -0,0 +1,350 @@
+# Linear system identification from logged input/output data
+#
+# Identified models are discrete-time with the convention used by the MPC,
+# LQR and Kalman code:
+#     x[k+1] = A x[k] + B u[k],   y[k] = C x[k] + D u[k]
+# so LinearMPC(model.A, model.B, ...) and LQRController(model.A, model.B,
+# Q, R, dt=model.dt) use them directly. StateSpaceSim takes continuous-time
+# matrices, see StateSpaceModel.to_continuous.
+#
+# ARX models are fit by linear least squares. The normal equations are
+# accumulated chunk by chunk (ARXAccumulator), carrying the last few samples
+# across chunk boundaries, so logs larger than memory are identified in one
+# pass with memory independent of their length. Signals are (T,) or (T, channels).
+
+import numpy as np
+
+from plants.stateSpaceSim import propagate
+
+
+def _as_2d(signal):
+    signal = np.asarray(signal, dtype=float)
+    return signal[:, None] if signal.ndim == 1 else signal
+
+
+class StateSpaceModel:
+    """Discrete-time model x[k+1] = A x[k] + B u[k], y[k] = C x[k] + D u[k]."""
+
+    def __init__(self, A, B, C, D, dt=1.0):
+        self.A, self.B, self.C, self.D = (np.atleast_2d(np.asarray(M, dtype=float)) for M in (A, B, C, D))
+        self.dt = dt
+
+    def simulate(self, u, x0=None):
+        """Outputs (T, p) for inputs (T, m) from x0 (zero by default)."""
+        u = _as_2d(u)
+        x0 = np.zeros(self.A.shape[0]) if x0 is None else np.asarray(x0, dtype=float)
+        # propagate computes x[k] = A x[k-1] + B w[k]; w[k] = u[k-1] gives this model's recursion
+        w = np.vstack([np.zeros((1, u.shape[1])), u[:-1]])
+        x = propagate(self.A, self.B, x0, w)
+        return x @ self.C.T + u @ self.D.T
+
+    def to_continuous(self):
+        """Continuous-time (A, B, C, D) whose zero-order-hold discretization at dt is (A, B).
+
+        The result plugs into StateSpaceSim(..., dt).simulate('zoh'), which
+        applies its input u[k] over the step ending at sample k, i.e. its
+        u[k] is this model's u[k-1]. Models with eigenvalues at zero or on
+        the negative real axis (such as the shift registers of
+        ARXModel.to_state_space) have no continuous-time equivalent.
+        """
+        from scipy.linalg import logm
+
+        n, m = self.B.shape
+        M = np.zeros((n + m, n + m))
+        M[:n, :n] = self.A
+        M[:n, n:] = self.B
+        M[n:, n:] = np.eye(m)
+        L = logm(M) / self.dt
+        if not np.all(np.isfinite(L)) or np.abs(np.imag(L)).max() > 1e-8 * max(1.0, np.abs(L).max()):
+            raise ValueError("Model has no real continuous-time equivalent "
+                             "(eigenvalues at zero or on the negative real axis)")
+        L = np.real(L)
+        return L[:n, :n], L[:n, n:], self.C.copy(), self.D.copy()
+
+
+class ARXModel:
+    """ARX (or ARMAX, with c) model
+
+        y[k] = sum_i a[i-1] y[k-i] + sum_j b[j-1] u[k-nk-j+1] + e[k] + sum_l c[l-1] e[k-l]
+
+    with a (na, p, p), b (nb, p, m) and c (nc,) for single-output ARMAX.
+    """
+
+    def __init__(self, a, b, nk=1, dt=1.0, c=None, noise_variance=None):
+        self.a = np.asarray(a, dtype=float)
+        self.b = np.asarray(b, dtype=float)
+        self.nk = nk
+        self.dt = dt
+        self.c = None if c is None else np.asarray(c, dtype=float)
+        self.noise_variance = noise_variance
+
+    @property
+    def na(self):
+        return self.a.shape[0]
+
+    @property
+    def nb(self):
+        return self.b.shape[0]
+
+    def predict(self, y, u):
+        """One-step-ahead predictions of the ARX part, NaN for the first samples without history."""
+        y, u = _as_2d(y), _as_2d(u)
+        phi, _ = _regressors(y, u, self.na, self.nb, self.nk)
+        lag = len(y) - len(phi)
+        prediction = np.full(y.shape, np.nan)
+        prediction[lag:] = phi @ _stack_coefficients(self.a, self.b)
+        return prediction
+
+    def simulate(self, u):
+        """Noise-free response (T, p) to inputs (T, m) from rest."""
+        return self.to_state_space().simulate(u)
+
+    def to_state_space(self):
+        """Non-minimal StateSpaceModel with x[k] = (y[k-1..k-na], u[k-1..k-L]), L = nk + nb - 1.
+
+        Only the deterministic part is realized; the noise model c is dropped.
+        """
+        na, nb, nk = self.na, self.nb, self.nk
+        p, m = self.b.shape[1:] if nb else (self.a.shape[1], 0)
+        L = max(nk + nb - 1, 0)
+        n = na * p + L * m
+        # Output row: y[k] = C x[k] + D u[k]
+        C = np.zeros((p, n))
+        D = np.zeros((p, m))
+        for i in range(na):
+            C[:, i * p:(i + 1) * p] = self.a[i]
+        for j in range(nb):
+            lag = nk + j  # b[j] multiplies u[k - lag]
+            if lag == 0:
+                D += self.b[j]
+            else:
+                C[:, na * p + (lag - 1) * m:na * p + lag * m] += self.b[j]
+        # Shift registers: y[k] enters the output block, u[k] the input block
+        A = np.zeros((n, n))
+        B = np.zeros((n, m))
+        if na:
+            A[:p] = C
+            B[:p] = D
+            A[p:na * p, :(na - 1) * p] = np.eye((na - 1) * p)
+        if L:
+            B[na * p:na * p + m] = np.eye(m)
+            A[na * p + m:, na * p:n - m] = np.eye((L - 1) * m)
+        return StateSpaceModel(A, B, C, D, self.dt)
+
+
+def _regressors(y, u, na, nb, nk):
+    """Regressors (rows, na p + nb m) and targets (rows, p) for samples k >= max lag."""
+    lag = max(na, nk + nb - 1)
+    T = len(y)
+    if T <= lag:
+        return np.empty((0, na * y.shape[1] + nb * u.shape[1])), np.empty((0, y.shape[1]))
+    columns = [y[lag - i:T - i] for i in range(1, na + 1)]
+    columns += [u[lag - nk - j:T - nk - j] for j in range(nb)]
+    return np.concatenate(columns, axis=1), y[lag:]
+
+
+def _stack_coefficients(a, b):
+    """Parameter matrix theta (na p + nb m, p) with y[k] = phi[k] @ theta."""
+    return np.concatenate([a.transpose(0, 2, 1).reshape(-1, a.shape[1]),
+                           b.transpose(0, 2, 1).reshape(-1, b.shape[1])], axis=0)
+
+
+class ARXAccumulator:
+    """Normal equations of an ARX fit, accumulated over consecutive chunks.
+
+    Example:
+        acc = ARXAccumulator(na=2, nb=2)
+        for chunk in iter_chunks('log.csv'):
+            acc.update(chunk['position'], chunk['force'])
+        model = acc.solve()
+    """
+
+    def __init__(self, na, nb, nk=1, dt=1.0):
+        if na < 0 or nb < 0 or nk < 0:
+            raise ValueError(f"Orders must be non-negative, got na={na}, nb={nb}, nk={nk}")
+        self.na, self.nb, self.nk, self.dt = na, nb, nk, dt
+        self.reset()
+
+    def reset(self):
+        self.gram = None    # sum of phi' phi
+        self.cross = None   # sum of phi' y
+        self.y_energy = None  # sum of y' y, for the residual variance
+        self.count = 0
+        self._history = None  # last max-lag samples of (y, u)
+
+    def update(self, y, u):
+        """Add a chunk of consecutive samples (T,) or (T, channels)."""
+        y, u = _as_2d(y), _as_2d(u)
+        if len(y) != len(u):
+            raise ValueError(f"y and u must have the same length, got {len(y)} and {len(u)}")
+        if self._history is not None:
+            y = np.concatenate([self._history[0], y])
+            u = np.concatenate([self._history[1], u])
+        lag = max(self.na, self.nk + self.nb - 1)
+        # Chunks shorter than the lag carry the whole buffer forward
+        self._history = (y[max(len(y) - lag, 0):], u[max(len(u) - lag, 0):])
+        phi, target = _regressors(y, u, self.na, self.nb, self.nk)
+        if self.gram is None:
+            self.gram = np.zeros((phi.shape[1], phi.shape[1]))
+            self.cross = np.zeros((phi.shape[1], target.shape[1]))
+            self.y_energy = np.zeros((target.shape[1], target.shape[1]))
+        self.gram += phi.T @ phi
+        self.cross += phi.T @ target
+        self.y_energy += target.T @ target
+        self.count += len(target)
+
+    def solve(self, regularization=0.0):
+        """Least-squares ARXModel from the data seen so far.
+
+        Args:
+            regularization (float): Ridge term added to the normal equations.
+        """
+        if not self.count:
+            raise ValueError("No regression rows accumulated, the data is shorter than the model lag")
+        G = self.gram + regularization * np.eye(len(self.gram))
+        theta = np.linalg.lstsq(G, self.cross, rcond=None)[0]
+        p = self.cross.shape[1]
+        m = (len(theta) - self.na * p) // self.nb if self.nb else 0
+        a = theta[:self.na * p].reshape(self.na, p, p).transpose(0, 2, 1)
+        b = theta[self.na * p:].reshape(self.nb, m, p).transpose(0, 2, 1)
+        # Residual covariance from the accumulated sums: (Y - Phi theta)'(Y - Phi theta) / N
+        residual = self.y_energy - theta.T @ self.cross - self.cross.T @ theta + theta.T @ self.gram @ theta
+        return ARXModel(a, b, self.nk, self.dt, noise_variance=residual / self.count)
+
+
+def fit_arx(y, u, na, nb, nk=1, dt=1.0, regularization=0.0):
+    """Least-squares ARX fit to in-memory (or memory-mapped) signals, see ARXModel."""
+    accumulator = ARXAccumulator(na, nb, nk, dt)
+    accumulator.update(y, u)
+    return accumulator.solve(regularization)
+
+
+def fit_arx_log(source, outputs, inputs, na, nb, nk=1, dt=1.0, chunksize=None, regularization=0.0):
+    """ARX fit over a log on disk in one streaming pass.
+
+    Args:
+        source (str): CSV file or directory of .npy columns, see utils.ingest.
+        outputs, inputs (list): Column names of y and u.
+    """
+    from utils.ingest import DEFAULT_CHUNKSIZE, iter_chunks
+
+    accumulator = ARXAccumulator(na, nb, nk, dt)
+    for chunk in iter_chunks(source, chunksize or DEFAULT_CHUNKSIZE, list(outputs) + list(inputs)):
+        accumulator.update(np.column_stack([chunk[name] for name in outputs]),
+                           np.column_stack([chunk[name] for name in inputs]))
+    return accumulator.solve(regularization)
+
+
+def fit_armax(y, u, na, nb, nc, nk=1, dt=1.0, n_iter=20, tol=1e-8):
+    """Single-output ARMAX fit by extended least squares.
+
+    Each iteration is one least-squares solve with the previous residuals as
+    extra regressors, after which the residuals are recomputed by filtering
+    with the estimated noise polynomial. Needs the data in memory (or
+    memory-mapped), as every iteration is a pass over it.
+    """
+    from scipy.signal import lfilter
+
+    y, u = _as_2d(y), _as_2d(u)
+    if y.shape[1] != 1:
+        raise ValueError(f"fit_armax supports a single output, got {y.shape[1]}")
+    lag = max(na, nk + nb - 1, nc)
+    phi, target = _regressors(y, u, na, nb, nk)
+    phi, target = phi[len(phi) - (len(y) - lag):], target[len(target) - (len(y) - lag):]
+    model = fit_arx(y, u, na, nb, nk, dt)
+    theta_arx = _stack_coefficients(model.a, model.b)
+    e = np.zeros(len(y))
+    e[lag:] = (target - phi @ theta_arx)[:, 0]
+    c = np.zeros(nc)
+    for _ in range(n_iter):
+        e_lags = np.column_stack([e[lag - l:len(y) - l] for l in range(1, nc + 1)])
+        theta = np.linalg.lstsq(np.hstack([phi, e_lags]), target[:, 0], rcond=None)[0]
+        theta_arx, c_new = theta[:phi.shape[1], None], theta[phi.shape[1]:]
+        # e[k] = (y[k] - arx prediction) - sum c_l e[k-l]
+        e[lag:] = lfilter([1.0], np.concatenate([[1.0], c_new]), target[:, 0] - (phi @ theta_arx)[:, 0])
+        converged = np.abs(c_new - c).max() <= tol
+        c = c_new
+        if converged:
+            break
+    a = theta_arx[:na].reshape(na, 1, 1)
+    b = theta_arx[na:, 0].reshape(nb, u.shape[1])[:, None, :]
+    return ARXModel(a, b, nk, dt, c=c, noise_variance=np.array([[np.mean(e[lag:] ** 2)]]))
+
+
+def _block_hankel(signal, rows, columns):
+    """(columns, rows * channels) matrix whose row t stacks signal[t], ..., signal[t + rows - 1]."""
+    return np.concatenate([signal[r:r + columns] for r in range(rows)], axis=1)
+
+
+def n4sid(y, u, order=None, horizon=10, dt=1.0, feedthrough=False, max_order=None):
+    """Subspace identification of a state-space model (N4SID).
+
+    The future outputs are projected obliquely onto the past inputs and
+    outputs along the future inputs. The SVD of that projection gives the
+    extended observability matrix and the order, and the state sequence it
+    implies gives (A, B, C, D) by one least-squares solve. All projections
+    use the small Gram matrix of the block-Hankel data, so the cost is
+    linear in the number of samples.
+
+    Args:
+        y, u (np.ndarray): Outputs (T,) or (T, p) and inputs (T,) or (T, m).
+        order (int, optional): Model order. Chosen at the largest gap of
+            the singular values above the rank tolerance when omitted.
+        horizon (int): Number of block rows i of the past and future
+            windows; must exceed the expected order.
+        dt (float): Sampling time stored in the model.
+        feedthrough (bool): Estimate D; otherwise D = 0.
+        max_order (int, optional): Upper bound for the automatic order.
+
+    Returns:
+        StateSpaceModel: With the extra attribute `singular_values`.
+    """
+    y, u = _as_2d(y), _as_2d(u)
+    p, m = y.shape[1], u.shape[1]
+    i = horizon
+    j = len(y) - 2 * i + 1
+    if j < 2 * i * (m + p):
+        raise ValueError(f"Too few samples ({len(y)}) for horizon {i}")
+    Up, Uf = _block_hankel(u, i, j), _block_hankel(u[i:], i, j)
+    Yp, Yf = _block_hankel(y, i, j), _block_hankel(y[i:], i, j)
+    Wp = np.hstack([Up, Yp])
+
+    # Yf ~ Wp Lw + Uf Lu; the oblique projection is Wp Lw
+    Z = np.hstack([Wp, Uf])
+    G = Z.T @ Z
+    scale = np.trace(G) / len(G)
+    theta = np.linalg.solve(G + 1e-12 * scale * np.eye(len(G)), Z.T @ Yf)
+    Lw = theta[:Wp.shape[1]]
+    # SVD of the projection from the Gram matrix: O'O = Lw' (Wp'Wp) Lw
+    gram_O = Lw.T @ G[:Wp.shape[1], :Wp.shape[1]] @ Lw
+    eigenvalues, vectors = np.linalg.eigh(gram_O)
+    order_desc = np.argsort(eigenvalues)[::-1]
+    singular_values = np.sqrt(np.maximum(eigenvalues[order_desc], 0.0))
+    vectors = vectors[:, order_desc]
+    if order is None:
+        # Values below the rank tolerance are round-off of the Gram
+        # eigenvalues, not states; the gap to them must not set the order
+        rank = int(np.sum(singular_values > singular_values[0] * np.sqrt(len(singular_values) * np.finfo(float).eps)))
+        limit = min(max_order or i * p - 1, i * p - 1, max(rank, 1))
+        s = singular_values[:limit + 1]
+        order = int(np.argmax(np.log(s[:-1] + 1e-300) - np.log(s[1:] + 1e-300))) + 1
+    if not 0 < order < i * p:
+        raise ValueError(f"order must be between 1 and {i * p - 1} for horizon {i}, got {order}")
+
+    # O = U S V' with V the leading eigenvectors; Gamma = V S^1/2 (as rows here) and X = U S^1/2
+    S = singular_values[:order]
+    X = (Wp @ Lw) @ vectors[:, :order] / np.sqrt(S)  # (j, order) state sequence
+
+    # [x[k+1], y[k]] = [x[k], u[k]] [[A', C'], [B', D']]
+    current = np.hstack([X[:-1], u[i:i + j - 1]])
+    theta_x = np.linalg.lstsq(current, X[1:], rcond=None)[0]
+    A, B = theta_x[:order].T, theta_x[order:].T
+    if feedthrough:
+        theta_y = np.linalg.lstsq(current, y[i:i + j - 1], rcond=None)[0]
+        C, D = theta_y[:order].T, theta_y[order:].T
+    else:
+        C = np.linalg.lstsq(X[:-1], y[i:i + j - 1], rcond=None)[0].T
+        D = np.zeros((p, m))
+    model = StateSpaceModel(A, B, C, D, dt)
+    model.singular_values = singular_values
+    return model